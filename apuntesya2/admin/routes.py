@@ -3,8 +3,10 @@ from flask import Blueprint, request, jsonify, abort, render_template
 from flask_login import login_required, current_user
 from datetime import datetime
 from ..models import User, Note, AdminAction, Base
-from ..app import Session
-from sqlalchemy.orm import joinedload
+from ..db import Session
+from ..app import wants_json, page_args, page_json, note_json
+from ..pagination import paginate
+from .. import blobstore, previews, principals, queries
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin", template_folder="templates")
 
@@ -17,8 +19,7 @@ def _require_admin():
 def dashboard():
     _require_admin()
     with Session() as s:
-        users_count = s.query(User).count()
-        notes_count = s.query(Note).count()
+        users_count, notes_count = (s.execute(q).scalar_one() for q in queries.admin_counts())
         return render_template("admin/dashboard.html", users_count=users_count, notes_count=notes_count)
 
 @admin_bp.route("/users")
@@ -26,7 +27,7 @@ def dashboard():
 def users_list():
     _require_admin()
     with Session() as s:
-        users = s.query(User).all()
+        users = s.execute(queries.admin_users()).scalars().all()
         return render_template("admin/users.html", users=users)
 
 @admin_bp.route("/users/<int:user_id>/deactivate", methods=["POST"])
@@ -42,6 +43,7 @@ def deactivate_user(user_id):
         s.add(AdminAction(admin_id=current_user.id, action="deactivate_user", target_type="user",
                           target_id=u.id, reason=reason, ip=request.remote_addr))
         s.commit()
+    principals.invalidate(user_id)
     return jsonify(ok=True)
 
 @admin_bp.route("/notes/<int:note_id>/soft-delete", methods=["POST"])
@@ -64,7 +66,7 @@ def soft_delete_note(note_id):
 def admin_actions():
     _require_admin()
     with Session() as s:
-        actions = s.query(AdminAction).order_by(AdminAction.created_at.desc()).limit(200).all()
+        actions = s.execute(queries.admin_actions()).scalars().all()
         return render_template("admin/actions.html", actions=actions)
 
 @admin_bp.route("/users/archivos")
@@ -74,12 +76,7 @@ def users_files():
     email = request.args.get('email', '').strip()
     reported = request.args.get('reported', '').strip()
     with Session() as s:
-        q = s.query(Note).join(User, Note.seller_id == User.id)
-        if email:
-            q = q.filter(User.email.ilike(f"%{email}%"))
-        if reported == '1':
-            q = q.filter(getattr(Note, "is_reported", False) == True)  # works even if column missing
-        notes = q.order_by(Note.id.desc()).limit(500).all()
+        notes = s.execute(queries.admin_users_files(email, reported)).scalars().all()
         return render_template("admin/users_files.html", notes=notes, email=email, reported=reported)
 
 
@@ -117,13 +114,11 @@ def files_index_admin():
     """List all uploaded notes/files for admin with options to hard-delete."""
     _require_admin()
     with Session() as s:
-        notes = (
-            s.query(Note)
-             .options(joinedload(Note.seller))          # <= carga seller en la misma query
-             .order_by(getattr(Note, "created_at", Note.id).desc())
-             .all()
-        )
-    return render_template("admin/files_list.html", notes=notes)
+        page = paginate(s, *queries.admin_files(), limit=50, **page_args())
+        if wants_json():
+            return page_json(page, [dict(note_json(n), file_path=n.file_path, is_active=n.is_active,
+                                         seller=n.seller.name if n.seller else None) for n in page.items])
+    return render_template("admin/files_list.html", notes=page.items, page=page)
 
 
 @admin_bp.route("/delete_file/<int:note_id>", methods=["POST"])
@@ -136,22 +131,14 @@ def hard_delete_note(note_id):
         note = s.get(Note, note_id)
         if not note:
             abort(404)
-        # remove file from disk if exists
-        upload_dir = current_app.config.get("UPLOAD_FOLDER")
-        if upload_dir and note.file_path:
-            fpath = os.path.join(upload_dir, note.file_path)
-            try:
-                if os.path.exists(fpath):
-                    os.remove(fpath)
-            except Exception as e:
-                # log but continue
-                print("Failed to remove file:", fpath, e)
+        file_path = note.file_path
         # delete purchases referencing the note (if Purchase model exists)
         try:
-            from ..models import Purchase
-            purchases = s.query(Purchase).filter(Purchase.note_id==note.id).all()
+            purchases = s.execute(queries.note_purchases(note.id)).scalars().all()
             for p in purchases:
                 s.delete(p)
+            from ..models import SellerDailySales
+            s.query(SellerDailySales).filter(SellerDailySales.note_id==note.id).delete()
         except Exception:
             pass
         # record action
@@ -160,5 +147,15 @@ def hard_delete_note(note_id):
         # finally delete note record
         s.delete(note)
         s.commit()
+        # El archivo puede ser compartido (mismo PDF en otro apunte): se borra
+        # sólo si ya no lo referencia nadie
+        upload_dir = current_app.config.get("UPLOAD_FOLDER")
+        if upload_dir:
+            try:
+                if blobstore.release(s, upload_dir, file_path):
+                    previews.remove(current_app.config["PREVIEW_DIR"], file_path)
+            except Exception as e:
+                # log but continue
+                print("Failed to remove file:", file_path, e)
     flash("El apunte y archivo fueron eliminados permanentemente.", "success")
     return redirect(url_for("admin.files_index_admin"))
@@ -1,190 +1,185 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from apuntesya2.models import WebhookEvent
-from flask import redirect
-from flask import render_template
-from flask import request, redirect, url_for, flash
+"""
+App principal de ApuntesYa.
+
+`create_app()` arma la app (config, DB, login y blueprints). Importar este
+módulo no tiene efectos secundarios: `apuntesya2.app:app` (gunicorn, wsgi.py,
+`flask --app apuntesya2.app`) crea la app recién al primer acceso. Los módulos
+pesados (`mp` → requests, `email_utils` → smtplib) se importan dentro de las
+rutas que los usan.
+"""
 import os
-import secrets
-import math
+import gzip
+import time
+import json
+import shutil
+import hashlib
 from datetime import datetime, timedelta
-from urllib.parse import urlencode
 
-from dotenv import load_dotenv
+import click
+
 from flask import (
-    Flask, render_template, request, redirect, url_for, flash,
-    send_from_directory, abort, jsonify
+    Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash,
+    abort, jsonify, send_file
 )
+from markupsafe import Markup, escape
 from flask_login import (
     LoginManager, login_user, logout_user, current_user, login_required
 )
-from sqlalchemy import create_engine, select, or_, and_, func
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import select
+from werkzeug.exceptions import HTTPException
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 
-load_dotenv()
+from apuntesya2 import (
+    avatars, blobstore, cache, db, downloads, entitlements, exports, migrations, payment_status, pdf_text,
+    previews, principals, queries, sales_rollup, search_index, seller_tokens, signed_urls, taxonomy, uploads,
+    webhooks,
+)
+from apuntesya2.config import app_defaults
+from apuntesya2.db import Session
+from apuntesya2.models import User, Note, Purchase, University, Faculty, Career, UploadSession
+from apuntesya2.pagination import paginate
+
+# Rutas de la app (sin prefijo); create_app lo registra
+bp = Blueprint("main", __name__, cli_group=None)
 
 # -----------------------------------------------------------------------------
-# App
+# Inicio de sesión
 # -----------------------------------------------------------------------------
-app = Flask(__name__, instance_relative_config=True)
+login_manager = LoginManager()
+login_manager.login_view = "main.login"
 
-# --- MP immediate fee estimate available in templates ---
-try:
-    MP_FEE_IMMEDIATE_TOTAL_PCT = float(app.config.get("MP_FEE_IMMEDIATE_TOTAL_PCT", 7.61))
-except Exception:
-    MP_FEE_IMMEDIATE_TOTAL_PCT = 7.61
+@login_manager.user_loader
+def load_user(user_id):
+    # Principal cacheado (sin consulta a la DB por request); ver principals.py
+    return principals.load(int(user_id))
 
-@app.context_processor
+# -----------------------------------------------------------------------------
+# Contexto de templates (fees / contacto)
+# -----------------------------------------------------------------------------
+@bp.app_context_processor
 def fees_ctx():
-    def mp_fee_estimate(amount, pct=MP_FEE_IMMEDIATE_TOTAL_PCT):
+    pct_default = current_app.config["MP_FEE_IMMEDIATE_TOTAL_PCT"]
+    def mp_fee_estimate(amount, pct=pct_default):
         try:
             return round(float(amount) * (float(pct) / 100.0), 2)
         except Exception:
             return 0.0
-    return dict(MP_FEE_IMMEDIATE_TOTAL_PCT=MP_FEE_IMMEDIATE_TOTAL_PCT, mp_fee_estimate=mp_fee_estimate)
-
-
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", secrets.token_hex(16))
-app.config["ENV"] = os.getenv("FLASK_ENV", "production")
+    return dict(MP_FEE_IMMEDIATE_TOTAL_PCT=pct_default, mp_fee_estimate=mp_fee_estimate)
 
-# -----------------------------------------------------------------------------
-# Paths (Render usa /tmp; local usa ./data)
-# -----------------------------------------------------------------------------
-HERE = os.path.dirname(os.path.abspath(__file__))
-PROJECT_ROOT = os.path.dirname(HERE)
-
-if os.getenv("RENDER", "").strip() == "1":
-    BASE_DATA = "/tmp/data"
-else:
-    BASE_DATA = os.path.join(PROJECT_ROOT, "data")
-
-UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(BASE_DATA, "uploads"))
-os.makedirs(BASE_DATA, exist_ok=True)
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-app.config["UPLOAD_FOLDER"] = UPLOAD_DIR
-app.config["MAX_CONTENT_LENGTH"] = 25 * 1024 * 1024  # 25MB
+@bp.app_context_processor
+def inject_contacts():
+    emails = [e.strip() for e in str(current_app.config.get("CONTACT_EMAILS","")).split(",") if e.strip()]
+    return dict(CONTACT_EMAILS=emails,
+                CONTACT_WHATSAPP=current_app.config.get("CONTACT_WHATSAPP"),
+                SUGGESTIONS_URL=current_app.config.get("SUGGESTIONS_URL"))
 
 # -----------------------------------------------------------------------------
-# DB URL (SQLite por defecto)
+# Utils
 # -----------------------------------------------------------------------------
-DEFAULT_DB = f"sqlite:///{os.path.join(BASE_DATA, 'apuntesya.db')}"
-DB_URL = os.getenv("DATABASE_URL", DEFAULT_DB)
+def allowed_pdf(filename: str) -> bool:
+    return "." in filename and filename.rsplit(".", 1)[1].lower() == "pdf"
 
-engine_kwargs = {"pool_pre_ping": True, "future": True}
-if DB_URL.startswith("sqlite"):
-    engine_kwargs["connect_args"] = {"check_same_thread": False}
-engine = create_engine(DB_URL, **engine_kwargs)
+def ensure_dirs():
+    os.makedirs(current_app.config["UPLOAD_FOLDER"], exist_ok=True)
+
+def wants_json() -> bool:
+    if request.args.get("format") == "json":
+        return True
+    return request.accept_mimetypes["application/json"] > request.accept_mimetypes["text/html"]
+
+def page_args():
+    """Cursores de la query string (?after=... / ?before=...)."""
+    return dict(after=request.args.get("after"), before=request.args.get("before"))
+
+@bp.app_template_global()
+def page_url(**cursor):
+    """URL de la página actual cambiando sólo el cursor (conserva los filtros)."""
+    args = {k: v for k, v in request.args.items() if k not in ("after", "before")}
+    args.update({k: v for k, v in cursor.items() if v})
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+@bp.app_template_global()
+def avatar_urls(user, px):
+    """src/srcset de la foto de perfil (ver avatars.urls y templates/_avatar.html)."""
+    return avatars.urls(user, px)
+
+@bp.app_template_filter()
+def snippet_html(snippet):
+    """Fragmento de page_hits con la coincidencia en <mark> (el resto escapado)."""
+    return (escape(snippet).replace(search_index.MARK_START, Markup("<mark>"))
+            .replace(search_index.MARK_END, Markup("</mark>")))
+
+@bp.app_template_global()
+def preview_url(note, variant="page"):
+    """URL de la preview de la primera página, o None (el template muestra el placeholder)."""
+    return previews.url(note, variant)
+
+def download_name(note: Note) -> str:
+    # El archivo en disco se llama por su hash; al usuario se le ofrece el título
+    ext = os.path.splitext(note.file_path)[1] or ".pdf"
+    return (secure_filename(note.title or "") or f"apunte_{note.id}") + ext
+
+def note_json(n: Note) -> dict:
+    return {
+        "id": n.id, "title": n.title, "university": n.university, "faculty": n.faculty,
+        "career": n.career, "price_cents": n.price_cents,
+        "created_at": n.created_at.isoformat() if n.created_at else None,
+    }
+
+def page_json(page, items):
+    return jsonify(items=items, next=page.next_cursor, prev=page.prev_cursor)
 
 # -----------------------------------------------------------------------------
-# Modelos e inicio de sesión
+# App factory
 # -----------------------------------------------------------------------------
-from apuntesya2.models import Base, User, Note, Purchase, University, Faculty, Career
-
-# Crear tablas
-Base.metadata.create_all(engine)
-
-# Sesión global
-Session = scoped_session(sessionmaker(bind=engine, autoflush=False, expire_on_commit=False))
-
-login_manager = LoginManager(app)
-login_manager.login_view = "login"
-
-@login_manager.user_loader
-def load_user(user_id):
-    with Session() as s:
-        return s.get(User, int(user_id))
-
-# -----------------------------------------------------------------------------
-# Config MP / Comisiones / Mail / Contact
-# -----------------------------------------------------------------------------
-# Mercado Pago
-app.config["MP_PUBLIC_KEY"] = os.getenv("MP_PUBLIC_KEY", "")
-app.config["MP_ACCESS_TOKEN"] = os.getenv("MP_ACCESS_TOKEN", "")
-app.config["MP_WEBHOOK_SECRET"] = os.getenv("MP_WEBHOOK_SECRET", "")
-app.config["BASE_URL"] = os.getenv("BASE_URL", "")
-
-# Comisiones
-app.config["PLATFORM_FEE_PERCENT"] = float(os.getenv("MP_PLATFORM_FEE_PERCENT", "5.0"))
-app.config["MP_COMMISSION_RATE"] = float(os.getenv("MP_COMMISSION_RATE", "0.0774"))
-app.config["APY_COMMISSION_RATE"] = float(os.getenv("APY_COMMISSION_RATE", "0.05"))
-app.config["IIBB_ENABLED"] = os.getenv("IIBB_ENABLED", "false").lower() in ("1", "true", "yes")
-app.config["IIBB_RATE"] = float(os.getenv("IIBB_RATE", "0.0"))
-
-MP_COMMISSION_RATE = app.config["MP_COMMISSION_RATE"]
-APY_COMMISSION_RATE = app.config["APY_COMMISSION_RATE"]
-IIBB_ENABLED = app.config["IIBB_ENABLED"]
-IIBB_RATE = app.config["IIBB_RATE"]
-
-# Token plataforma (fallback si el vendedor no vinculó MP)
-app.config["MP_ACCESS_TOKEN_PLATFORM"] = os.getenv("MP_ACCESS_TOKEN", "")
-app.config["MP_OAUTH_REDIRECT_URL"] = os.getenv("MP_OAUTH_REDIRECT_URL")
-
-# Password reset (si tu blueprint existe)
-app.config.setdefault("SECURITY_PASSWORD_SALT", os.getenv("SECURITY_PASSWORD_SALT", "pw-reset"))
-app.config.setdefault("PASSWORD_RESET_EXPIRATION", int(os.getenv("PASSWORD_RESET_EXPIRATION", "3600")))
-app.config.setdefault("ENABLE_SMTP", os.getenv("ENABLE_SMTP", "false"))
-
-# Contacto
-app.config["CONTACT_EMAILS"] = os.getenv("CONTACT_EMAILS", "soporte.apuntesya@gmail.com")
-app.config["CONTACT_WHATSAPP"] = os.getenv("CONTACT_WHATSAPP", "+543510000000")
-app.config["SUGGESTIONS_URL"] = os.getenv("SUGGESTIONS_URL",
-    "https://docs.google.com/forms/d/e/1FAIpQLScDEukn0sLtjOoWgmvTNaF_qG0iDHue9EOqCYxz_z6bGxzErg/viewform?usp=header"
-)
-
-@app.context_processor
-def inject_contacts():
-    emails = [e.strip() for e in str(app.config.get("CONTACT_EMAILS","")).split(",") if e.strip()]
-    return dict(CONTACT_EMAILS=emails,
-                CONTACT_WHATSAPP=app.config.get("CONTACT_WHATSAPP"),
-                SUGGESTIONS_URL=app.config.get("SUGGESTIONS_URL"))
-
-# MP helpers
-from apuntesya2 import mp
+def create_app(config: dict | None = None) -> Flask:
+    """Crea la app. `config` pisa los valores por defecto (ver config.app_defaults)."""
+    app = Flask(__name__, instance_relative_config=True)
+    app.request_class = uploads.StreamingRequest
+    app.config.from_mapping(app_defaults())
+    if config:
+        app.config.from_mapping(config)
+    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
-def get_valid_seller_token(seller: User) -> str | None:
-    return seller.mp_access_token if (seller and seller.mp_access_token) else None
+    db.init_app(app)
+    cache.init_app(app)
+    webhooks.init_app(app)
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
 
-# -----------------------------------------------------------------------------
-# Admin blueprint (si existe)
-# -----------------------------------------------------------------------------
-# --- Admin (opcional) ---
-try:
-    from .admin.routes import admin_bp
-except Exception:
+    # --- Admin (opcional) ---
     try:
-        from admin.routes import admin_bp
+        from apuntesya2.admin.routes import admin_bp
     except Exception:
+        app.logger.exception("No se pudo cargar el panel admin")
         admin_bp = None
+    if admin_bp:
+        app.register_blueprint(admin_bp)
 
-from apuntesya2.auth_reset.routes import bp as auth_reset_bp
-
+    from apuntesya2.auth_reset.routes import bp as auth_reset_bp
+    app.register_blueprint(auth_reset_bp)
+    return app
 
-if admin_bp:
-    app.register_blueprint(admin_bp)
-
-app.register_blueprint(auth_reset_bp)
-# -----------------------------------------------------------------------------
-# Utils
-# -----------------------------------------------------------------------------
-def allowed_pdf(filename: str) -> bool:
-    return "." in filename and filename.rsplit(".", 1)[1].lower() == "pdf"
-
-def ensure_dirs():
-    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+def __getattr__(name):
+    # `from apuntesya2.app import app` crea la app la primera vez (y una sola)
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # -----------------------------------------------------------------------------
 # Health
 # -----------------------------------------------------------------------------
-@app.get("/health")
+@bp.get("/health")
 def health():
     return {"ok": True}, 200
 
 # -----------------------------------------------------------------------------
 # PROMOTE ADMIN (habilitado sólo con ENVs)
 # -----------------------------------------------------------------------------
-@app.route("/_promote_admin_once", methods=["GET"])
+@bp.route("/_promote_admin_once", methods=["GET"])
 def _promote_admin_once():
     if os.getenv("PROMOTE_ADMIN_ENABLED", "0") != "1":
         abort(404)
@@ -199,27 +194,27 @@ def _promote_admin_once():
         return "Falta ?email=", 400
 
     with Session() as s:
-        user = s.execute(select(User).where(User.email == email)).scalar_one_or_none()
+        user = s.execute(queries.user_by_email(email)).scalar_one_or_none()
         if not user:
             return "Usuario no encontrado", 404
         user.is_admin = True
         s.commit()
 
-    app.logger.warning("Promovido a admin: %s", email)
+    current_app.logger.warning("Promovido a admin: %s", email)
     return f"OK. {email} ahora es admin."
 
 # -----------------------------------------------------------------------------
 # Rutas principales
 # -----------------------------------------------------------------------------
-@app.route("/")
+@bp.route("/")
 def index():
     with Session() as s:
-        notes = s.execute(
-            select(Note).where(Note.is_active == True).order_by(Note.created_at.desc()).limit(30)
-        ).scalars().all()
-    return render_template("index.html", notes=notes)
+        page = paginate(s, *queries.catalog(), limit=30, **page_args())
+    if wants_json():
+        return page_json(page, [note_json(n) for n in page.items])
+    return render_template("index.html", notes=page.items, page=page)
 
-@app.route("/search")
+@bp.route("/search")
 def search():
     q = request.args.get("q", "").strip()
     university = request.args.get("university", "").strip()
@@ -228,26 +223,28 @@ def search():
     t = request.args.get("type", "")
 
     with Session() as s:
-        stmt = select(Note).where(Note.is_active == True)
-        if q:
-            stmt = stmt.where(or_(Note.title.ilike(f"%{q}%"), Note.description.ilike(f"%{q}%")))
-        if university:
-            stmt = stmt.where(Note.university.ilike(f"%{university}%"))
-        if faculty:
-            stmt = stmt.where(Note.faculty.ilike(f"%{faculty}%"))
-        if career:
-            stmt = stmt.where(Note.career.ilike(f"%{career}%"))
-        if t == "free":
-            stmt = stmt.where(Note.price_cents == 0)
-        elif t == "paid":
-            stmt = stmt.where(Note.price_cents > 0)
-        notes = s.execute(stmt.order_by(Note.created_at.desc()).limit(100)).scalars().all()
-    return render_template("index.html", notes=notes)
+        # Con texto se pagina por relevancia (rank, id); sin texto, por fecha
+        stmt, keys, descending = queries.search(
+            s.get_bind(), q=q, university=university, faculty=faculty, career=career, type_=t
+        )
+        page = paginate(s, stmt, keys, limit=100, descending=descending, **page_args())
+        # Página del PDF donde coincide el texto, con un fragmento
+        hits = search_index.page_hits(s, [n.id for n in page.items], q) if q else {}
+    if wants_json():
+        items = []
+        for n in page.items:
+            item = note_json(n)
+            if n.id in hits:
+                item["match"] = {"page": hits[n.id][0], "snippet": hits[n.id][1]
+                                 .replace(search_index.MARK_START, "").replace(search_index.MARK_END, "")}
+            items.append(item)
+        return page_json(page, items)
+    return render_template("index.html", notes=page.items, page=page, hits=hits)
 
 # -----------------------------------------------------------------------------
 # Auth
 # -----------------------------------------------------------------------------
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 def register():
     if request.method == "POST":
         name = request.form["name"].strip()
@@ -257,10 +254,10 @@ def register():
         faculty = request.form["faculty"].strip()
         career = request.form["career"].strip()
         with Session() as s:
-            exists = s.execute(select(User).where(User.email == email)).scalar_one_or_none()
+            exists = s.execute(queries.user_by_email(email)).scalar_one_or_none()
             if exists:
                 flash("Ese email ya está registrado.")
-                return redirect(url_for("register"))
+                return redirect(url_for(".register"))
             u = User(
                 name=name, email=email, password_hash=generate_password_hash(password),
                 university=university, faculty=faculty, career=career
@@ -268,43 +265,42 @@ def register():
             s.add(u)
             s.commit()
             login_user(u)
-            return redirect(url_for("index"))
+            return redirect(url_for(".index"))
     return render_template("register.html")
 
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         email = request.form["email"].strip().lower()
         password = request.form["password"]
         with Session() as s:
-            u = s.execute(select(User).where(User.email == email)).scalar_one_or_none()
+            u = s.execute(queries.user_by_email(email)).scalar_one_or_none()
             if not u or not check_password_hash(u.password_hash, password):
                 flash("Credenciales inválidas.")
-                return redirect(url_for("login"))
+                return redirect(url_for(".login"))
             login_user(u)
-            return redirect(url_for("index"))
+            return redirect(url_for(".index"))
     return render_template("login.html")
 
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     logout_user()
-    return redirect(url_for("index"))
+    return redirect(url_for(".index"))
 
 # -----------------------------------------------------------------------------
 # Perfil
 # -----------------------------------------------------------------------------
-@app.route("/profile")
+@bp.route("/profile")
 @login_required
 def profile():
     with Session() as s:
-        my_notes = s.execute(
-            select(Note).where(Note.seller_id == current_user.id).order_by(Note.created_at.desc())
-        ).scalars().all()
-    return render_template("profile.html", my_notes=my_notes)
+        page = paginate(s, *queries.seller_notes(current_user.id), limit=30, **page_args())
+    if wants_json():
+        return page_json(page, [note_json(n) for n in page.items])
+    return render_template("profile.html", my_notes=page.items, page=page)
 
-@app.route("/profile/balance")
-@login_required
-def profile_balance():
+def balance_range():
+    """[start, end) del balance desde ?start=&end= (días inclusivos; default: mes en curso)."""
     fmt = "%Y-%m-%d"
     today = datetime.utcnow().date()
     default_start = today.replace(day=1)
@@ -317,109 +313,73 @@ def profile_balance():
     except Exception:
         start = datetime(default_start.year, default_start.month, 1)
         end = datetime(today.year, today.month, today.day) + timedelta(days=1)
+    return start, end
 
-    with Session() as s:
-        base_filter = and_(
-            Note.seller_id == current_user.id,
-            Purchase.status == "approved",
-            Purchase.created_at >= start,
-            Purchase.created_at < end
-        )
-
-        totals = s.execute(
-            select(
-                func.count(Purchase.id),
-                func.coalesce(func.sum(Purchase.amount_cents), 0)
-            ).join(Note, Note.id == Purchase.note_id).where(base_filter)
-        ).one()
-        sold_count = int(totals[0] or 0)
-        gross_cents = int(totals[1] or 0)
-
-        mp_commission_cents  = int(round(gross_cents * float(MP_COMMISSION_RATE)))
-        apy_commission_cents = int(round(gross_cents * float(APY_COMMISSION_RATE)))
-        net_cents = gross_cents - mp_commission_cents - apy_commission_cents
+@bp.route("/profile/balance")
+@login_required
+def profile_balance():
+    mp_rate = float(current_app.config["MP_COMMISSION_RATE"])
+    apy_rate = float(current_app.config["APY_COMMISSION_RATE"])
+    fmt = "%Y-%m-%d"
+    start, end = balance_range()
 
-        # Detalle por apunte (+ conversión si hay 'views')
+    with Session() as s:
+        # Días completos desde seller_daily_sales; compras sólo en las puntas (ver sales_rollup.py)
+        sales = sales_rollup.sales(s, current_user.id, start, end)
         has_views = hasattr(Note, "views")
-        if has_views:
-            rows = s.execute(
-                select(
-                    Note.id, Note.title, Note.views,
-                    func.count(Purchase.id).label("sold_count"),
-                    func.coalesce(func.sum(Purchase.amount_cents), 0).label("gross_cents")
-                )
-                .join(Purchase, Purchase.note_id == Note.id, isouter=True)
-                .where(Note.seller_id == current_user.id, Purchase.created_at >= start, Purchase.created_at < end)
-                .group_by(Note.id, Note.title, Note.views)
-                .order_by(func.count(Purchase.id).desc())
-            ).all()
-        else:
-            rows = s.execute(
-                select(
-                    Note.id, Note.title,
-                    func.count(Purchase.id).label("sold_count"),
-                    func.coalesce(func.sum(Purchase.amount_cents), 0).label("gross_cents")
-                )
-                .join(Purchase, Purchase.note_id == Note.id, isouter=True)
-                .where(Note.seller_id == current_user.id, Purchase.created_at >= start, Purchase.created_at < end)
-                .group_by(Note.id, Note.title)
-                .order_by(func.count(Purchase.id).desc())
-            ).all()
-
-        per_note = []
-        for r in rows:
-            if has_views:
-                _id, _title, _views, _sold, _gross = r
-                views = int(_views or 0)
-                sold  = int(_sold or 0)
-                gross = int(_gross or 0)
-            else:
-                _id, _title, _sold, _gross = r
-                views = None
-                sold  = int(_sold or 0)
-                gross = int(_gross or 0)
-
-            mp_c  = int(round(gross * float(MP_COMMISSION_RATE)))
-            apy_c = int(round(gross * float(APY_COMMISSION_RATE)))
-            per_note.append({
-                "id": _id,
-                "title": _title,
-                "sold_count": sold,
-                "gross_cents": gross,
-                "mp_commission_cents": mp_c,
-                "apy_commission_cents": apy_c,
-                "net_cents": gross - mp_c - apy_c,
-                "views": views,
-                "conversion": (sold / views * 100.0) if (views and views > 0) else None
-            })
+        notes = {r[0]: r for r in s.execute(queries.balance_notes(sales)).all()} if sales else {}
+
+    sold_count = sum(n for n, _ in sales.values())
+    gross_cents = sum(g for _, g in sales.values())
+    mp_commission_cents  = int(round(gross_cents * mp_rate))
+    apy_commission_cents = int(round(gross_cents * apy_rate))
+    net_cents = gross_cents - mp_commission_cents - apy_commission_cents
+
+    # Detalle por apunte (+ conversión si hay 'views')
+    per_note = []
+    for note_id, (sold, gross) in sales.items():
+        row = notes.get(note_id)
+        if row is None:
+            continue
+        views = int(row[2] or 0) if has_views else None
+        mp_c  = int(round(gross * mp_rate))
+        apy_c = int(round(gross * apy_rate))
+        per_note.append({
+            "id": note_id,
+            "title": row[1],
+            "sold_count": sold,
+            "gross_cents": gross,
+            "mp_commission_cents": mp_c,
+            "apy_commission_cents": apy_c,
+            "net_cents": gross - mp_c - apy_c,
+            "views": views,
+            "conversion": (sold / views * 100.0) if (views and views > 0) else None
+        })
+    per_note.sort(key=lambda r: r["sold_count"], reverse=True)
 
     return render_template(
         "profile_balance.html",
-        IIBB_ENABLED=IIBB_ENABLED, IIBB_RATE=IIBB_RATE, sold_count=sold_count,
+        IIBB_ENABLED=current_app.config["IIBB_ENABLED"], IIBB_RATE=current_app.config["IIBB_RATE"], sold_count=sold_count,
         total_cents=gross_cents,
         mp_commission_cents=mp_commission_cents,
         apy_commission_cents=apy_commission_cents,
         net_cents=net_cents,
         per_note=per_note,
-        start=start_str,
+        start=start.strftime(fmt),
         end=(end - timedelta(days=1)).strftime(fmt),
-        MP_COMMISSION_RATE=MP_COMMISSION_RATE,
-        APY_COMMISSION_RATE=APY_COMMISSION_RATE
+        MP_COMMISSION_RATE=mp_rate,
+        APY_COMMISSION_RATE=apy_rate,
+        xlsx_export=exports.xlsx_available()
     )
 
-@app.route("/profile/purchases")
+@bp.route("/profile/purchases")
 @login_required
 def profile_purchases():
     with Session() as s:
-        purchases = s.execute(
-            select(Purchase, Note)
-            .join(Note, Note.id == Purchase.note_id)
-            .where(Purchase.buyer_id == current_user.id, Purchase.status == 'approved')
-            .order_by(Purchase.created_at.desc())
-        ).all()
+        page = paginate(s, *queries.buyer_purchases(current_user.id), limit=30, **page_args())
 
         items = []
-        for p, n in purchases:
+        for p, n in page.items:
             items.append(dict(
                 id=p.id,
                 note_id=n.id,
@@ -427,15 +387,51 @@ def profile_purchases():
                 price_cents=p.amount_cents,
                 created_at=p.created_at.strftime("%Y-%m-%d %H:%M")
             ))
-    return render_template("profile_purchases.html", items=items)
+    if wants_json():
+        return page_json(page, items)
+    return render_template("profile_purchases.html", items=items, page=page,
+                           xlsx_export=exports.xlsx_available())
+
+@bp.route("/profile/balance/export.<fmt>")
+@login_required
+def export_balance(fmt):
+    """Ventas del período en CSV/XLSX, en streaming (ver exports.py)."""
+    if fmt not in exports.FORMATS or (fmt == "xlsx" and not exports.xlsx_available()):
+        abort(404)
+    cfg = current_app.config
+    start, end = balance_range()
+    rates = {"mp": float(cfg["MP_COMMISSION_RATE"]), "apy": float(cfg["APY_COMMISSION_RATE"]),
+             "iibb": float(cfg["IIBB_RATE"]) if cfg["IIBB_ENABLED"] else 0.0}
+    header, rows = exports.seller_sales(current_user.id, start, end, rates)
+    name = f"ventas_{start:%Y-%m-%d}_{end - timedelta(days=1):%Y-%m-%d}"
+    return exports.response(fmt, name, header, rows)
+
+@bp.route("/profile/purchases/export.<fmt>")
+@login_required
+def export_purchases(fmt):
+    if fmt not in exports.FORMATS or (fmt == "xlsx" and not exports.xlsx_available()):
+        abort(404)
+    header, rows = exports.buyer_purchases(current_user.id)
+    return exports.response(fmt, f"compras_{datetime.utcnow():%Y-%m-%d}", header, rows)
 
 # -----------------------------------------------------------------------------
 # Upload / Detail / Download
 # -----------------------------------------------------------------------------
-@app.route("/upload", methods=["GET", "POST"])
+@bp.route("/upload", methods=["GET", "POST"])
 @login_required
 def upload_note():
     if request.method == "POST":
+        # Cupo y destino del archivo antes de leer el cuerpo: el PDF se escribe
+        # en el blob store a medida que llega (ver uploads.py)
+        try:
+            with Session() as s:
+                uploads.check_quota(s, current_user.id)
+            uploads.expect_pdf(request)
+            request.form
+        except HTTPException as e:
+            flash(e.description)
+            return redirect(url_for(".upload_note"))
+
         title = request.form["title"].strip()
         description = request.form["description"].strip()
         university = request.form["university"].strip()
@@ -444,53 +440,128 @@ def upload_note():
         price = request.form.get("price", "").strip()
         price_cents = int(round(float(price) * 100)) if price else 0
 
+        # Subida reanudable ya completa (/upload/sessions) o archivo en el formulario
+        upload_id = request.form.get("upload_id", "").strip()
         file = request.files.get("file")
-        if not file or file.filename == "":
-            flash("Seleccioná un PDF.")
-            return redirect(url_for("upload_note"))
-        if not allowed_pdf(file.filename):
-            flash("Sólo PDF.")
-            return redirect(url_for("upload_note"))
-
-        ensure_dirs()
-        filename = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{secure_filename(file.filename)}"
-        fpath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(fpath)
+        if not upload_id:
+            if not file or file.filename == "":
+                flash("Seleccioná un PDF.")
+                return redirect(url_for(".upload_note"))
+            if not allowed_pdf(file.filename):
+                flash("Sólo PDF.")
+                return redirect(url_for(".upload_note"))
+            # Se guarda por contenido: un PDF idéntico a uno ya subido no se vuelve a escribir
+            try:
+                file_path = uploads.store_pdf(file).path
+            except HTTPException as e:
+                flash(e.description)
+                return redirect(url_for(".upload_note"))
 
         with Session() as s:
+            if upload_id:
+                file_path = uploads.take_completed(s, current_user.id, upload_id)
+                if not file_path:
+                    flash("La subida del archivo no terminó o expiró. Probá de nuevo.")
+                    return redirect(url_for(".upload_note"))
             note = Note(
                 title=title, description=description, university=university, faculty=faculty, career=career,
-                price_cents=price_cents, file_path=filename, seller_id=current_user.id
+                price_cents=price_cents, file_path=file_path, seller_id=current_user.id
             )
             s.add(note)
             s.commit()
+            # Preview y texto para la búsqueda, en segundo plano (ver previews.py y pdf_text.py)
+            previews.request_build(s, file_path)
+            pdf_text.request_index(s, file_path)
         flash("Apunte subido correctamente.")
-        return redirect(url_for("note_detail", note_id=note.id))
+        return redirect(url_for(".note_detail", note_id=note.id))
     return render_template("upload.html")
 
-@app.route("/note/<int:note_id>")
+@bp.post("/upload/sessions")
+@login_required
+def upload_session_create():
+    """Inicia una subida reanudable: {"size": bytes, "filename": "..."}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        size = int(data.get("size") or 0)
+    except (TypeError, ValueError):
+        return jsonify({"error": "size required"}), 400
+    filename = (data.get("filename") or "").strip()
+    if filename and not allowed_pdf(filename):
+        return jsonify({"error": "Sólo PDF."}), 415
+    try:
+        with Session() as s:
+            upload = uploads.create_session(s, current_app.config["UPLOAD_FOLDER"], current_user.id, size, filename)
+    except HTTPException as e:
+        return jsonify({"error": e.description}), e.code
+    url = url_for(".upload_session", upload_id=upload.id)
+    headers = {"Location": url, "Upload-Offset": "0", "Upload-Length": str(size)}
+    return jsonify({"id": upload.id, "url": url, "offset": 0}), 201, headers
+
+@bp.route("/upload/sessions/<upload_id>", methods=["HEAD", "PATCH", "DELETE"])
+@login_required
+def upload_session(upload_id):
+    root = current_app.config["UPLOAD_FOLDER"]
+    with Session() as s:
+        upload = s.get(UploadSession, upload_id)
+        if not upload or upload.user_id != current_user.id:
+            return jsonify({"error": "La subida no existe o expiró."}), 404
+        if request.method == "DELETE":
+            uploads.discard(s, root, upload)
+            return "", 204
+    headers = {"Upload-Length": str(upload.size), "Cache-Control": "no-store"}
+    if request.method == "HEAD":
+        headers["Upload-Offset"] = str(uploads.offset_of(root, upload))
+        return "", 200, headers
+
+    if request.mimetype != "application/offset+octet-stream":
+        return jsonify({"error": "Content-Type debe ser application/offset+octet-stream"}), 415
+    offset = request.headers.get("Upload-Offset", type=int)
+    if offset is None:
+        return jsonify({"error": "Falta Upload-Offset"}), 400
+    try:
+        new_offset, blob = uploads.append_chunk(root, upload, offset, request.stream)
+    except HTTPException as e:
+        headers["Upload-Offset"] = str(uploads.offset_of(root, upload))
+        return jsonify({"error": e.description}), e.code, headers
+    if blob:
+        with Session() as s:
+            upload = s.get(UploadSession, upload_id)
+            if upload is None:
+                # La borraron (DELETE o expiración) mientras llegaba el último pedazo: el
+                # blob queda sin referencia (si es recién escrito, lo borra `flask blobs-gc`)
+                blobstore.release(s, root, blob.path)
+                return jsonify({"error": "La subida no existe o expiró."}), 404
+            upload.blob_path = blob.path
+            s.commit()
+    headers["Upload-Offset"] = str(new_offset)
+    return "", 204, headers
+
+@bp.route("/note/<int:note_id>")
 def note_detail(note_id):
     with Session() as s:
         note = s.get(Note, note_id)
         if not note or not note.is_active:
             abort(404)
 
-        can_download = False
-        if current_user.is_authenticated:
-            if note.price_cents == 0 or note.seller_id == current_user.id:
-                can_download = True
-            else:
-                p = s.execute(
-                    select(Purchase).where(
-                        Purchase.buyer_id == current_user.id,
-                        Purchase.note_id == note.id,
-                        Purchase.status == 'approved'
-                    )
-                ).scalar_one_or_none()
-                can_download = p is not None
-    return render_template("note_detail.html", note=note, can_download=can_download)
-
-@app.route("/download/<int:note_id>")
+        can_download = current_user.is_authenticated and entitlements.can_download(s, current_user.id, note)
+        # Link firmado directo al archivo (ver signed_urls.py)
+        download_url = signed_urls.download_url(note, download_name(note)) if can_download else None
+    return render_template("note_detail.html", note=note, can_download=can_download, download_url=download_url)
+
+@bp.route("/preview/<sha256>-<variant>.webp")
+def note_preview(sha256, variant):
+    # Nombre = hash del PDF: el contenido de una URL no cambia nunca
+    path = previews.path_for(sha256, variant)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    previews.touch(path)
+    rv = send_file(path, mimetype="image/webp", conditional=True, etag=f"{sha256}-{variant}",
+                   max_age=previews.MAX_AGE)
+    rv.cache_control.public = True
+    rv.cache_control.immutable = True
+    return rv
+
+@bp.route("/download/<int:note_id>")
 @login_required
 def download_note(note_id):
     with Session() as s:
@@ -498,50 +569,56 @@ def download_note(note_id):
         if not note or not note.is_active:
             abort(404)
 
-        allowed = False
-        if note.seller_id == current_user.id or note.price_cents == 0:
-            allowed = True
-        else:
-            p = s.execute(
-                select(Purchase).where(
-                    Purchase.buyer_id == current_user.id,
-                    Purchase.note_id == note.id,
-                    Purchase.status == 'approved'
-                )
-            ).scalar_one_or_none()
-            allowed = p is not None
-
-        if not allowed:
+        if not entitlements.can_download(s, current_user.id, note, verify=True):
             flash("Necesitás comprar este apunte para descargarlo.")
-            return redirect(url_for("note_detail", note_id=note.id))
+            return redirect(url_for(".note_detail", note_id=note.id))
+        url = signed_urls.download_url(note, download_name(note))
+
+    # La transferencia la atiende /d/<token>, sin sesión de usuario
+    return redirect(url)
 
-        return send_from_directory(app.config["UPLOAD_FOLDER"], note.file_path, as_attachment=True)
+@bp.route("/d/<token>")
+def signed_download(token):
+    data = signed_urls.verify(token)
+    if data is None:
+        abort(404)
+    with Session() as s:
+        # Dado de baja o borrado después de emitir el token
+        note = s.get(Note, data["i"])
+        if not note or not note.is_active or note.file_path != data["p"]:
+            abort(404)
+    max_age = None
+    if data.get("pub"):  # apunte gratis: misma URL para todos hasta que vence
+        max_age = max(0, int(data["e"] - time.time()))
+    return downloads.send_upload(data["p"], data["n"], public_max_age=max_age)
 
 # -----------------------------------------------------------------------------
 # MP OAuth
 # -----------------------------------------------------------------------------
-@app.route("/mp/connect")
+@bp.route("/mp/connect")
 @login_required
 def connect_mp():
+    from apuntesya2 import mp
     return redirect(mp.oauth_authorize_url())
 
-@app.route("/mp/oauth/callback")
+@bp.route("/mp/oauth/callback")
 @login_required
 def mp_oauth_callback():
     if not current_user.is_authenticated:
         flash("Necesitás iniciar sesión para vincular Mercado Pago.")
-        return redirect(url_for("login"))
+        return redirect(url_for(".login"))
 
+    from apuntesya2 import mp
     code = request.args.get("code")
     if not code:
         flash("No se recibió 'code' de autorización.")
-        return redirect(url_for("profile"))
+        return redirect(url_for(".profile"))
 
     try:
         data = mp.oauth_exchange_code(code)
     except Exception as e:
         flash(f"Error al intercambiar código: {e}")
-        return redirect(url_for("profile"))
+        return redirect(url_for(".profile"))
 
     access_token = data.get("access_token")
     refresh_token = data.get("refresh_token")
@@ -556,11 +633,13 @@ def mp_oauth_callback():
         u.mp_refresh_token = refresh_token
         u.mp_token_expires_at = expires_at
         s.commit()
+    principals.invalidate(current_user.id)
+    seller_tokens.invalidate(current_user.id)
 
     flash("¡Cuenta de Mercado Pago conectada!")
-    return redirect(url_for("profile"))
+    return redirect(url_for(".profile"))
 
-@app.route("/mp/disconnect")
+@bp.route("/mp/disconnect")
 @login_required
 def disconnect_mp():
     with Session() as s:
@@ -570,13 +649,15 @@ def disconnect_mp():
         u.mp_refresh_token = None
         u.mp_token_expires_at = None
         s.commit()
+    principals.invalidate(current_user.id)
+    seller_tokens.invalidate(current_user.id)
     flash("Se desvinculó Mercado Pago.")
-    return redirect(url_for("profile"))
+    return redirect(url_for(".profile"))
 
 # -----------------------------------------------------------------------------
 # Comprar
 # -----------------------------------------------------------------------------
-@app.route("/buy/<int:note_id>")
+@bp.route("/buy/<int:note_id>")
 @login_required
 def buy_note(note_id):
     with Session() as s:
@@ -585,165 +666,192 @@ def buy_note(note_id):
             abort(404)
         if note.seller_id == current_user.id:
             flash("No podés comprar tu propio apunte.")
-            return redirect(url_for("note_detail", note_id=note.id))
+            return redirect(url_for(".note_detail", note_id=note.id))
         if note.price_cents == 0:
             flash("Este apunte es gratuito.")
-            return redirect(url_for("download_note", note_id=note.id))
-
-        seller = s.get(User, note.seller_id)
+            return redirect(url_for(".download_note", note_id=note.id))
+
+        # Si ya hay una compra pendiente reciente del mismo apunte al mismo precio,
+        # se reusa su preferencia (no se llama a MP de nuevo)
+        reuse_since = datetime.utcnow() - timedelta(seconds=current_app.config["MP_PREFERENCE_REUSE_SECONDS"])
+        pending = s.execute(
+            queries.reusable_purchase(current_user.id, note.id, note.price_cents, reuse_since)
+        ).scalars().first()
+        if pending:
+            return redirect(pending.init_point)
+
+        # Token vigente desde memoria; los refresh corren en segundo plano (seller_tokens.py)
+        seller_token = seller_tokens.get(s, note.seller_id)
         p = Purchase(buyer_id=current_user.id, note_id=note.id, status="pending", amount_cents=note.price_cents)
         s.add(p)
         s.commit()
+        title = note.title
+
+    # Sin sesión de DB abierta mientras se espera a MP
+    price_ars = round(p.amount_cents / 100, 2)
+    platform_fee_percent = (current_app.config["PLATFORM_FEE_PERCENT"] / 100.0)
+    back_urls = {
+        "success": url_for(".mp_return", note_id=note_id, _external=True) + f"?external_reference=purchase:{p.id}",
+        "failure": url_for(".mp_return", note_id=note_id, _external=True) + f"?external_reference=purchase:{p.id}",
+        "pending": url_for(".mp_return", note_id=note_id, _external=True) + f"?external_reference=purchase:{p.id}",
+    }
+
+    from apuntesya2 import mp
+    try:
+        if seller_token is None:
+            use_token = current_app.config["MP_ACCESS_TOKEN_PLATFORM"]
+            marketplace_fee = 0.0
+            flash("El vendedor no tiene Mercado Pago vinculado. Se procesa con token de la plataforma y sin comisión.", "info")
+        else:
+            use_token = seller_token
+            marketplace_fee = round(price_ars * platform_fee_percent, 2)
+
+        pref = mp.create_preference_for_seller_token(
+            seller_access_token=use_token,
+            title=title,
+            unit_price=price_ars,
+            quantity=1,
+            marketplace_fee=marketplace_fee,
+            external_reference=f"purchase:{p.id}",
+            back_urls=back_urls,
+            notification_url=url_for(".mp_webhook", _external=True)
+        )
+    except Exception as e:
+        flash(f"Error al crear preferencia en Mercado Pago: {e}")
+        return redirect(url_for(".note_detail", note_id=note_id))
 
-        price_ars = round(note.price_cents / 100, 2)
-        platform_fee_percent = (app.config["PLATFORM_FEE_PERCENT"] / 100.0)
-        back_urls = {
-            "success": url_for("mp_return", note_id=note.id, _external=True) + f"?external_reference=purchase:{p.id}",
-            "failure": url_for("mp_return", note_id=note.id, _external=True) + f"?external_reference=purchase:{p.id}",
-            "pending": url_for("mp_return", note_id=note.id, _external=True) + f"?external_reference=purchase:{p.id}",
-        }
-
-        try:
-            seller_token = get_valid_seller_token(seller)
-            if seller_token is None:
-                use_token = app.config["MP_ACCESS_TOKEN_PLATFORM"]
-                marketplace_fee = 0.0
-                flash("El vendedor no tiene Mercado Pago vinculado. Se procesa con token de la plataforma y sin comisión.", "info")
-            else:
-                use_token = seller_token
-                marketplace_fee = round(price_ars * platform_fee_percent, 2)
-
-            pref = mp.create_preference_for_seller_token(
-                seller_access_token=use_token,
-                title=note.title,
-                unit_price=price_ars,
-                quantity=1,
-                marketplace_fee=marketplace_fee,
-                external_reference=f"purchase:{p.id}",
-                back_urls=back_urls,
-                notification_url=url_for("mp_webhook", _external=True)
-            )
-
-            with Session() as s2:
-                p2 = s2.get(Purchase, p.id)
-                if p2:
-                    p2.preference_id = pref.get("id") or pref.get("preference_id")
-                    s2.commit()
-            init_point = pref.get("init_point") or pref.get("sandbox_init_point")
-            return redirect(init_point)
-        except Exception as e:
-            flash(f"Error al crear preferencia en Mercado Pago: {e}")
-            return redirect(url_for("note_detail", note_id=note.id))
+    init_point = pref.get("init_point") or pref.get("sandbox_init_point")
+    with Session() as s:
+        p2 = s.get(Purchase, p.id)
+        if p2:
+            p2.preference_id = pref.get("id") or pref.get("preference_id")
+            p2.init_point = init_point
+            s.commit()
+    return redirect(init_point)
 
 # -----------------------------------------------------------------------------
 # MP return + webhook
 # -----------------------------------------------------------------------------
-@app.route("/mp/return/<int:note_id>")
+# Compras cuyo pago ya se encoló desde mp_return hace poco (por proceso)
+_return_checks = cache.LRUCache(maxsize=4096, ttl=60.0)
+
+@bp.route("/mp/return/<int:note_id>")
 def mp_return(note_id):
-    payment_id = request.args.get("payment_id") or request.args.get("collection_id") or request.args.get("id")
+    # Sin llamadas a MP: el estado lo actualizan los webhooks (webhooks.py) y
+    # el navegador lo espera en /purchase/<id> (ver payment_status.py)
+    payment_id = request.args.get("payment_id") or request.args.get("collection_id") or ""
     ext_ref = request.args.get("external_reference", "")
-    pref_id = request.args.get("preference_id", "")
-
-    token = app.config["MP_ACCESS_TOKEN_PLATFORM"]
-    pay = None
-
-    if payment_id:
-        try:
-            pay = mp.get_payment(token, str(payment_id))
-        except Exception as e:
-            flash(f"No se pudo verificar el pago aún: {e}")
-            return redirect(url_for("note_detail", note_id=note_id))
-    elif ext_ref:
-        try:
-            res = mp.search_payments_by_external_reference(token, ext_ref)
-            results = (res or {}).get("results") or []
-            if results:
-                pay = results[0].get("payment") or results[0]
-                payment_id = str(pay.get("id")) if pay else None
-        except Exception:
-            pass
-
-    if not pay:
-        with Session() as s:
-            p_last = s.execute(
-                select(Purchase).where(Purchase.note_id == note_id).order_by(Purchase.created_at.desc())
-            ).scalars().first()
-            if p_last:
-                try:
-                    res = mp.search_payments_by_external_reference(token, f"purchase:{p_last.id}")
-                    results = (res or {}).get("results") or []
-                    if results:
-                        pay = results[0].get("payment") or results[0]
-                        payment_id = str(pay.get("id")) if pay else None
-                        ext_ref = f"purchase:{p_last.id}"
-                except Exception:
-                    pass
-
-    status = (pay or {}).get("status")
-    external_reference = (pay or {}).get("external_reference") or ext_ref or ""
     purchase_id = None
-    if external_reference and external_reference.startswith("purchase:"):
+    if ext_ref.startswith("purchase:"):
         try:
-            purchase_id = int(external_reference.split(":")[1])
-        except Exception:
+            purchase_id = int(ext_ref.split(":", 1)[1])
+        except ValueError:
             purchase_id = None
 
     with Session() as s:
-        if purchase_id:
+        if purchase_id is None and current_user.is_authenticated:
+            purchase_id = s.execute(queries.last_purchase_of_note(current_user.id, note_id)).scalar()
+        # Por si el webhook todavía no llegó se encola el pago, pero la URL la puede
+        # armar cualquiera: sólo para una compra pendiente del usuario y una vez por minuto
+        if (payment_id.isdigit() and purchase_id is not None and current_user.is_authenticated
+                and not _return_checks.get(purchase_id)):
             p = s.get(Purchase, purchase_id)
-        else:
-            p = s.execute(
-                select(Purchase).where(Purchase.note_id == note_id).order_by(Purchase.created_at.desc())
-            ).scalars().first()
-
-        if p:
-            p.payment_id = str((pay or {}).get("id") or "")
-            if status:
-                p.status = status
-            s.commit()
+            if p and p.buyer_id == current_user.id and p.status == "pending":
+                _return_checks.set(purchase_id, True)
+                webhooks.record(s, {"topic": "payment", "id": payment_id}, None)
 
-        if status == "approved":
-            flash("¡Pago verificado! Descargando el apunte...")
-            return redirect(url_for("download_note", note_id=note_id))
+    if purchase_id is None:
+        flash("No encontramos una compra de este apunte. Si ya pagaste, se acreditará en unos minutos.")
+        return redirect(url_for(".note_detail", note_id=note_id))
+    return redirect(url_for(".purchase_status", purchase_id=purchase_id))
 
-    flash("Pago registrado. Si ya figura aprobado, el botón de descarga estará disponible.")
-    return redirect(url_for("note_detail", note_id=note_id))
 
-@app.route("/mp/webhook", methods=["POST", "GET"])
-def mp_webhook():
-    payment_id = request.args.get("id") or (request.json.get("data", {}).get("id") if request.is_json else None)
-    if not payment_id:
-        return ("ok", 200)
+def _own_purchase(purchase_id):
+    with Session() as s:
+        p = s.get(Purchase, purchase_id)
+        if not p or p.buyer_id != current_user.id:
+            abort(404)
+        return p.note_id, p.status
 
-    token = app.config["MP_ACCESS_TOKEN_PLATFORM"]
-    try:
-        pay = mp.get_payment(token, str(payment_id))
-    except Exception:
-        return ("ok", 200)
 
-    status = pay.get("status")
-    external_reference = pay.get("external_reference") or ""
-    if external_reference.startswith("purchase:"):
-        pid = int(external_reference.split(":")[1])
-        with Session() as s:
-            purchase = s.get(Purchase, pid)
-            if purchase:
-                purchase.payment_id = str(payment_id)
-                purchase.status = status
-                s.commit()
-    return ("ok", 200)
+def _status_payload(status, download_url):
+    data = {"status": status, "final": status in payment_status.FINAL}
+    if status == "approved":
+        data["download_url"] = download_url
+    return data
+
+
+@bp.route("/purchase/<int:purchase_id>")
+@login_required
+def purchase_status(purchase_id):
+    note_id, status = _own_purchase(purchase_id)
+    if status == "approved":
+        flash("¡Pago verificado! Descargando el apunte...")
+        return redirect(url_for(".download_note", note_id=note_id))
+    return render_template("purchase_status.html", purchase_id=purchase_id, note_id=note_id,
+                           status=status, final=status in payment_status.FINAL)
+
+
+@bp.route("/purchase/<int:purchase_id>/status")
+@login_required
+def purchase_status_stream(purchase_id):
+    """
+    Estado de la compra desde la DB local. Con `Accept: text/event-stream`
+    es un stream SSE (un evento por cambio, se cierra en un estado final o a
+    los PAYMENT_STATUS_WAIT segundos y el navegador reconecta); si no, JSON
+    con long-poll: `?since=<estado>` espera hasta que sea otro.
+    """
+    note_id, status = _own_purchase(purchase_id)
+    wait = current_app.config["PAYMENT_STATUS_WAIT"]
+    # El generador SSE corre fuera del request: la URL se arma antes
+    download_url = url_for(".download_note", note_id=note_id)
+
+    if request.accept_mimetypes.best == "text/event-stream":
+        def events():
+            st = status
+            yield f"retry: 3000\nevent: status\ndata: {json.dumps(_status_payload(st, download_url))}\n\n"
+            deadline = time.monotonic() + wait
+            while st not in payment_status.FINAL:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                new = payment_status.wait_change(purchase_id, st, min(15.0, left))
+                if new == st:
+                    yield ": keepalive\n\n"
+                    continue
+                st = new
+                yield f"event: status\ndata: {json.dumps(_status_payload(st, download_url))}\n\n"
+
+        return current_app.response_class(events(), mimetype="text/event-stream",
+                                          headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+    since = request.args.get("since")
+    if since == status and status not in payment_status.FINAL:
+        timeout = min(request.args.get("timeout", wait, type=float), wait)
+        status = payment_status.wait_change(purchase_id, since, max(0.0, timeout))
+    resp = jsonify(_status_payload(status, download_url))
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+@bp.route("/mp/webhook", methods=["POST", "GET"])
+def mp_webhook():
+    # Firma y encolado (webhook_events); el pago lo consulta un worker (ver webhooks.py)
+    with Session() as s:
+        status = webhooks.receive(s, request.args, request.get_json(silent=True), request.headers,
+                                  current_app.config["MP_WEBHOOK_SECRET"])
+    return ("ok", 200) if status == 200 else ("invalid signature", status)
 
 # -----------------------------------------------------------------------------
 # Términos
 # -----------------------------------------------------------------------------
-@app.route("/terms")
+@bp.route("/terms")
 def terms():
     return render_template("terms.html")
 
 # -----------------------------------------------------------------------------
 # Reportar apunte
 # -----------------------------------------------------------------------------
-@app.route("/note/<int:note_id>/report", methods=["POST"])
+@bp.route("/note/<int:note_id>/report", methods=["POST"])
 @login_required
 def report_note(note_id):
     with Session() as s:
@@ -754,56 +862,100 @@ def report_note(note_id):
             n.is_reported = True
             s.commit()
     flash("Gracias por tu reporte. Un administrador lo revisará.")
-    return redirect(url_for("note_detail", note_id=note_id))
+    return redirect(url_for(".note_detail", note_id=note_id))
 
 # -----------------------------------------------------------------------------
 # Taxonomías académicas (dropdowns que aprenden)
 # -----------------------------------------------------------------------------
+# Las lecturas salen de cache.taxonomy (LRU por worker + backend compartido);
+# los POST que agregan algo la invalidan. El navegador revalida con ETag (304).
 def _norm(s: str) -> str:
     return (s or "").strip()
 
-@app.get("/api/academics/universities")
+def _conditional_json(entry, **headers):
+    resp = current_app.response_class(entry.body, mimetype="application/json", headers=headers)
+    resp.set_etag(entry.etag)
+    resp.cache_control.public = True
+    resp.cache_control.no_cache = True  # siempre revalidar: un alta se ve enseguida
+    return resp.make_conditional(request)
+
+def _taxonomy_response(key, load_rows):
+    def loader():
+        with Session() as s:
+            return current_app.json.dumps(load_rows(s)).encode()
+    return _conditional_json(cache.taxonomy.get_or_load(key, loader))
+
+def _tree_entry():
+    def loader():
+        with Session() as s:
+            payload = taxonomy.tree_payload(s)
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+    return cache.taxonomy.get_or_load("tree", loader)
+
+@bp.get("/api/academics/tree")
+def api_academics_tree():
+    """Toda la taxonomía en un solo JSON (ver taxonomy.tree_payload); ya comprimido si se acepta gzip."""
+    entry = _tree_entry()
+    if request.accept_encodings["gzip"]:
+        gz = cache.taxonomy.get_or_load(f"tree.gz:{entry.etag}", lambda: gzip.compress(entry.body, 9))
+        resp = _conditional_json(gz, **{"Content-Encoding": "gzip"})
+    else:
+        resp = _conditional_json(entry)
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+@bp.get("/api/academics/suggest")
+def api_academics_suggest():
+    """Autocompletado: ?kind=university|faculty|career&q=...[&university_id=|&faculty_id=]"""
+    kind = request.args.get("kind", "university")
+    if kind not in taxonomy.KINDS:
+        return jsonify({"error": "kind must be university, faculty or career"}), 400
+    parent = taxonomy.PARENT_FIELD[kind]
+    parent_id = request.args.get(parent, type=int) if parent else None
+    limit = max(1, min(request.args.get("limit", 10, type=int), 50))
+    index = taxonomy.index_for(_tree_entry())
+    return jsonify(index.suggest(kind, request.args.get("q", ""), parent_id, limit))
+
+@bp.get("/api/academics/universities")
 def api_list_universities():
-    with Session() as s:
-        rows = s.execute(select(University).order_by(University.name)).scalars().all()
-        return jsonify([{"id": u.id, "name": u.name} for u in rows])
+    def rows(s):
+        return [{"id": u.id, "name": u.name}
+                for u in s.execute(queries.universities()).scalars()]
+    return _taxonomy_response("universities", rows)
 
-@app.get("/api/academics/faculties")
+@bp.get("/api/academics/faculties")
 def api_list_faculties():
     uid = request.args.get("university_id", type=int)
-    with Session() as s:
-        q = select(Faculty)
-        if uid:
-            q = q.where(Faculty.university_id == uid)
-        rows = s.execute(q.order_by(Faculty.name)).scalars().all()
-        return jsonify([{"id": f.id, "name": f.name, "university_id": f.university_id} for f in rows])
+    def rows(s):
+        return [{"id": f.id, "name": f.name, "university_id": f.university_id}
+                for f in s.execute(queries.faculties(uid)).scalars()]
+    return _taxonomy_response(f"faculties:{uid or ''}", rows)
 
-@app.get("/api/academics/careers")
+@bp.get("/api/academics/careers")
 def api_list_careers():
     fid = request.args.get("faculty_id", type=int)
-    with Session() as s:
-        q = select(Career)
-        if fid:
-            q = q.where(Career.faculty_id == fid)
-        rows = s.execute(q.order_by(Career.name)).scalars().all()
-        return jsonify([{"id": c.id, "name": c.name, "faculty_id": c.faculty_id} for c in rows])
+    def rows(s):
+        return [{"id": c.id, "name": c.name, "faculty_id": c.faculty_id}
+                for c in s.execute(queries.careers(fid)).scalars()]
+    return _taxonomy_response(f"careers:{fid or ''}", rows)
 
-@app.post("/api/academics/universities")
+@bp.post("/api/academics/universities")
 def api_add_university():
     data = request.get_json(silent=True) or {}
     name = _norm(data.get("name"))
     if not name:
         return jsonify({"error": "name required"}), 400
     with Session() as s:
-        u = s.execute(select(University).where(func.lower(University.name) == name.lower())).scalar_one_or_none()
+        u = s.execute(queries.university_by_name(name)).scalar_one_or_none()
         if u:
             return jsonify({"id": u.id, "name": u.name})
         u = University(name=name)
         s.add(u)
         s.commit()
+        cache.taxonomy.invalidate()
         return jsonify({"id": u.id, "name": u.name})
 
-@app.post("/api/academics/faculties")
+@bp.post("/api/academics/faculties")
 def api_add_faculty():
     data = request.get_json(silent=True) or {}
     name = _norm(data.get("name"))
@@ -811,18 +963,16 @@ def api_add_faculty():
     if not (name and uid):
         return jsonify({"error": "name and university_id required"}), 400
     with Session() as s:
-        f = s.execute(select(Faculty).where(
-            func.lower(Faculty.name) == name.lower(),
-            Faculty.university_id == uid
-        )).scalar_one_or_none()
+        f = s.execute(queries.faculty_by_name(name, uid)).scalar_one_or_none()
         if f:
             return jsonify({"id": f.id, "name": f.name, "university_id": f.university_id})
         f = Faculty(name=name, university_id=uid)
         s.add(f)
         s.commit()
+        cache.taxonomy.invalidate()
         return jsonify({"id": f.id, "name": f.name, "university_id": f.university_id})
 
-@app.post("/api/academics/careers")
+@bp.post("/api/academics/careers")
 def api_add_career():
     data = request.get_json(silent=True) or {}
     name = _norm(data.get("name"))
@@ -830,60 +980,210 @@ def api_add_career():
     if not (name and fid):
         return jsonify({"error": "name and faculty_id required"}), 400
     with Session() as s:
-        c = s.execute(select(Career).where(
-            func.lower(Career.name) == name.lower(),
-            Career.faculty_id == fid
-        )).scalar_one_or_none()
+        c = s.execute(queries.career_by_name(name, fid)).scalar_one_or_none()
         if c:
             return jsonify({"id": c.id, "name": c.name, "faculty_id": c.faculty_id})
         c = Career(name=name, faculty_id=fid)
         s.add(c)
         s.commit()
+        cache.taxonomy.invalidate()
         return jsonify({"id": c.id, "name": c.name, "faculty_id": c.faculty_id})
 
 # -----------------------------------------------------------------------------
 # Foto de perfil
 # -----------------------------------------------------------------------------
-@app.route("/profile/upload_image", methods=["POST"])
+@bp.route("/profile/upload_image", methods=["POST"])
 @login_required
 def upload_profile_image():
     file = request.files.get("file")
     if not file or not file.filename.lower().endswith((".png", ".jpg", ".jpeg")):
         flash("Formato no permitido. Usá PNG o JPG.")
-        return redirect(url_for("profile"))
+        return redirect(url_for(".profile"))
 
-    dest_dir = os.path.join(app.static_folder, "uploads", "profile_images")
-    os.makedirs(dest_dir, exist_ok=True)
+    # Recorte, variantes y cambio de foto en segundo plano (ver avatars.py)
+    try:
+        key = avatars.save_upload(file, current_user.id)
+    except HTTPException as e:
+        flash(e.description)
+        return redirect(url_for(".profile"))
+    with Session() as s:
+        avatars.request_build(s, key)
 
-    ext = ".jpg"
-    if file.filename.lower().endswith(".png"):
-        ext = ".png"
+    flash("📸 Foto recibida: en unos segundos se actualiza.")
+    return redirect(url_for(".profile"))
 
-    filename = f"user_{current_user.id}{ext}"
-    file.save(os.path.join(dest_dir, filename))
+@bp.route("/avatars/<name>")
+def avatar(name):
+    # El nombre lleva el hash de la foto: el contenido de una URL no cambia nunca
+    path = avatars.path_for(name)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    rv = send_file(path, mimetype=avatars.FORMATS[name.rsplit(".", 1)[1]], conditional=True,
+                   etag=name, max_age=avatars.MAX_AGE)
+    rv.cache_control.public = True
+    rv.cache_control.immutable = True
+    return rv
 
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+@bp.cli.command("search-reindex")
+def search_reindex_cmd():
+    """Crea (si falta) y reconstruye el índice full-text de apuntes."""
+    engine = db.get_engine()
+    search_index.ensure_schema(engine)
+    n = search_index.rebuild(engine)
+    print(f"Índice de búsqueda reconstruido: {n} apuntes.")
+
+@bp.cli.command("search-index-content")
+@click.option("--full", is_flag=True, help="re-extraer todos los PDF, no sólo los nuevos o cambiados")
+def search_index_content_cmd(full):
+    """Extrae el texto de los PDF a note_pages (incremental)."""
+    from concurrent.futures import ThreadPoolExecutor
+    app = current_app._get_current_object()
+    if not previews.available():
+        raise click.ClickException("Falta el paquete pypdfium2.")
+    search_index.ensure_pages_schema(db.get_engine())
+    paths = pdf_text.pending_files(full)
+    t0 = time.perf_counter()
+    # Varios PDF a la vez: los cortos son una sola tarea del pool
+    with ThreadPoolExecutor(app.config["PROCESS_POOL_SIZE"]) as ex:
+        pages = sum(ex.map(lambda path: pdf_text.index_file(app, path), paths))
+    elapsed = time.perf_counter() - t0
+    click.echo(f"{len(paths)} archivos, {pages} páginas en {elapsed:.1f} s "
+               f"({pages / elapsed if elapsed else 0:.0f} páginas/s).")
+
+@bp.cli.command("db-upgrade")
+def db_upgrade_cmd():
+    """Aplica las migraciones de esquema pendientes."""
+    engine = db.get_engine()
+    migrations.upgrade(engine)
+    print(f"Esquema al día (versión {migrations.current_version(engine)}).")
+
+@bp.cli.command("blobs-migrate")
+def blobs_migrate_cmd():
+    """Mueve los PDFs `{timestamp}_{nombre}.pdf` al almacenamiento por contenido."""
     with Session() as s:
-        u = s.get(User, current_user.id)
-        if hasattr(u, "imagen_de_perfil"):
-            u.imagen_de_perfil = filename
+        n, freed = blobstore.migrate_legacy(s, current_app.config["UPLOAD_FOLDER"])
+    print(f"{n} apuntes migrados; {freed / 1024 / 1024:.1f} MB liberados por duplicados.")
+
+@bp.cli.command("blobs-gc")
+@click.option("--dry-run", is_flag=True, help="sólo listar lo que se borraría")
+def blobs_gc_cmd(dry_run):
+    """Borra los blobs que ningún apunte referencia."""
+    with Session() as s:
+        if not dry_run:
+            uploads.expire_sessions(s, current_app.config["UPLOAD_FOLDER"])
+        n = blobstore.gc(s, current_app.config["UPLOAD_FOLDER"], dry_run=dry_run)
+    print(f"{n} archivos {'a borrar' if dry_run else 'borrados'}.")
+
+@bp.cli.command("previews-build")
+@click.option("--retry", is_flag=True, help="reintentar los PDF que fallaron antes")
+@click.option("--processes", type=int, default=None, help="default: PROCESS_POOL_SIZE")
+def previews_build_cmd(retry, processes):
+    """Renderiza las previews que faltan (apuntes activos con blob)."""
+    from concurrent.futures import ThreadPoolExecutor
+    app = current_app._get_current_object()
+    if not previews.available():
+        raise click.ClickException("Falta el paquete pypdfium2.")
+    if processes:
+        app.config["PROCESS_POOL_SIZE"] = processes
+    root = app.config["PREVIEW_DIR"]
+    with Session() as s:
+        paths = s.execute(select(Note.file_path).where(Note.is_active == True).distinct()).scalars().all()
+    todo = []
+    for sha in filter(None, map(previews.sha_of, paths)):
+        failed = os.path.join(root, sha[:2], sha + ".failed")
+        if os.path.exists(failed):
+            if not retry:
+                continue
+            os.remove(failed)
+        if not all(os.path.exists(previews.path_for(sha, v)) for v in previews.VARIANTS):
+            todo.append(sha)
+    # Un thread por proceso del pool: cada uno espera su render
+    with ThreadPoolExecutor(app.config["PROCESS_POOL_SIZE"]) as ex:
+        ok = sum(ex.map(lambda sha: previews.generate(app, sha), todo))
+    click.echo(f"{ok} previews generadas, {len(todo) - ok} con error.")
+
+@bp.cli.command("profile-images-migrate")
+def profile_images_migrate_cmd():
+    """Convierte las fotos de perfil anteriores (archivo original) a variantes WebP/JPEG."""
+    app = current_app._get_current_object()
+    legacy_dir = os.path.join(app.static_folder, "uploads", "profile_images")
+    incoming = avatars.incoming_dir(app.config)
+    os.makedirs(incoming, exist_ok=True)
+    with Session() as s:
+        rows = s.execute(select(User.id, User.imagen_de_perfil)
+                         .where(User.imagen_de_perfil.is_not(None))).all()
+    ok = failed = 0
+    for user_id, value in rows:
+        src = os.path.join(legacy_dir, os.path.basename(value))
+        if avatars.is_processed(value) or not os.path.isfile(src):
+            continue
+        with open(src, "rb") as fh:
+            key = f"{user_id}-{hashlib.sha256(fh.read()).hexdigest()[:16]}"
+        shutil.copyfile(src, os.path.join(incoming, key))
+        if avatars.generate(app, key):
+            ok += 1
+            if legacy_dir != app.config["PROFILE_IMAGE_DIR"]:
+                os.remove(src)
         else:
-            u.profile_image = filename
-        s.commit()
+            failed += 1
+    click.echo(f"{ok} fotos convertidas, {failed} con error.")
+
+@bp.cli.command("webhooks-worker")
+@click.option("--threads", default=2, show_default=True, help="threads procesando la cola")
+@click.option("--once", is_flag=True, help="procesar lo pendiente y salir")
+@click.option("--same-host", is_flag=True,
+              help="corre en la misma máquina que la web (alcanza con la caché SQLite en /dev/shm)")
+def webhooks_worker_cmd(threads, once, same_host):
+    """Procesa la cola de webhooks de Mercado Pago (webhook_events)."""
+    # Al aprobar un pago invalida entitlements y avisa a las esperas de
+    # /purchase/<id>/status vía la caché: si la web no ve esa caché, el
+    # comprador no puede descargar hasta que vence el TTL
+    cache_url = current_app.config["CACHE_URL"]
+    local_ok = same_host and cache_url.startswith("sqlite:")
+    if not cache.shared_across_hosts(cache_url) and not local_ok:
+        raise click.ClickException(
+            f"CACHE_URL={cache_url or 'memory://'} no es compartida con los workers web: usá redis://... "
+            "(o --same-host con la caché SQLite por defecto si corre en la misma máquina).")
+    if once:
+        click.echo(f"{webhooks.drain(current_app._get_current_object())} eventos procesados.")
+        return
+    click.echo(f"Procesando webhooks con {threads} threads (Ctrl+C para salir)")
+    webhooks.Worker(current_app._get_current_object(), threads).run_forever()
+
+@bp.cli.command("payments-reconcile")
+@click.option("--window-hours", type=float, default=None, help="default: RECONCILE_WINDOW_HOURS")
+@click.option("--expire-hours", type=float, default=None, help="default: PENDING_EXPIRE_HOURS")
+@click.option("--dry-run", is_flag=True, help="consultar MP y contar, sin actualizar")
+def payments_reconcile_cmd(window_hours, expire_hours, dry_run):
+    """Concilia con MP las compras pendientes, colapsa duplicadas y vence las viejas."""
+    from apuntesya2 import reconcile
+    stats = reconcile.run(current_app._get_current_object(), window_hours, expire_hours, dry_run=dry_run)
+    click.echo(f"{stats['payments']} pagos en {stats['pages']} páginas, {stats['updated']} compras actualizadas, "
+               f"{stats['duplicates']} duplicadas y {stats['expired']} vencidas"
+               f"{' (dry-run)' if dry_run else ''}.")
+
+@bp.cli.command("sales-rollup-rebuild")
+@click.option("--seller", type=int, default=None, help="sólo este vendedor")
+def sales_rollup_rebuild_cmd(seller):
+    """Recalcula seller_daily_sales (ventas por día) desde las compras aprobadas."""
+    with Session() as s:
+        n = sales_rollup.rebuild(s, seller)
+    click.echo(f"{n} filas en seller_daily_sales.")
 
-    flash("📸 Foto actualizada con éxito")
-    return redirect(url_for("profile"))
+@bp.cli.command("db-audit")
+def db_audit_cmd():
+    """EXPLAIN de las consultas de las rutas; falla si alguna hace full scan."""
+    from apuntesya2 import db_audit
+    if not db_audit.run(db.get_engine()):
+        raise SystemExit(1)
 
 # -----------------------------------------------------------------------------
-# Main
+# Cambio de contraseña / ayuda
 # -----------------------------------------------------------------------------
-if __name__ == "__main__":
-    app.run(debug=True)
-
-from werkzeug.security import check_password_hash, generate_password_hash
-from flask_login import login_required, current_user
-from sqlalchemy import select
-
-@app.route("/profile/change_password", methods=["POST"])
+@bp.route("/profile/change_password", methods=["POST"])
 @login_required
 def change_password():
     current_pw = request.form.get("current_password", "")
@@ -892,11 +1192,11 @@ def change_password():
 
     if len(new_pw) < 8:
         flash("La nueva contraseña debe tener al menos 8 caracteres.", "danger")
-        return redirect(url_for("profile"))
+        return redirect(url_for(".profile"))
 
     if new_pw != confirm_pw:
         flash("La confirmación no coincide.", "danger")
-        return redirect(url_for("profile"))
+        return redirect(url_for(".profile"))
 
     # Try to access DB session and User model
     try:
@@ -918,23 +1218,24 @@ def change_password():
             user_obj = User.query.get(current_user.id)
             if user_obj is None:
                 flash("No se encontró el usuario.", "danger")
-                return redirect(url_for("profile"))
+                return redirect(url_for(".profile"))
             user_obj.password_hash = generate_password_hash(new_pw)
             db.session.commit()
         except Exception as e:
             flash("Error al actualizar la contraseña: {}".format(e), "danger")
-            return redirect(url_for("profile"))
+            return redirect(url_for(".profile"))
 
+    principals.invalidate(current_user.id)
     flash("¡Contraseña actualizada correctamente!", "success")
-    return redirect(url_for("profile"))
+    return redirect(url_for(".profile"))
 
 
-@app.route("/help/mercadopago")
+@bp.route("/help/mercadopago")
 def help_mp():
     return render_template("help/mp_linking.html")
 
 
-@app.route("/connect/mercadopago")
+@bp.route("/connect/mercadopago")
 @login_required
 def oauth_start():
     try:
@@ -944,12 +1245,18 @@ def oauth_start():
     return redirect(oauth_authorize_url())
 
 
-@app.route("/healthz")
+@bp.route("/healthz")
 def healthz():
     try:
-        return {"status":"ok","version": app.config.get("APP_VERSION","unknown")}, 200
+        return {"status":"ok","version": current_app.config.get("APP_VERSION","unknown")}, 200
     except Exception as e:
         return {"status":"degraded","error": str(e)}, 200
-@app.route("/help/comisiones")
+@bp.route("/help/comisiones")
 def help_commissions():
     return render_template("help/commissions.html")
+
+# -----------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    create_app().run(debug=True)
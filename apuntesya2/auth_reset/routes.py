@@ -2,27 +2,24 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for,
 from werkzeug.security import generate_password_hash
 from .tokens import generate_token, confirm_token
 from ..models import User
-from .email_utils import send_reset_email
+from ..db import Session
+from .. import principals
 
 bp = Blueprint('auth_reset', __name__, template_folder='../templates')
 
-def _session():
-    from ..app import Session
-    return Session
-
 @bp.route('/reset_password_request', methods=['GET','POST'])
 def reset_password_request():
     if request.method == 'POST':
         email = request.form.get('email','').strip().lower()
-        Session = _session()
         with Session() as s:
             user = s.query(User).filter(User.email == email).first()
             if user:
+                from .email_utils import send_reset_email  # smtplib/ssl sólo cuando se usa
                 sent_ok = send_reset_email(user.email, generate_token(user.email))
                 if not sent_ok:
                     print('[ApuntesYa] Aviso: no se pudo enviar el correo (SMTP). El enlace se imprimió en consola.')
         flash('Si existe una cuenta con ese mail, te enviamos instrucciones por email.', 'info')
-        return redirect(url_for('login')) if 'login' in current_app.view_functions else redirect(url_for('index'))
+        return redirect(url_for('main.login')) if 'main.login' in current_app.view_functions else redirect(url_for('main.index'))
     return render_template('auth_reset/reset_password_request.html')
 
 @bp.route('/reset_password/<token>', methods=['GET','POST'])
@@ -32,7 +29,6 @@ def reset_password(token):
         flash('El enlace es inválido o expiró.', 'warning')
         return redirect(url_for('auth_reset.reset_password_request'))
 
-    Session = _session()
     with Session() as s:
         user = s.query(User).filter(User.email == email).first()
         if not user:
@@ -50,6 +46,7 @@ def reset_password(token):
                 return render_template('auth_reset/reset_password.html', token=token)
             user.password_hash = generate_password_hash(password)
             s.commit()
+            principals.invalidate(user.id)
             flash('Tu contraseña fue actualizada. Podés iniciar sesión.', 'success')
-            return redirect(url_for('login')) if 'login' in current_app.view_functions else redirect(url_for('index'))
+            return redirect(url_for('main.login')) if 'main.login' in current_app.view_functions else redirect(url_for('main.index'))
     return render_template('auth_reset/reset_password.html', token=token)
@@ -0,0 +1,205 @@
+"""
+Fotos de perfil: recortadas a cuadrado en 64, 128 y 256 px, en WebP y JPEG, sin metadatos.
+
+`upload_profile_image` sólo guarda el archivo (PNG/JPEG por magic bytes, tope
+PROFILE_IMAGE_MAX_BYTES) en UPLOAD_FOLDER/profile_incoming/ (fuera de static:
+todavía tiene los metadatos) y encola
+"avatar:<user_id>-<hash>" en la cola de webhooks (`webhooks.TASKS`). El
+worker decodifica en el pool de procesos (procpool.py), aplica la
+orientación EXIF, descarta los metadatos (EXIF/GPS, comentarios), escribe
+
+    PROFILE_IMAGE_DIR/<user_id>-<hash>-<px>.webp / .jpg
+
+y recién ahí cambia `users.imagen_de_perfil` a "<user_id>-<hash>" y borra las
+variantes de la foto anterior. hash = 16 hex del SHA-256 del archivo subido:
+otra foto es otra URL, así que se sirven con `Cache-Control: immutable`.
+Mientras tanto se sigue viendo la foto anterior; si el usuario sube dos
+seguidas, sólo se procesa la última.
+
+Las fotos anteriores (user_<id>.png, del tamaño original) se siguen mostrando
+tal cual; `flask profile-images-migrate` las convierte.
+"""
+import os
+import re
+import hashlib
+import logging
+import contextlib
+import tempfile
+
+from flask import current_app, url_for
+from sqlalchemy import select, update
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+from apuntesya2 import principals, procpool
+from apuntesya2.db import Session
+from apuntesya2.models import User
+
+log = logging.getLogger(__name__)
+
+SIZES = (64, 128, 256)
+FORMATS = {"webp": "image/webp", "jpg": "image/jpeg"}
+QUALITY = 82
+MAX_PIXELS = 40_000_000   # más que esto no es una foto: Pillow corta antes de decodificar
+TIMEOUT = 30.0
+MAX_AGE = 365 * 24 * 3600
+INCOMING = "profile_incoming"
+CHUNK = 64 * 1024
+
+_MAGIC = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff")
+_KEY = re.compile(r"^\d+-[0-9a-f]{16}$")
+_FILE = re.compile(r"^(\d+-[0-9a-f]{16})-(\d+)\.(webp|jpg)$")
+
+
+def incoming_dir(cfg) -> str:
+    return os.path.join(cfg["UPLOAD_FOLDER"], INCOMING)
+
+
+def is_processed(value) -> bool:
+    return bool(value and _KEY.match(value))
+
+
+def path_for(name: str) -> str | None:
+    """Ruta de una variante ("<user_id>-<hash>-<px>.<ext>"), o None si el nombre no es válido."""
+    m = _FILE.match(name or "")
+    if not m or int(m.group(2)) not in SIZES:
+        return None
+    return os.path.join(current_app.config["PROFILE_IMAGE_DIR"], name)
+
+
+def urls(user, px: int) -> dict:
+    """src/srcset (JPEG) y srcset WebP para mostrar la foto a `px` px (1x y 2x)."""
+    key = getattr(user, "imagen_de_perfil", None)
+    if not is_processed(key):
+        filename = f"uploads/profile_images/{key}" if key else "img/default_profile.png"
+        return {"src": url_for("static", filename=filename), "srcset": None, "webp": None}
+    one = next((s for s in SIZES if s >= px), SIZES[-1])
+    two = next((s for s in SIZES if s >= 2 * px), SIZES[-1])
+
+    def srcset(ext):
+        return (f"{url_for('main.avatar', name=f'{key}-{one}.{ext}')} 1x, "
+                f"{url_for('main.avatar', name=f'{key}-{two}.{ext}')} 2x")
+    return {"src": url_for("main.avatar", name=f"{key}-{one}.jpg"), "srcset": srcset("jpg"),
+            "webp": srcset("webp")}
+
+
+# -----------------------------------------------------------------------------
+# Request: guardar y encolar
+# -----------------------------------------------------------------------------
+def save_upload(file, user_id: int) -> str:
+    """Guarda la subida en profile_incoming/ y devuelve su clave "<user_id>-<hash>"."""
+    cfg = current_app.config
+    root = incoming_dir(cfg)
+    os.makedirs(root, exist_ok=True)
+    digest, size, head = hashlib.sha256(), 0, b""
+    fd, tmp = tempfile.mkstemp(dir=root, prefix=".up-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: file.stream.read(CHUNK), b""):
+                size += len(chunk)
+                if size > cfg["PROFILE_IMAGE_MAX_BYTES"]:
+                    raise RequestEntityTooLarge(
+                        f"La foto supera el máximo de {cfg['PROFILE_IMAGE_MAX_BYTES'] // (1024 * 1024)} MB.")
+                if len(head) < 8:
+                    head += chunk[:8]
+                digest.update(chunk)
+                out.write(chunk)
+        if not head.startswith(_MAGIC):
+            raise UnsupportedMediaType("El archivo no es una imagen PNG o JPG.")
+        key = f"{user_id}-{digest.hexdigest()[:16]}"
+        os.replace(tmp, os.path.join(root, key))
+        return key
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+
+def request_build(session, key: str):
+    from apuntesya2 import webhooks
+    webhooks.record(session, {"topic": "avatar", "id": key}, None)
+
+
+# -----------------------------------------------------------------------------
+# Proceso (en el pool de procesos)
+# -----------------------------------------------------------------------------
+def _process(src: str, base: str, sizes: tuple, quality: int):
+    """Escribe <base>-<px>.webp y .jpg para cada tamaño."""
+    import warnings
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        with Image.open(src) as im:
+            if im.format not in ("PNG", "JPEG"):
+                raise ValueError(f"formato no soportado: {im.format}")
+            # JPEG: decodifica ya reducida (escala DCT), no a resolución completa
+            im.draft("RGB", (2 * max(sizes), 2 * max(sizes)))
+            im = ImageOps.exif_transpose(im)
+    alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+    im = im.convert("RGBA" if alpha else "RGB")
+    square = ImageOps.fit(im, (max(sizes), max(sizes)), Image.LANCZOS)  # recorte centrado
+    for px in sizes:
+        out = square if px == max(sizes) else square.resize((px, px), Image.LANCZOS)
+        if alpha:
+            flat = Image.new("RGB", out.size, (255, 255, 255))
+            flat.paste(out, mask=out.getchannel("A"))
+        else:
+            flat = out
+        # Sin exif= ni icc_profile=: Pillow no copia metadatos al guardar
+        # alpha_quality: la transparencia sin pérdida duplicaba el peso del WebP
+        for ext, img, opts in (("webp", out, {"quality": quality, "alpha_quality": 50, "method": 4}),
+                               ("jpg", flat, {"quality": quality, "optimize": True, "progressive": True})):
+            final = f"{base}-{px}.{ext}"
+            tmp = f"{final}.{os.getpid()}.tmp"
+            img.save(tmp, "WEBP" if ext == "webp" else "JPEG", **opts)
+            os.replace(tmp, final)
+
+
+def remove(root: str, key: str):
+    """Borra las variantes de una foto (o el archivo de una foto anterior al esquema)."""
+    if is_processed(key):
+        names = [f"{key}-{px}.{ext}" for px in SIZES for ext in FORMATS]
+    elif key and os.path.basename(key) == key:
+        names = [key]
+    else:
+        return
+    for name in names:
+        try:
+            os.remove(os.path.join(root, name))
+        except FileNotFoundError:
+            pass
+
+
+def generate(app, key: str) -> bool:
+    """Procesa profile_incoming/<key> y la deja como foto del usuario."""
+    cfg = app.config
+    root = cfg["PROFILE_IMAGE_DIR"]
+    incoming = incoming_dir(cfg)
+    src = os.path.join(incoming, key)
+    if not is_processed(key) or not os.path.isfile(src):
+        return False  # ya procesada, o reemplazada por una subida más nueva
+    user_id = int(key.split("-", 1)[0])
+    mtime = os.path.getmtime(src)
+    if any(e.name.startswith(f"{user_id}-") and e.name != key and e.stat().st_mtime > mtime
+           for e in os.scandir(incoming)):
+        os.remove(src)
+        return False
+    os.makedirs(root, exist_ok=True)
+    try:
+        procpool.run(_process, src, os.path.join(root, key), SIZES, QUALITY,
+                     workers=cfg["PROCESS_POOL_SIZE"], timeout=TIMEOUT)
+    except Exception as e:
+        log.warning("foto de perfil %s: no se pudo procesar: %r", key, e)
+        remove(root, key)
+        os.remove(src)
+        return False
+    with Session() as s:
+        old = s.execute(select(User.imagen_de_perfil).where(User.id == user_id)).scalar()
+        s.execute(update(User).where(User.id == user_id).values(imagen_de_perfil=key))
+        s.commit()
+    principals.invalidate(user_id)
+    os.remove(src)
+    if old and old != key:
+        remove(root, old)
+    return True
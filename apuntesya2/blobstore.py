@@ -0,0 +1,242 @@
+"""
+Almacenamiento de PDFs por contenido (content-addressed, deduplicado).
+
+Cada archivo se guarda una sola vez en
+
+    UPLOAD_FOLDER/blobs/ab/cd/<sha256>.pdf
+
+y `Note.file_path` guarda esa ruta relativa. Dos apuntes con el mismo PDF
+apuntan al mismo blob: la cantidad de referencias es la cantidad de `Note`
+con ese `file_path` (índice ix_notes_file_path), más las subidas reanudables
+ya completas que todavía no se convirtieron en apunte; no hay contador aparte.
+
+La subida se escribe a un temporal en blobs/tmp/ calculando el SHA-256 al
+vuelo; al terminar se renombra al destino final o, si ese blob ya existía,
+se descarta el temporal (la escritura final se evita).
+
+`release` borra el blob cuando ya nadie lo referencia (admin.hard_delete_note).
+Un blob re-subido hace menos de GRACE_SECONDS no se borra ahí (puede haber un
+alta en curso que todavía no commiteó su Note): lo levanta `flask blobs-gc`.
+Los archivos anteriores a este esquema (`{timestamp}_{nombre}.pdf`) se migran
+con `flask blobs-migrate`.
+"""
+import os
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from collections import namedtuple
+
+from sqlalchemy import select, func, distinct
+
+from apuntesya2.models import Note, UploadSession
+
+log = logging.getLogger(__name__)
+
+BLOB_PREFIX = "blobs"
+CHUNK_SIZE = 1024 * 1024
+GRACE_SECONDS = 600
+TMP_MAX_AGE = 24 * 3600
+
+StoredBlob = namedtuple("StoredBlob", "path sha256 size created")
+
+
+def blob_path(sha256: str, ext: str = ".pdf") -> str:
+    """Ruta relativa (a UPLOAD_FOLDER) del blob con ese hash."""
+    return "/".join((BLOB_PREFIX, sha256[:2], sha256[2:4], sha256 + ext))
+
+
+def is_blob(rel_path: str) -> bool:
+    return (rel_path or "").startswith(BLOB_PREFIX + "/")
+
+
+def tmp_dir(root: str) -> str:
+    path = os.path.join(root, BLOB_PREFIX, "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def exists(root: str, sha256: str, ext: str = ".pdf") -> bool:
+    return os.path.exists(os.path.join(root, blob_path(sha256, ext)))
+
+
+def _install(root: str, src: str, sha256: str, size: int, ext: str) -> StoredBlob:
+    # Mueve `src` (ya completo) a su lugar definitivo, o lo descarta si el blob existe
+    rel = blob_path(sha256, ext)
+    final = os.path.join(root, rel)
+    if os.path.exists(final):
+        os.remove(src)
+        os.utime(final)  # re-subido recién: que release/gc respeten la gracia
+        return StoredBlob(rel, sha256, size, False)
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    os.replace(src, final)
+    return StoredBlob(rel, sha256, size, True)
+
+
+class BlobWriter:
+    """
+    Escribe un blob por chunks calculando el hash:
+
+        with BlobWriter(root) as w:
+            for chunk in chunks:
+                w.write(chunk)
+            blob = w.commit()
+
+    Si sale por una excepción antes de `commit`, se borra el temporal.
+    """
+
+    def __init__(self, root: str, ext: str = ".pdf"):
+        self.root, self.ext = root, ext
+        fd, self.tmp_path = tempfile.mkstemp(dir=tmp_dir(root), suffix=".part")
+        self._fh = os.fdopen(fd, "w+b")
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.blob = None
+
+    def write(self, chunk: bytes):
+        self._hash.update(chunk)
+        self._fh.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> StoredBlob:
+        self._fh.close()
+        self.blob = _install(self.root, self.tmp_path, self._hash.hexdigest(), self.size, self.ext)
+        return self.blob
+
+    def abort(self):
+        self._fh.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.blob is None:
+            self.abort()
+
+
+def put_stream(root: str, stream, ext: str = ".pdf") -> StoredBlob:
+    with BlobWriter(root, ext) as w:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            w.write(chunk)
+        return w.commit()
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def put_file(root: str, src: str, ext: str = ".pdf") -> StoredBlob:
+    """Incorpora un archivo ya escrito en disco (lo mueve; debe estar en el mismo filesystem)."""
+    return _install(root, src, file_sha256(src), os.path.getsize(src), ext)
+
+
+# -----------------------------------------------------------------------------
+# Referencias / GC
+# -----------------------------------------------------------------------------
+def refcount_queries(rel_path: str):
+    """Cuentan los Note y las UploadSession que apuntan a `rel_path`."""
+    return (
+        select(func.count()).select_from(Note).where(Note.file_path == rel_path),
+        select(func.count()).select_from(UploadSession).where(UploadSession.blob_path == rel_path),
+    )
+
+
+def refcount(session, rel_path: str) -> int:
+    return sum(session.execute(q).scalar_one() for q in refcount_queries(rel_path))
+
+
+def release(session, root: str, rel_path: str) -> bool:
+    """
+    Llamar después de commitear el borrado del Note que usaba `rel_path`.
+    Borra el archivo si ya no lo referencia nadie. Devuelve True si lo borró.
+    """
+    if not rel_path or refcount(session, rel_path):
+        return False
+    path = os.path.join(root, rel_path)
+    try:
+        if is_blob(rel_path) and time.time() - os.path.getmtime(path) < GRACE_SECONDS:
+            return False
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def gc(session, root: str, grace: float = GRACE_SECONDS, dry_run: bool = False, out=print) -> int:
+    """Borra blobs sin referencias (y temporales abandonados). Devuelve cuántos borró."""
+    base = os.path.join(root, BLOB_PREFIX)
+    if not os.path.isdir(base):
+        return 0
+    referenced = set(session.execute(
+        select(distinct(Note.file_path)).where(Note.file_path.like(BLOB_PREFIX + "/%"))
+    ).scalars())
+    referenced |= set(session.execute(
+        select(distinct(UploadSession.blob_path)).where(UploadSession.blob_path.is_not(None))
+    ).scalars())
+    now = time.time()
+    removed = 0
+    for dirpath, _dirs, files in os.walk(base):
+        is_tmp = os.path.abspath(dirpath) == os.path.abspath(os.path.join(base, "tmp"))
+        for name in files:
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            age = now - os.path.getmtime(path)
+            if is_tmp:
+                if age < TMP_MAX_AGE:
+                    continue
+            elif rel in referenced or age < grace:
+                continue
+            out(("(dry-run) " if dry_run else "") + f"borrando {rel}")
+            if not dry_run:
+                os.remove(path)
+            removed += 1
+    return removed
+
+
+def migrate_legacy(session, root: str, out=print) -> tuple[int, int]:
+    """
+    Pasa los archivos `{timestamp}_{nombre}.pdf` al blob store y actualiza
+    Note.file_path. Devuelve (apuntes migrados, bytes liberados por duplicados).
+    """
+    migrated, freed = 0, 0
+    notes = session.execute(
+        select(Note).where(~Note.file_path.like(BLOB_PREFIX + "/%")).order_by(Note.id)
+    ).scalars().all()
+    for note in notes:
+        if is_blob(note.file_path):  # ya movido junto con otro apunte del mismo archivo
+            continue
+        src = os.path.join(root, note.file_path)
+        if not os.path.isfile(src):
+            out(f"apunte {note.id}: no existe {note.file_path}, se deja igual")
+            continue
+        old = note.file_path
+        ext = os.path.splitext(old)[1].lower() or ".pdf"
+        sha = file_sha256(src)
+        rel = blob_path(sha, ext)
+        final = os.path.join(root, rel)
+        duplicate = os.path.exists(final)
+        if not duplicate:
+            # Link (no move) hasta que el commit confirme la nueva ruta
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            try:
+                os.link(src, final)
+            except OSError:
+                shutil.copy2(src, final)
+        for n in session.execute(select(Note).where(Note.file_path == old)).scalars():
+            n.file_path = rel
+        session.commit()
+        if duplicate:
+            freed += os.path.getsize(src)
+        os.remove(src)
+        migrated += 1
+        out(f"apunte {note.id}: {old} -> {rel}" + (" (duplicado)" if duplicate else ""))
+    return migrated, freed
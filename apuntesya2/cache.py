@@ -0,0 +1,289 @@
+"""
+Caché read-through para datos que casi no cambian (taxonomía académica).
+
+Dos niveles:
+- LRU en memoria por proceso, con TTL.
+- Backend compartido opcional entre workers (`CACHE_URL`):
+    sqlite:////dev/shm/archivo.db   archivo SQLite (en /dev/shm vive en RAM)
+    redis://host:6379/0             Redis (requiere el paquete `redis`)
+    memory://                       sólo el LRU local
+
+La invalidación es por versión: `invalidate()` incrementa un contador por
+namespace (en el backend compartido, así se enteran todos los workers) y las
+claves viejas dejan de usarse y expiran solas. Con `scope` (p.ej. el id de un
+usuario) la versión es por scope: `invalidate(scope)` sólo afecta esas claves.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlparse
+
+log = logging.getLogger(__name__)
+
+Entry = namedtuple("Entry", "body etag")
+
+_MISSING = object()
+
+
+def etag_for(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+# -----------------------------------------------------------------------------
+# LRU local
+# -----------------------------------------------------------------------------
+class LRUCache:
+    def __init__(self, maxsize=256, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# -----------------------------------------------------------------------------
+# Backends compartidos
+# -----------------------------------------------------------------------------
+class MemoryBackend:
+    """Sin backend compartido: la versión vive en el proceso."""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value: bytes, ttl: float):
+        pass
+
+    def version(self, namespace) -> int:
+        return self._versions.get(namespace, 0)
+
+    def bump(self, namespace) -> int:
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            return self._versions[namespace]
+
+
+class SQLiteBackend:
+    """Archivo SQLite compartido por los workers de la máquina (ideal en /dev/shm)."""
+
+    _DDL = [
+        "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS cache_versions (namespace TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+    ]
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        # Una conexión por thread y por proceso (nunca heredada de un fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            for stmt in self._DDL:
+                conn.execute(stmt)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value: bytes, ttl: float):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)", (key, value, now + ttl))
+        conn.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+
+    def version(self, namespace) -> int:
+        row = self._conn().execute(
+            "SELECT version FROM cache_versions WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, namespace) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO cache_versions (namespace, version) VALUES (?, 1) "
+                "ON CONFLICT(namespace) DO UPDATE SET version = version + 1", (namespace,))
+            version = conn.execute(
+                "SELECT version FROM cache_versions WHERE namespace = ?", (namespace,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return version
+
+
+class RedisBackend:
+    def __init__(self, url):
+        import redis  # opcional: sólo si CACHE_URL es redis://
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value: bytes, ttl: float):
+        self._client.set(key, value, px=int(ttl * 1000))
+
+    def version(self, namespace) -> int:
+        return int(self._client.get(f"{namespace}:version") or 0)
+
+    def bump(self, namespace) -> int:
+        return int(self._client.incr(f"{namespace}:version"))
+
+
+def shared_across_hosts(url: str) -> bool:
+    """True si el backend lo ven procesos de otras máquinas (Redis); /dev/shm y memory:// no."""
+    return urlparse(url or "").scheme in ("redis", "rediss")
+
+
+def process_local(url: str) -> bool:
+    """True si cada proceso tiene su propia caché (memory://): las invalidaciones no salen del proceso."""
+    return not url or url.startswith("memory:")
+
+
+def make_backend(url: str):
+    if process_local(url):
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if urlparse(url).scheme in ("redis", "rediss", "unix"):
+        return RedisBackend(url)
+    raise ValueError(f"CACHE_URL no soportada: {url}")
+
+
+# -----------------------------------------------------------------------------
+# Caché read-through
+# -----------------------------------------------------------------------------
+_backend = MemoryBackend()
+
+
+class Cache:
+    """
+    `get_or_load(key, loader)` devuelve un Entry(body, etag); `loader()` debe
+    devolver bytes y sólo se llama si la clave no está en ningún nivel.
+    """
+
+    def __init__(self, namespace, maxsize=256, ttl=300.0):
+        self.namespace = namespace
+        self.local = LRUCache(maxsize, ttl)
+        self._load_lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return self.local.ttl
+
+    def _version_key(self, scope=None) -> str:
+        return self.namespace if scope is None else f"{self.namespace}:{scope}"
+
+    def _version(self, scope=None) -> int:
+        try:
+            return _backend.version(self._version_key(scope))
+        except Exception as e:
+            log.warning("cache %s: backend sin respuesta (%s)", self.namespace, e)
+            return -1  # sin versión confiable: sólo LRU local con su TTL
+
+    def version(self, scope=None) -> int:
+        return self._version(scope)
+
+    def get_or_load(self, key, loader, scope=None) -> Entry:
+        if scope is None:
+            full_key = f"{self.namespace}:v{self._version()}:{key}"
+        else:
+            full_key = f"{self.namespace}:{scope}:v{self._version(scope)}:{key}"
+        entry = self.local.get(full_key)
+        if entry is not None:
+            return entry
+        with self._load_lock:  # un solo loader por proceso a la vez
+            entry = self.local.get(full_key)
+            if entry is not None:
+                return entry
+            body = self._shared_get(full_key)
+            if body is None:
+                body = loader()
+                self._shared_set(full_key, body)
+            entry = Entry(body, etag_for(body))
+            self.local.set(full_key, entry)
+            return entry
+
+    def invalidate(self, scope=None):
+        if scope is None:
+            self.local.clear()
+        try:
+            _backend.bump(self._version_key(scope))
+        except Exception as e:
+            log.warning("cache %s: no se pudo invalidar en el backend (%s)", self.namespace, e)
+
+    def _shared_get(self, key):
+        try:
+            return _backend.get(key)
+        except Exception as e:
+            log.warning("cache %s: get falló (%s)", self.namespace, e)
+            return None
+
+    def _shared_set(self, key, body):
+        try:
+            _backend.set(key, body, self.ttl)
+        except Exception as e:
+            log.warning("cache %s: set falló (%s)", self.namespace, e)
+
+
+def init_app(app):
+    global _backend
+    _backend = make_backend(app.config.get("CACHE_URL", ""))
+    taxonomy.local.ttl = float(app.config.get("TAXONOMY_CACHE_TTL", taxonomy.ttl))
+    taxonomy.local.clear()
+    entitlements.local.ttl = float(app.config.get("ENTITLEMENTS_CACHE_TTL", entitlements.ttl))
+    entitlements.local.clear()
+    principals.local.ttl = float(app.config.get("PRINCIPAL_CACHE_TTL", principals.ttl))
+    principals.local.clear()
+
+
+# Universidades / facultades / carreras (ver /api/academics/*)
+taxonomy = Cache("taxonomy", maxsize=512, ttl=300.0)
+# Apuntes comprados por usuario (ver entitlements.py); versión por usuario
+entitlements = Cache("entitlements", maxsize=4096, ttl=600.0)
+# Usuario logueado (ver principals.py); versión por usuario
+principals = Cache("principals", maxsize=4096, ttl=60.0)
+# Sólo versiones: cambios de estado de cada compra (ver payment_status.py)
+purchase_status = Cache("purchase-status", maxsize=1, ttl=1.0)
+# Sólo versiones: token de MP renovado por vendedor (ver seller_tokens.py)
+seller_tokens = Cache("seller-tokens", maxsize=1, ttl=1.0)
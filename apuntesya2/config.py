@@ -0,0 +1,119 @@
+# Rutas, URL de la base y config de la app compartidas por la app, las migraciones y los scripts
+import os
+import hashlib
+import secrets
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# -----------------------------------------------------------------------------
+# Paths (Render usa /tmp; local usa ./data)
+# -----------------------------------------------------------------------------
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(HERE)
+
+if os.getenv("RENDER", "").strip() == "1":
+    BASE_DATA = "/tmp/data"
+else:
+    BASE_DATA = os.path.join(PROJECT_ROOT, "data")
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(BASE_DATA, "uploads"))
+PREVIEW_DIR = os.getenv("PREVIEW_DIR", os.path.join(BASE_DATA, "previews"))
+PROFILE_IMAGE_DIR = os.getenv("PROFILE_IMAGE_DIR", os.path.join(HERE, "static", "uploads", "profile_images"))
+
+# -----------------------------------------------------------------------------
+# DB URL (SQLite por defecto)
+# -----------------------------------------------------------------------------
+DEFAULT_DB = f"sqlite:///{os.path.join(BASE_DATA, 'apuntesya.db')}"
+DB_URL = os.getenv("DATABASE_URL", DEFAULT_DB)
+
+# -----------------------------------------------------------------------------
+# Caché compartida entre workers (ver cache.py). En Linux, un archivo en /dev/shm
+# (RAM) por base de datos; si no, sólo caché en memoria por proceso.
+# -----------------------------------------------------------------------------
+if os.path.isdir("/dev/shm"):
+    _DEFAULT_CACHE = "sqlite:////dev/shm/apuntesya-cache-%s.db" % hashlib.sha1(DB_URL.encode()).hexdigest()[:8]
+else:
+    _DEFAULT_CACHE = "memory://"
+CACHE_URL = os.getenv("CACHE_URL", _DEFAULT_CACHE)
+
+
+# -----------------------------------------------------------------------------
+# app.config (create_app aplica esto y después los overrides que reciba)
+# -----------------------------------------------------------------------------
+def app_defaults() -> dict:
+    return {
+        "SECRET_KEY": os.getenv("SECRET_KEY", secrets.token_hex(16)),
+        "ENV": os.getenv("FLASK_ENV", "production"),
+        "DATABASE_URL": DB_URL,
+        "UPLOAD_FOLDER": UPLOAD_DIR,
+        # Subidas (ver uploads.py); el request entero admite el PDF + campos del formulario
+        "UPLOAD_MAX_BYTES": int(os.getenv("UPLOAD_MAX_MB", "25")) * 1024 * 1024,
+        "MAX_CONTENT_LENGTH": (int(os.getenv("UPLOAD_MAX_MB", "25")) + 1) * 1024 * 1024,
+        "UPLOAD_MIN_BPS": int(os.getenv("UPLOAD_MIN_BPS", "2048")),
+        "UPLOAD_MAX_PER_HOUR": int(os.getenv("UPLOAD_MAX_PER_HOUR", "20")),
+        # Descargas (ver downloads.py): python | nginx (X-Accel-Redirect) | sendfile (X-Sendfile)
+        "DOWNLOAD_BACKEND": os.getenv("DOWNLOAD_BACKEND", "python"),
+        "DOWNLOAD_ACCEL_PREFIX": os.getenv("DOWNLOAD_ACCEL_PREFIX", "/_protected_uploads"),
+        # URLs firmadas /d/<token> (ver signed_urls.py), en segundos
+        "DOWNLOAD_URL_TTL": int(os.getenv("DOWNLOAD_URL_TTL", "21600")),
+        "DOWNLOAD_URL_TTL_PAID": int(os.getenv("DOWNLOAD_URL_TTL_PAID", "300")),
+        # Procesos por worker para render de PDFs e imágenes (ver procpool.py)
+        "PROCESS_POOL_SIZE": int(os.getenv("PROCESS_POOL_SIZE", "2")),
+        # Previews de la primera página (ver previews.py): caché en disco acotada
+        "PREVIEW_DIR": PREVIEW_DIR,
+        "PREVIEW_CACHE_MB": int(os.getenv("PREVIEW_CACHE_MB", "512")),
+        "PREVIEW_TIMEOUT": float(os.getenv("PREVIEW_TIMEOUT", "30")),
+        # Fotos de perfil (ver avatars.py)
+        "PROFILE_IMAGE_DIR": PROFILE_IMAGE_DIR,
+        "PROFILE_IMAGE_MAX_BYTES": int(os.getenv("PROFILE_IMAGE_MAX_MB", "5")) * 1024 * 1024,
+        "CACHE_URL": CACHE_URL,
+        "TAXONOMY_CACHE_TTL": float(os.getenv("TAXONOMY_CACHE_TTL", "300")),
+        "ENTITLEMENTS_CACHE_TTL": float(os.getenv("ENTITLEMENTS_CACHE_TTL", "600")),
+        "PRINCIPAL_CACHE_TTL": float(os.getenv("PRINCIPAL_CACHE_TTL", "60")),
+
+        # Mercado Pago
+        "MP_PUBLIC_KEY": os.getenv("MP_PUBLIC_KEY", ""),
+        "MP_ACCESS_TOKEN": os.getenv("MP_ACCESS_TOKEN", ""),
+        # Firma de /mp/webhook (x-signature); vacío = no se valida (ver webhooks.receive)
+        "MP_WEBHOOK_SECRET": os.getenv("MP_WEBHOOK_SECRET", ""),
+        "BASE_URL": os.getenv("BASE_URL", ""),
+        # Token plataforma (fallback si el vendedor no vinculó MP)
+        "MP_ACCESS_TOKEN_PLATFORM": os.getenv("MP_ACCESS_TOKEN", ""),
+        "MP_OAUTH_REDIRECT_URL": os.getenv("MP_OAUTH_REDIRECT_URL"),
+        # Estimación de comisión inmediata de MP que muestran los templates
+        "MP_FEE_IMMEDIATE_TOTAL_PCT": 7.61,
+        # Una compra pendiente reciente reusa su preferencia (mismo apunte y precio)
+        "MP_PREFERENCE_REUSE_SECONDS": int(os.getenv("MP_PREFERENCE_REUSE_SECONDS", "21600")),
+        # Threads que procesan webhooks en cada worker de gunicorn (ver webhooks.py)
+        "WEBHOOK_WORKER_THREADS": int(os.getenv("WEBHOOK_WORKER_THREADS", "1")),
+        # Máximo que /purchase/<id>/status retiene un long-poll / stream SSE (segundos)
+        "PAYMENT_STATUS_WAIT": float(os.getenv("PAYMENT_STATUS_WAIT", "25")),
+        # Conciliación de compras pendientes con MP (ver reconcile.py); intervalo 0 = desactivada
+        "RECONCILE_INTERVAL": float(os.getenv("RECONCILE_INTERVAL", "900")),
+        "RECONCILE_WINDOW_HOURS": float(os.getenv("RECONCILE_WINDOW_HOURS", "72")),
+        "PENDING_EXPIRE_HOURS": float(os.getenv("PENDING_EXPIRE_HOURS", "48")),
+        # Renovación de tokens OAuth de vendedores (ver seller_tokens.py); intervalo 0 = desactivada
+        "SELLER_TOKEN_REFRESH_INTERVAL": float(os.getenv("SELLER_TOKEN_REFRESH_INTERVAL", "3600")),
+        "SELLER_TOKEN_REFRESH_AHEAD_HOURS": float(os.getenv("SELLER_TOKEN_REFRESH_AHEAD_HOURS", "168")),
+
+        # Comisiones
+        "PLATFORM_FEE_PERCENT": float(os.getenv("MP_PLATFORM_FEE_PERCENT", "5.0")),
+        "MP_COMMISSION_RATE": float(os.getenv("MP_COMMISSION_RATE", "0.0774")),
+        "APY_COMMISSION_RATE": float(os.getenv("APY_COMMISSION_RATE", "0.05")),
+        "IIBB_ENABLED": os.getenv("IIBB_ENABLED", "false").lower() in ("1", "true", "yes"),
+        "IIBB_RATE": float(os.getenv("IIBB_RATE", "0.0")),
+
+        # Password reset
+        "SECURITY_PASSWORD_SALT": os.getenv("SECURITY_PASSWORD_SALT", "pw-reset"),
+        "PASSWORD_RESET_EXPIRATION": int(os.getenv("PASSWORD_RESET_EXPIRATION", "3600")),
+        "ENABLE_SMTP": os.getenv("ENABLE_SMTP", "false"),
+
+        # Contacto
+        "CONTACT_EMAILS": os.getenv("CONTACT_EMAILS", "soporte.apuntesya@gmail.com"),
+        "CONTACT_WHATSAPP": os.getenv("CONTACT_WHATSAPP", "+543510000000"),
+        "SUGGESTIONS_URL": os.getenv("SUGGESTIONS_URL",
+            "https://docs.google.com/forms/d/e/1FAIpQLScDEukn0sLtjOoWgmvTNaF_qG0iDHue9EOqCYxz_z6bGxzErg/viewform?usp=header"
+        ),
+    }
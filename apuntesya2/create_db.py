@@ -1,6 +1,6 @@
-from app import app, Base, engine
+from apuntesya2 import migrations
 
 if __name__ == "__main__":
-    with app.app_context():
-        Base.metadata.create_all(engine)
-        print("DB creada en", app.config['SQLALCHEMY_DATABASE_URI'])
\ No newline at end of file
+    engine = migrations.make_engine()
+    version = migrations.upgrade(engine)
+    print("DB creada/actualizada en", engine.url, "- versión", version)
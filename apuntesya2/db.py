@@ -0,0 +1,36 @@
+"""
+Engine y sesión de la app.
+
+`Session` existe desde el import (sin bind) para que las rutas, el admin y los
+scripts puedan importarlo sin efectos secundarios; `init_app` (llamado por
+`create_app`) crea el engine, lo enlaza y chequea la versión del esquema.
+"""
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+from apuntesya2 import migrations
+
+Session = scoped_session(sessionmaker(autoflush=False, expire_on_commit=False))
+engine = None
+
+
+def init_app(app):
+    global engine
+    engine = migrations.make_engine(app.config["DATABASE_URL"])
+    Session.configure(bind=engine)
+    # Las migraciones corren una vez antes de forkear los workers
+    # (gunicorn.conf.py / python -m apuntesya2.migrations); acá sólo se chequea la versión.
+    migrations.ensure_current(engine)
+    # Sin conexiones abiertas en el pool: con preload_app la app se crea antes
+    # del fork y cada worker debe abrir las suyas.
+    engine.dispose()
+    app.extensions["apuntesya2.db"] = engine
+
+    @app.teardown_appcontext
+    def _remove_session(exc=None):
+        Session.remove()
+
+
+def get_engine():
+    if engine is None:
+        raise RuntimeError("DB sin inicializar: usá create_app() antes de acceder al engine.")
+    return engine
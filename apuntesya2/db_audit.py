@@ -0,0 +1,172 @@
+"""
+Auditoría de planes de consulta (`flask db-audit`).
+
+Corre EXPLAIN (Postgres) / EXPLAIN QUERY PLAN (SQLite) sobre las consultas
+que usan las rutas y falla si alguna termina en un full table scan. Las
+consultas salen de las mismas funciones que ejecutan las rutas (queries.py y
+las `*_query` de cada módulo), con valores de ejemplo. Si una ruta suma una
+consulta, armala con una de esas funciones y agregala a `route_queries`.
+"""
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+
+from apuntesya2.models import User, Note, Purchase
+from apuntesya2 import (
+    blobstore, entitlements, exports, pagination, queries, reconcile, sales_rollup, search_index, seller_tokens,
+    taxonomy, uploads, webhooks,
+)
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)$")
+_SQLITE_SUBQUERY = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\w+)$")
+_PG_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def route_queries(bind):
+    """(nombre, statement, permitir_scan) para cada consulta de las rutas."""
+    now = datetime.utcnow()
+    uid, nid, path = 1, 1, "blobs/ab/cd/abcd.pdf"
+
+    def page(listing, limit=30, descending=True, cursor=(now, 1000)):
+        # Una página intermedia, como la arma pagination.paginate
+        stmt, keys = listing[:2]
+        after = pagination.encode_cursor(list(cursor))
+        return pagination.page_query(stmt, keys, after=after, limit=limit, descending=descending)
+
+    free = queries.search(bind, type_="free")
+    fts = queries.search(bind, q="metodologia")
+    by_career = queries.search(bind, university="UBA", career="Medicina")
+    refs_notes, refs_uploads = blobstore.refcount_queries(path)
+    quota_notes, quota_sessions = uploads.quota_queries(uid, now - timedelta(hours=1))
+    tree_unis, tree_facs, tree_cars = taxonomy.tree_queries()
+    count_users, count_notes = queries.admin_counts()
+
+    stmts = [
+        ("index", page(queries.catalog()), False),
+        ("search type=free", page(free, 100, free[2]), False),
+        # Con texto la clave es (rank, id)
+        ("search q", page(fts, 100, fts[2], (now, 1000) if fts[2] else (-1.0, 1000)), False),
+        ("search university/career",
+         page(by_career, 100, by_career[2], (now, 1000) if by_career[2] else (-1.0, 1000)), False),
+        ("login / register / promote_admin", queries.user_by_email("a@b.c"), False),
+        # session.get(...): búsqueda por PK
+        ("load_user / principals", select(User).where(User.id == uid), False),
+        ("note_detail / download_note note", select(Note).where(Note.id == nid), False),
+        ("purchase status / mp_webhook purchase", select(Purchase).where(Purchase.id == 1), False),
+        ("profile", page(queries.seller_notes(uid)), False),
+        ("profile_balance daily sales",
+         sales_rollup.daily_query(uid, (now - timedelta(days=30)).date(), now.date()), False),
+        ("profile_balance edge days", sales_rollup.raw_query(uid, now - timedelta(hours=6), now), False),
+        ("profile_balance notes", queries.balance_notes([1, 2, 3]), False),
+        ("profile_purchases", page(queries.buyer_purchases(uid)), False),
+        ("export balance", exports.seller_sales_query(uid, now - timedelta(days=30), now), False),
+        ("export purchases", exports.buyer_purchases_query(uid), False),
+        ("entitlements purchased note ids", entitlements.purchased_ids_query(uid), False),
+        ("download_note approved purchase", entitlements.approved_purchase_query(uid, nid), False),
+        ("blob refcount", refs_notes, False),
+        ("blob refcount (upload sessions)", refs_uploads, False),
+        ("upload quota notes", quota_notes, False),
+        ("upload quota sessions", quota_sessions, False),
+        ("upload sessions expiry", uploads.expired_query(now - uploads.SESSION_TTL), False),
+        ("mp_return last purchase of note", queries.last_purchase_of_note(uid, nid), False),
+        ("buy_note pending purchase reuse",
+         queries.reusable_purchase(uid, nid, 1000, now - timedelta(hours=6)), False),
+        ("reconcile oldest pending", reconcile.oldest_pending_query(now - timedelta(hours=72)), False),
+        ("reconcile stale pending",
+         reconcile.expire_batch_query(reconcile.stale_pending(now - timedelta(hours=48)), 0, reconcile.CHUNK), False),
+        ("reconcile newer duplicate",
+         reconcile.expire_batch_query(reconcile.duplicate_pending(), 0, reconcile.CHUNK), False),
+        ("checkout seller token", seller_tokens.token_query(uid), False),
+        ("seller tokens due",
+         seller_tokens.due_query(now + timedelta(hours=168), 0, seller_tokens.CHUNK), False),
+        ("webhook intake dedupe / periodic task schedule", webhooks.event_query("payment:1"), False),
+        ("webhook queue claim", webhooks.ready_query(now), False),
+        ("webhook queue claim (tasks)", webhooks.ready_query(now, 1, tasks=True), False),
+        ("webhook claimed batch", webhooks.claimed_query("w:1"), False),
+        ("webhook purchases batch", webhooks.purchases_query([1, 2, 3], only_pending=True), False),
+        ("api universities", queries.universities(), False),
+        ("api faculties", queries.faculties(1), False),
+        ("api careers", queries.careers(1), False),
+        ("api add university", queries.university_by_name("UNC"), False),
+        ("api add faculty", queries.faculty_by_name("FCE", 1), False),
+        ("api add career", queries.career_by_name("CP", 1), False),
+        ("admin files", page(queries.admin_files(), 50), False),
+        ("admin actions", queries.admin_actions(), False),
+        ("admin hard delete purchases", queries.note_purchases(nid), False),
+        # Árbol de taxonomía (/api/academics/tree): lectura completa, una vez por versión de la caché
+        ("api tree universities", tree_unis, True),
+        ("api tree faculties", tree_facs, True),
+        ("api tree careers", tree_cars, True),
+        # Listados completos del panel admin: el scan es intencional
+        ("admin dashboard users", count_users, True),
+        ("admin dashboard notes", count_notes, True),
+        ("admin users", queries.admin_users(), True),
+        ("admin users_files", queries.admin_users_files(email="a"), True),
+    ]
+    if search_index.pages_available(bind):
+        if bind.dialect.name == "sqlite":
+            stmts += [
+                ("search page matches", search_index.page_matches_query("metodologia", [1, 2, 3]), False),
+                ("search page snippets", search_index.page_snippets_query("metodologia", [1, 2, 3]), False),
+            ]
+        else:
+            stmts.append(("search page headlines", search_index.page_headlines_query("metodologia", [1, 2, 3]),
+                             False))
+    return stmts
+
+
+def explain(conn, stmt):
+    """Devuelve las líneas del plan de `stmt`."""
+    # render_postcompile: expande los IN (...) a un parámetro por valor
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    if compiled.positional:
+        params = tuple(compiled.params[k] for k in compiled.positiontup)
+    else:
+        params = compiled.params
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).all()
+        return [r[-1] for r in rows]
+    rows = conn.exec_driver_sql("EXPLAIN " + str(compiled), params).all()
+    return [r[0] for r in rows]
+
+
+def full_scans(dialect_name, plan):
+    """Tablas recorridas completas según el plan."""
+    found = []
+    # Recorrer una subconsulta (MATERIALIZE/CO-ROUTINE) es leer filas ya filtradas, no una tabla
+    derived = {m.group(1) for m in map(_SQLITE_SUBQUERY.match, (l.strip() for l in plan)) if m}
+    for line in plan:
+        line = line.strip()
+        if dialect_name == "sqlite":
+            m = _SQLITE_SCAN.match(line)
+            if m and m.group(1) in derived:
+                continue
+        else:
+            m = _PG_SEQ_SCAN.search(line)
+        if m:
+            found.append(m.group(1))
+    return found
+
+
+def run(engine, out=print) -> bool:
+    """Imprime el reporte y devuelve True si ninguna consulta hace full scan."""
+    ok = True
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # Con tablas chicas el planner prefiere Seq Scan aunque haya índice
+            conn.execute(text("SET enable_seqscan = off"))
+        for name, stmt, allow_scan in route_queries(conn):
+            plan = explain(conn, stmt)
+            scans = full_scans(conn.dialect.name, plan)
+            if scans and not allow_scan:
+                ok = False
+                status = "FAIL"
+            else:
+                status = "ok  " if not scans else "skip"
+            out(f"[{status}] {name}" + (f"  (full scan: {', '.join(scans)})" if scans else ""))
+            if status == "FAIL":
+                for line in plan:
+                    out(f"         {line}")
+        conn.rollback()
+    return ok
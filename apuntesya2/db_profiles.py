@@ -0,0 +1,120 @@
+"""
+Configuración del engine de SQLAlchemy por backend (la usan la app, las
+migraciones y los scripts vía `create`).
+
+Postgres
+- Pool por proceso: cada worker de gunicorn tiene el suyo, y lo usan a la vez
+  sus threads de requests (GUNICORN_THREADS) y de webhooks
+  (WEBHOOK_WORKER_THREADS). `pool_size` = esos threads, `max_overflow` la
+  mitad (exports y SSE que abren una sesión propia). Con DB_MAX_CONNECTIONS
+  se recorta para que workers (WEB_CONCURRENCY) × (pool + overflow) no pase
+  ese total.
+- `pool_recycle` (DB_POOL_RECYCLE, 30 min) en vez de `pool_pre_ping`: el ping
+  era un round-trip extra en cada checkout. Si igual se corta una conexión,
+  SQLAlchemy invalida el pool entero al primer error. DB_POOL_PRE_PING=1 lo vuelve a activar.
+- `statement_timeout` (DB_STATEMENT_TIMEOUT_MS, 30 s) e
+  `idle_in_transaction_session_timeout` se mandan al conectar (`options`). Las
+  migraciones y los re-index lo desactivan en su transacción
+  (`without_statement_timeout`).
+- DB_PGBOUNCER=1 (PgBouncer en modo transaction): sin pool propio (NullPool,
+  el pool es PgBouncer) y sin `options`, que PgBouncer rechaza; los timeouts
+  van en el rol: ALTER ROLE <usuario> SET statement_timeout = '30s'.
+
+SQLite
+- PRAGMAs en cada conexión nueva: WAL (los lectores no bloquean al que
+  escribe), synchronous=NORMAL (con WAL no se pierde consistencia, sólo la
+  última transacción si se corta la luz), busy_timeout (esperar el lock en
+  vez de "database is locked") y mmap_size.
+- Sin `pool_pre_ping`: un archivo local no se desconecta.
+
+`python -m apuntesya2.scripts.bench_db` compara esto con el engine anterior.
+"""
+import os
+import multiprocessing
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import NullPool
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,           # ms
+    "mmap_size": 256 * 1024 * 1024,
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name, "").strip()
+    return int(value) if value else default
+
+
+def _is_sqlite(url: str) -> bool:
+    return str(url).startswith("sqlite")
+
+
+def pool_sizing() -> tuple[int, int]:
+    """(pool_size, max_overflow) por proceso para Postgres."""
+    # Mismas variables y defaults que gunicorn.conf.py (start.sh las exporta)
+    threads = _env_int("GUNICORN_THREADS", 4) + _env_int("WEBHOOK_WORKER_THREADS", 1)
+    size = _env_int("DB_POOL_SIZE", threads)
+    overflow = _env_int("DB_MAX_OVERFLOW", max(2, size // 2))
+    limit = _env_int("DB_MAX_CONNECTIONS", 0)
+    if limit:
+        workers = _env_int("WEB_CONCURRENCY", max(2, multiprocessing.cpu_count() * 2 + 1))
+        per_process = max(2, limit // workers)
+        size = min(size, per_process)
+        overflow = min(overflow, per_process - size)
+    return size, overflow
+
+
+def engine_kwargs(url: str) -> dict:
+    if _is_sqlite(url):
+        # timeout: el mismo busy_timeout para el driver (sqlite3 espera el lock)
+        return {"future": True, "connect_args": {
+            "check_same_thread": False, "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000}}
+    kwargs = {"future": True, "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "0") == "1"}
+    if not str(url).startswith("postgresql"):
+        return kwargs
+    if os.getenv("DB_PGBOUNCER", "0") == "1":
+        kwargs["poolclass"] = NullPool
+        return kwargs
+    size, overflow = pool_sizing()
+    kwargs.update(
+        pool_size=size, max_overflow=overflow,
+        pool_timeout=_env_int("DB_POOL_TIMEOUT", 10),
+        pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+        # LIFO: las conexiones que sobran quedan ociosas y se reciclan
+        pool_use_lifo=True,
+        connect_args={
+            "application_name": os.getenv("DB_APPLICATION_NAME", "apuntesya"),
+            "options": f"-c statement_timeout={_env_int('DB_STATEMENT_TIMEOUT_MS', 30000)} "
+                       f"-c idle_in_transaction_session_timeout={_env_int('DB_IDLE_TX_TIMEOUT_MS', 60000)}",
+        },
+    )
+    return kwargs
+
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cur.execute(f"PRAGMA {name}={value}")
+    finally:
+        cur.close()
+
+
+def configure(engine):
+    """PRAGMAs de SQLite en cada conexión nueva (en otros backends no hace nada)."""
+    if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+        event.listen(engine, "connect", _sqlite_pragmas)
+    return engine
+
+
+def create(url: str):
+    return configure(create_engine(url, **engine_kwargs(url)))
+
+
+def without_statement_timeout(conn):
+    """Sin statement_timeout para el resto de la transacción de `conn` (migraciones, re-index)."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
@@ -0,0 +1,76 @@
+"""
+Entrega de archivos de UPLOAD_FOLDER (descarga de apuntes).
+
+La vista autoriza, cierra la sesión de DB y recién ahí llama a `send_upload`,
+que según DOWNLOAD_BACKEND:
+
+    python    (default) Flask envía el archivo: Range (206), ETag/If-None-Match (304)
+    nginx     header X-Accel-Redirect: DOWNLOAD_ACCEL_PREFIX/<ruta> y cuerpo vacío;
+              nginx lo sirve desde una `location` interna:
+
+                  location /_protected_uploads/ {
+                      internal;
+                      alias /ruta/a/uploads/;
+                  }
+
+    sendfile  header X-Sendfile con la ruta absoluta (Apache mod_xsendfile, lighttpd)
+
+Con nginx/sendfile el worker de gunicorn queda libre apenas manda los headers
+(y el proxy resuelve Range y los condicionales). En el modo python los blobs
+se llaman por su SHA-256, así que el ETag es el propio hash.
+"""
+import os
+from urllib.parse import quote
+
+from flask import current_app, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+from apuntesya2 import blobstore
+
+BACKENDS = ("python", "nginx", "sendfile")
+
+
+def etag_for(rel_path: str) -> str | None:
+    """ETag fuerte para blobs (hash del contenido); None = el de werkzeug (mtime/tamaño)."""
+    if blobstore.is_blob(rel_path):
+        return os.path.splitext(os.path.basename(rel_path))[0]
+    return None
+
+
+def send_upload(rel_path: str, download_name: str, mimetype: str = "application/pdf",
+                public_max_age: int | None = None):
+    """`public_max_age`: cacheable por proxies/CDN ese tiempo (sólo URLs firmadas de apuntes gratis)."""
+    cfg = current_app.config
+    root = cfg["UPLOAD_FOLDER"]
+    path = safe_join(root, rel_path)
+    if path is None:
+        raise NotFound()
+    backend = cfg.get("DOWNLOAD_BACKEND", "python")
+
+    if backend == "python":
+        if not os.path.isfile(path):
+            raise NotFound()
+        rv = send_file(path, mimetype=mimetype, as_attachment=True, download_name=download_name,
+                       conditional=True, etag=etag_for(rel_path) or True, max_age=0)
+    else:
+        rv = current_app.response_class(mimetype=mimetype)
+        rv.headers.set("Content-Disposition", "attachment", filename=download_name)
+        # Range / ETag / If-None-Match los resuelve el proxy sobre el archivo real
+        if backend == "nginx":
+            prefix = cfg.get("DOWNLOAD_ACCEL_PREFIX", "/_protected_uploads").rstrip("/")
+            rv.headers["X-Accel-Redirect"] = quote(f"{prefix}/{rel_path}")
+        elif backend == "sendfile":
+            rv.headers["X-Sendfile"] = os.path.abspath(path)
+        else:
+            raise ValueError(f"DOWNLOAD_BACKEND no soportado: {backend}")
+
+    if public_max_age:
+        rv.cache_control.no_cache = None
+        rv.cache_control.public = True
+        rv.cache_control.max_age = public_max_age
+    else:
+        # Depende de quién pidió (compra/vendedor): que no lo guarden caches compartidas
+        rv.cache_control.public = False
+        rv.cache_control.private = True
+    return rv
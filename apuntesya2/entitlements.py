@@ -0,0 +1,62 @@
+"""
+Qué apuntes puede descargar cada usuario.
+
+`purchased_ids(user_id)` es el set de note_id con compra aprobada, cacheado en
+`cache.entitlements` (LRU por worker + backend compartido, versión por
+usuario): el chequeo de note_detail / download_note es una búsqueda en un
+set, sin consulta a la DB. El worker de webhooks llama a `invalidate` cuando
+cambia el estado de una compra, así el próximo chequeo recarga el set;
+download_note además confirma en la DB cuando el set dice que no.
+"""
+from array import array
+
+from sqlalchemy import select
+
+from apuntesya2 import cache
+from apuntesya2.models import Purchase
+
+
+def _encode(ids) -> bytes:
+    return array("I", sorted(ids)).tobytes()
+
+
+def _decode(body: bytes) -> frozenset:
+    ids = array("I")
+    ids.frombytes(body)
+    return frozenset(ids)
+
+
+def purchased_ids_query(user_id: int):
+    return select(Purchase.note_id).where(Purchase.buyer_id == user_id, Purchase.status == "approved")
+
+
+def approved_purchase_query(user_id: int, note_id: int):
+    return select(Purchase.id).where(Purchase.buyer_id == user_id, Purchase.note_id == note_id,
+                                     Purchase.status == "approved").limit(1)
+
+
+def purchased_ids(session, user_id: int) -> frozenset:
+    def load():
+        return _encode(session.execute(purchased_ids_query(user_id)).scalars())
+    return _decode(cache.entitlements.get_or_load(user_id, load, scope=user_id).body)
+
+
+def can_download(session, user_id: int, note, verify: bool = False) -> bool:
+    """
+    `verify`: si el set cacheado dice que no, confirma en la DB (download_note:
+    la compra pudo aprobarse recién y la invalidación no haber llegado).
+    """
+    if note.price_cents == 0 or note.seller_id == user_id:
+        return True
+    if note.id in purchased_ids(session, user_id):
+        return True
+    if not verify:
+        return False
+    approved = session.execute(approved_purchase_query(user_id, note.id)).first()
+    if approved:
+        invalidate(user_id)  # el set cacheado quedó viejo
+    return approved is not None
+
+
+def invalidate(user_id: int):
+    cache.entitlements.invalidate(user_id)
@@ -0,0 +1,148 @@
+"""
+Exportación de ventas y compras en CSV (o XLSX) sin cargar todo en memoria.
+
+Las filas salen de la DB con un cursor de servidor (`yield_per`: named
+cursor en Postgres, cursor incremental en SQLite) y se escriben a medida que
+llegan: la memoria no depende de cuántas filas tenga el vendedor y el CSV
+empieza a llegar al navegador con el primer bloque.
+
+XLSX es opcional (paquete `xlsxwriter`): se escribe en modo `constant_memory`
+a un archivo temporal y se manda al terminar, porque un .xlsx es un zip que
+no se puede emitir por partes.
+"""
+import csv
+import io
+import tempfile
+from datetime import datetime
+
+from flask import Response
+from sqlalchemy import select
+
+from apuntesya2.db import Session
+from apuntesya2.models import Note, Purchase
+
+YIELD_PER = 1000
+FLUSH_BYTES = 64 * 1024
+FORMATS = {"csv": "text/csv; charset=utf-8",
+           "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+
+
+def xlsx_available() -> bool:
+    try:
+        import xlsxwriter  # noqa: F401  (opcional)
+    except ImportError:
+        return False
+    return True
+
+
+# -----------------------------------------------------------------------------
+# Filas
+# -----------------------------------------------------------------------------
+def _stream(stmt):
+    """Filas de `stmt` con una sesión propia: el generador corre después del request."""
+    with Session.session_factory() as s:
+        yield from s.execute(stmt.execution_options(yield_per=YIELD_PER))
+
+
+def seller_sales_query(seller_id: int, start: datetime, end: datetime):
+    return (
+        select(Purchase.created_at, Purchase.id, Note.title, Purchase.amount_cents, Purchase.payment_id)
+        .join(Note, Note.id == Purchase.note_id)
+        .where(Note.seller_id == seller_id, Purchase.status == "approved",
+               Purchase.created_at >= start, Purchase.created_at < end)
+        .order_by(Purchase.created_at, Purchase.id)
+    )
+
+
+def buyer_purchases_query(buyer_id: int):
+    return (
+        select(Purchase.created_at, Purchase.id, Note.title, Purchase.amount_cents, Purchase.status,
+               Purchase.payment_id)
+        .join(Note, Note.id == Purchase.note_id)
+        .where(Purchase.buyer_id == buyer_id, Purchase.status == "approved")
+        .order_by(Purchase.created_at, Purchase.id)
+    )
+
+
+def seller_sales(seller_id: int, start: datetime, end: datetime, rates: dict):
+    """Ventas aprobadas del vendedor en [start, end), con comisiones por fila (como el balance)."""
+    header = ["fecha", "compra", "apunte", "bruto", "comision_mp", "comision_apuntesya"]
+    if rates.get("iibb"):
+        header.append("retencion_iibb")
+    header += ["neto", "pago_mp"]
+    stmt = seller_sales_query(seller_id, start, end)
+
+    def rows():
+        for created_at, pid, title, amount, payment_id in _stream(stmt):
+            gross = int(amount or 0)
+            fees = [int(round(gross * rates["mp"])), int(round(gross * rates["apy"]))]
+            if rates.get("iibb"):
+                fees.append(int(round(gross * rates["iibb"])))
+            yield [created_at.strftime("%Y-%m-%d %H:%M:%S"), pid, title, gross / 100,
+                   *(f / 100 for f in fees), (gross - sum(fees)) / 100, payment_id or ""]
+    return header, rows()
+
+
+def buyer_purchases(buyer_id: int):
+    """Compras aprobadas del usuario (lo mismo que lista "Mis compras")."""
+    header = ["fecha", "compra", "apunte", "monto", "estado", "pago_mp"]
+    stmt = buyer_purchases_query(buyer_id)
+
+    def rows():
+        for created_at, pid, title, amount, status, payment_id in _stream(stmt):
+            yield [created_at.strftime("%Y-%m-%d %H:%M:%S"), pid, title, int(amount or 0) / 100,
+                   status, payment_id or ""]
+    return header, rows()
+
+
+# -----------------------------------------------------------------------------
+# Escritores
+# -----------------------------------------------------------------------------
+def _safe(value):
+    # Los títulos los escribe cualquier vendedor: que Excel no los tome como fórmula
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@", "\t", "\r"):
+        return "'" + value
+    return value
+
+
+def iter_csv(header, rows):
+    """CSV en bloques de ~FLUSH_BYTES. El BOM hace que Excel lo abra como UTF-8."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([_safe(v) for v in row])
+        if buf.tell() >= FLUSH_BYTES:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def iter_xlsx(header, rows, sheet="Datos", chunk=FLUSH_BYTES):
+    import xlsxwriter  # opcional: sólo para format=xlsx
+    with tempfile.TemporaryFile() as tmp:
+        book = xlsxwriter.Workbook(tmp, {"constant_memory": True, "in_memory": False,
+                                          "strings_to_formulas": False})
+        ws = book.add_worksheet(sheet)
+        bold = book.add_format({"bold": True})
+        ws.write_row(0, 0, header, bold)
+        for i, row in enumerate(rows, start=1):
+            ws.write_row(i, 0, row)
+        book.close()
+        tmp.seek(0)
+        while True:
+            data = tmp.read(chunk)
+            if not data:
+                return
+            yield data
+
+
+def response(fmt: str, filename: str, header, rows) -> Response:
+    body = iter_xlsx(header, rows) if fmt == "xlsx" else iter_csv(header, rows)
+    return Response(body, content_type=FORMATS[fmt], headers={
+        "Content-Disposition": f'attachment; filename="{filename}.{fmt}"',
+        "Cache-Control": "private, no-store",
+        "X-Accel-Buffering": "no",  # nginx: pasar los bloques sin juntar la respuesta
+    })
@@ -1,10 +1,59 @@
 # Gunicorn configuration
+import gc
+import os
+import sys
 import multiprocessing
 
 bind = "0.0.0.0:10000"
 timeout = 120
-workers = max(2, multiprocessing.cpu_count() * 2 + 1)
+# WEB_CONCURRENCY / GUNICORN_THREADS (start.sh los exporta): db_profiles.py
+# dimensiona el pool de la DB con las mismas variables y defaults
+workers = int(os.getenv("WEB_CONCURRENCY", max(2, multiprocessing.cpu_count() * 2 + 1)))
+# Threads por worker (gthread): una espera de /purchase/<id>/status (long-poll
+# o SSE) ocupa un thread, no el worker entero
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
 worker_tmp_dir = "/dev/shm"
+# La app se crea una vez en el master y los workers la heredan por fork
+# (páginas compartidas copy-on-write). Ver scripts/bench_startup.py.
+preload_app = True
 # accesslog = "-"
 # errorlog = "-"
 # loglevel = "info"
+
+
+def on_starting(server):
+    # Con memory:// las versiones de la caché son de cada worker: un usuario
+    # desactivado o una compra aprobada (principals, entitlements, estado de
+    # compra) no se enteran en los demás. Con varios workers hace falta la
+    # caché en /dev/shm (default en Linux) o redis://.
+    from apuntesya2 import cache, config
+    if server.cfg.workers > 1 and cache.process_local(config.CACHE_URL):
+        server.log.error("CACHE_URL=%s no se comparte entre los %s workers: usá la caché en /dev/shm "
+                         "o redis://... (o WEB_CONCURRENCY=1)", config.CACHE_URL or "memory://", server.cfg.workers)
+        sys.exit(1)
+    # Migraciones de esquema una sola vez, en el master y antes de forkear;
+    # los workers sólo verifican la versión al crear la app.
+    from apuntesya2 import migrations
+    migrations.upgrade(migrations.make_engine(), out=server.log.info)
+
+
+def pre_fork(server, worker):
+    # Mueve los objetos ya creados a la generación permanente: el GC de los
+    # workers no los recorre y no ensucia (copia) esas páginas.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Las conexiones abiertas en el master no se comparten entre procesos
+    from apuntesya2 import db
+    if db.engine is not None:
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Procesamiento de webhooks en threads del worker (0 = sólo con `flask webhooks-worker`)
+    app = worker.wsgi
+    threads = int(getattr(app, "config", {}).get("WEBHOOK_WORKER_THREADS", 0))
+    if threads:
+        from apuntesya2 import webhooks
+        webhooks.Worker(app, threads).start()
@@ -6,16 +6,12 @@
 # - Con --revoke lo quita (is_admin=0)
 
 import argparse
-from sqlalchemy import create_engine, text
-from apuntesya2.app import app  # para leer SQLALCHEMY_DATABASE_URI desde tu config
+from sqlalchemy import text
+from apuntesya2 import db_profiles
+from apuntesya2.config import DB_URL  # la misma base que usa la app, sin levantarla
 
 def set_admin(email: str, make_admin: bool = True) -> None:
-    uri = app.config.get("SQLALCHEMY_DATABASE_URI")
-    if not uri:
-        print("❌ No se encontró SQLALCHEMY_DATABASE_URI en la configuración de la app.")
-        return
-
-    engine = create_engine(uri, future=True)
+    engine = db_profiles.create(DB_URL)
 
     with engine.begin() as conn:
         # 1) Verifico que exista el usuario
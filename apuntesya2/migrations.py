@@ -0,0 +1,300 @@
+"""
+Migraciones versionadas del esquema (SQLite y Postgres).
+
+Las migraciones corren UNA vez, antes de que gunicorn forkee los workers
+(hook `on_starting` en gunicorn.conf.py, `release` en Procfile o start.sh).
+Cada worker sólo verifica la versión (`ensure_current`): un SELECT.
+
+La versión aplicada queda en la tabla `schema_version`. Cada migración corre
+en su propia transacción, bajo un lock (advisory lock en Postgres, flock en
+SQLite) para que dos procesos no migren a la vez. Las migraciones son
+idempotentes: una base creada antes de este sistema se "adopta" sin errores.
+
+Uso:
+    python -m apuntesya2.migrations            # aplica lo pendiente
+    python -m apuntesya2.migrations --check    # exit 1 si hay pendientes
+    flask --app apuntesya2.app db-upgrade
+
+Para cambiar el esquema: agregá una función con @migration(N, "...") al final
+(N = última + 1). No edites migraciones ya publicadas.
+"""
+import os
+import sys
+import logging
+import contextlib
+from datetime import datetime
+
+from sqlalchemy import inspect, text, Table, Column, Integer, String, DateTime, MetaData
+from sqlalchemy.schema import CreateIndex
+
+from apuntesya2 import config, db_profiles
+from apuntesya2.models import Base
+
+log = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+_meta = MetaData()
+schema_version = Table(
+    "schema_version", _meta,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+_PG_LOCK_ID = 727274  # arbitrario, fijo para todos los procesos de la app
+
+
+def migration(version: int, description: str):
+    def deco(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return deco
+
+
+def head() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+# -----------------------------------------------------------------------------
+# Helpers para escribir migraciones idempotentes
+# -----------------------------------------------------------------------------
+def has_table(conn, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+
+def has_column(conn, table: str, col: str) -> bool:
+    return any(c["name"] == col for c in inspect(conn).get_columns(table))
+
+
+def add_column(conn, table: str, ddl: str):
+    """add_column(conn, "notes", "is_reported BOOLEAN DEFAULT FALSE")"""
+    if not has_column(conn, table, ddl.split()[0]):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {ddl}"))
+
+
+def create_model_indexes(conn, *names):
+    """
+    Crea (IF NOT EXISTS) los índices declarados en models.py; todos si no se pasan nombres.
+    Se saltean los de columnas que todavía no existen: los crea la migración que las agrega.
+    """
+    insp = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for ix in table.indexes:
+            if names and ix.name not in names:
+                continue
+            if all(c.name in existing for c in ix.columns):
+                conn.execute(CreateIndex(ix, if_not_exists=True))
+
+
+# -----------------------------------------------------------------------------
+# Migraciones
+# -----------------------------------------------------------------------------
+@migration(1, "tablas base")
+def _m1_base(conn):
+    # create_all sólo crea lo que falta (checkfirst)
+    Base.metadata.create_all(conn)
+
+
+@migration(2, "admin: users.is_active/is_admin/deleted_at, notes.deleted_at, admin_actions")
+def _m2_admin_schema(conn):
+    # Antes: scripts/upgrade_admin_schema.py (sólo SQLite)
+    add_column(conn, "users", "is_active BOOLEAN DEFAULT TRUE")
+    add_column(conn, "users", "is_admin BOOLEAN DEFAULT FALSE")
+    add_column(conn, "users", "deleted_at TIMESTAMP NULL")
+    add_column(conn, "notes", "deleted_at TIMESTAMP NULL")
+    if not has_table(conn, "admin_actions"):
+        Base.metadata.tables["admin_actions"].create(conn)
+
+
+@migration(3, "notes.is_reported")
+def _m3_is_reported(conn):
+    # Antes: scripts/add_is_reported_to_notes.py
+    add_column(conn, "notes", "is_reported BOOLEAN DEFAULT FALSE")
+
+
+@migration(4, "índices compuestos de paginación y consultas frecuentes")
+def _m4_indexes(conn):
+    # Antes: scripts/add_indexes.py
+    create_model_indexes(conn)
+
+
+@migration(5, "índice full-text de apuntes")
+def _m5_search_index(conn):
+    from apuntesya2 import search_index
+    if search_index.ensure_schema(conn):
+        search_index.rebuild(conn)
+
+
+@migration(6, "índice notes.file_path (referencias a blobs)")
+def _m6_file_path_index(conn):
+    create_model_indexes(conn, "ix_notes_file_path")
+
+
+@migration(7, "upload_sessions (subidas reanudables)")
+def _m7_upload_sessions(conn):
+    Base.metadata.tables["upload_sessions"].create(conn, checkfirst=True)
+
+
+@migration(8, "purchases.init_point (reuso de preferencias de MP)")
+def _m8_purchase_init_point(conn):
+    add_column(conn, "purchases", "init_point VARCHAR(512)")
+
+
+@migration(9, "webhook_events como cola de procesamiento")
+def _m9_webhook_queue(conn):
+    Base.metadata.tables["webhook_events"].create(conn, checkfirst=True)
+    add_column(conn, "webhook_events", "status VARCHAR(16) DEFAULT 'pending'")
+    add_column(conn, "webhook_events", "attempts INTEGER DEFAULT 0")
+    add_column(conn, "webhook_events", "next_attempt_at TIMESTAMP")
+    add_column(conn, "webhook_events", "locked_until TIMESTAMP")
+    add_column(conn, "webhook_events", "locked_by VARCHAR(64)")
+    add_column(conn, "webhook_events", "last_error TEXT")
+    add_column(conn, "webhook_events", "updated_at TIMESTAMP")
+    create_model_indexes(conn, "ix_webhook_events_queue")
+
+
+@migration(10, "índice de vencimiento de tokens de MP")
+def _m10_users_token_expiry(conn):
+    create_model_indexes(conn, "ix_users_mp_token_expires")
+
+
+@migration(11, "seller_daily_sales (ventas por día para /profile/balance)")
+def _m11_seller_daily_sales(conn):
+    from sqlalchemy.orm import Session
+    from apuntesya2 import sales_rollup
+    Base.metadata.tables["seller_daily_sales"].create(conn, checkfirst=True)
+    sales_rollup.rebuild(Session(bind=conn))
+
+
+@migration(12, "notes.page_count / file_size (previews)")
+def _m12_note_pdf_metadata(conn):
+    add_column(conn, "notes", "page_count INTEGER")
+    add_column(conn, "notes", "file_size INTEGER")
+
+
+@migration(13, "note_pages (texto de los PDF para la búsqueda)")
+def _m13_note_pages(conn):
+    from apuntesya2 import search_index
+    Base.metadata.tables["note_pages"].create(conn, checkfirst=True)
+    add_column(conn, "notes", "text_file_path VARCHAR(255)")
+    # El texto se extrae aparte: flask search-index-content
+    search_index.ensure_pages_schema(conn)
+
+
+@migration(14, "webhook_events.notification_id (re-entregas de MP)")
+def _m14_webhook_notification_id(conn):
+    add_column(conn, "webhook_events", "notification_id VARCHAR(64)")
+
+
+@migration(15, "índices de taxonomía de la búsqueda (Postgres)")
+def _m15_search_taxonomy_indexes(conn):
+    # ensure_schema es idempotente: en Postgres agrega los ix_notes_<col>_key
+    from apuntesya2 import search_index
+    search_index.ensure_schema(conn)
+
+
+# -----------------------------------------------------------------------------
+# Runner
+# -----------------------------------------------------------------------------
+def current_version(engine) -> int:
+    with engine.connect() as conn:
+        if not has_table(conn, "schema_version"):
+            return 0
+        return conn.execute(text("SELECT max(version) FROM schema_version")).scalar() or 0
+
+
+@contextlib.contextmanager
+def _lock(engine):
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": _PG_LOCK_ID})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _PG_LOCK_ID})
+                conn.commit()
+        return
+    db_path = engine.url.database
+    try:
+        import fcntl
+    except ImportError:  # Windows: sin lock (desarrollo local, un solo proceso)
+        fcntl = None
+    if fcntl is None or not db_path or db_path == ":memory:":
+        yield
+        return
+    with open(db_path + ".migrate.lock", "w") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def upgrade(engine, target: int | None = None, out=print) -> int:
+    """Aplica las migraciones pendientes. Devuelve la versión final."""
+    target = head() if target is None else target
+    with _lock(engine):
+        _meta.create_all(engine)
+        version = current_version(engine)  # releído con el lock tomado
+        for number, description, fn in MIGRATIONS:
+            if number <= version or number > target:
+                continue
+            with engine.begin() as conn:
+                # Un índice sobre una tabla grande tarda más que el timeout de los requests
+                db_profiles.without_statement_timeout(conn)
+                fn(conn)
+                conn.execute(schema_version.insert().values(
+                    version=number, description=description, applied_at=datetime.utcnow()))
+            out(f"✔ migración {number}: {description}")
+            version = number
+    return version
+
+
+def ensure_current(engine):
+    """
+    Chequeo de arranque de cada worker. Si la base está atrasada (p.ej. `flask
+    run` en desarrollo) migra sólo si AUTO_MIGRATE=1 (default); si no, falla.
+    """
+    version = current_version(engine)
+    if version >= head():
+        return version
+    if os.getenv("AUTO_MIGRATE", "1") == "1":
+        return upgrade(engine, out=log.info)
+    raise RuntimeError(
+        f"Esquema en versión {version}, se esperaba {head()}. "
+        "Corré `python -m apuntesya2.migrations` antes de iniciar la app."
+    )
+
+
+def make_engine(url: str = None):
+    url = url or config.DB_URL
+    if url.startswith("sqlite:///"):
+        os.makedirs(os.path.dirname(os.path.abspath(url.replace("sqlite:///", "", 1))) or ".", exist_ok=True)
+    return db_profiles.create(url)
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Migraciones de esquema de ApuntesYa")
+    ap.add_argument("--check", action="store_true", help="sale con 1 si hay migraciones pendientes")
+    ap.add_argument("--url", default=None, help="DATABASE_URL (default: la de la app)")
+    args = ap.parse_args(argv)
+
+    engine = make_engine(args.url)
+    if args.check:
+        version = current_version(engine)
+        print(f"Esquema en versión {version} (última: {head()})")
+        return 0 if version >= head() else 1
+    version = upgrade(engine)
+    print(f"Esquema al día (versión {version}) en {engine.url.render_as_string(hide_password=True)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
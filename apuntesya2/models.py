@@ -3,7 +3,7 @@ from sqlalchemy import Column, Integer, String, DateTime
 from datetime import datetime
 from flask_login import UserMixin
 from sqlalchemy.orm import Mapped, mapped_column, relationship, declarative_base
-from sqlalchemy import Integer, String, DateTime, Text, ForeignKey, Boolean
+from sqlalchemy import Integer, String, Date, DateTime, Text, ForeignKey, Boolean, Index, func
 
 Base = declarative_base()
 
@@ -29,6 +29,15 @@ class User(Base, UserMixin):
 
     notes = relationship("Note", back_populates="seller")
 
+    __table_args__ = (
+        # tokens de MP por vencer (seller_tokens.refresh_due)
+        Index("ix_users_mp_token_expires", "mp_token_expires_at"),
+    )
+
+    @property
+    def mp_linked(self) -> bool:
+        return bool(self.mp_access_token)
+
 class Note(Base):
     __tablename__ = "notes"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -41,6 +50,11 @@ class Note(Base):
     file_path: Mapped[str] = mapped_column(String(255), nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     is_reported: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Metadatos del PDF; los completa el render de la preview (previews.py)
+    page_count: Mapped[int] = mapped_column(Integer, nullable=True)
+    file_size: Mapped[int] = mapped_column(Integer, nullable=True)
+    # file_path cuyo texto está en note_pages (pdf_text.py); distinto = falta re-indexar
+    text_file_path: Mapped[str] = mapped_column(String(255), nullable=True)
 
     seller_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     seller = relationship("User", back_populates="notes")
@@ -48,6 +62,15 @@ class Note(Base):
     deleted_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    # Paginación por cursor (created_at, id): catálogo, perfil del vendedor y admin
+    __table_args__ = (
+        Index("ix_notes_active_created", "is_active", "created_at", "id"),
+        Index("ix_notes_seller_created", "seller_id", "created_at", "id"),
+        Index("ix_notes_created", "created_at", "id"),
+        # Referencias a cada blob del almacenamiento por contenido (blobstore.refcount)
+        Index("ix_notes_file_path", "file_path"),
+    )
+
 class Purchase(Base):
     __tablename__ = "purchases"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -55,10 +78,44 @@ class Purchase(Base):
     note_id: Mapped[int] = mapped_column(ForeignKey("notes.id"), nullable=False)
     payment_id: Mapped[str] = mapped_column(String(64), nullable=True)
     preference_id: Mapped[str] = mapped_column(String(64), nullable=True)
-    status: Mapped[str] = mapped_column(String(32), default="pending")  # pending, approved, rejected, cancelled
+    init_point: Mapped[str] = mapped_column(String(512), nullable=True)  # checkout de la preferencia
+    status: Mapped[str] = mapped_column(String(32), default="pending")  # pending, approved, rejected, cancelled, expired
     amount_cents: Mapped[int] = mapped_column(Integer, default=0)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # "Mis compras" paginado por (created_at, id)
+        Index("ix_purchases_buyer_status_created", "buyer_id", "status", "created_at", "id"),
+        # ¿el comprador ya pagó este apunte? (note_detail / download_note)
+        Index("ix_purchases_buyer_note_status", "buyer_id", "note_id", "status"),
+        # última compra de un apunte (mp_return) y balance por apunte
+        Index("ix_purchases_note_created", "note_id", "created_at"),
+        # compras por estado en una ventana de tiempo (reportes / conciliación)
+        Index("ix_purchases_status_created", "status", "created_at"),
+    )
+
+class SellerDailySales(Base):
+    """Ventas aprobadas por vendedor, apunte y día UTC de la compra (ver sales_rollup.py)."""
+    __tablename__ = "seller_daily_sales"
+    seller_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    day: Mapped[datetime] = mapped_column(Date, primary_key=True)
+    note_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    sold_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    gross_cents: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+class NotePage(Base):
+    """Texto de cada página del PDF de un apunte, para la búsqueda (ver pdf_text.py)."""
+    __tablename__ = "note_pages"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    note_id: Mapped[int] = mapped_column(ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    page: Mapped[int] = mapped_column(Integer, nullable=False)          # 1-based
+    char_offset: Mapped[int] = mapped_column(Integer, nullable=False)   # inicio de la página en el texto completo
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+
+    __table_args__ = (
+        Index("ix_note_pages_note_page", "note_id", "page"),
+    )
+
 class AdminAction(Base):
     __tablename__ = "admin_actions"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -68,14 +125,35 @@ class AdminAction(Base):
     target_id: Mapped[int] = mapped_column(Integer, nullable=False)
     reason: Mapped[str] = mapped_column(Text, nullable=True)
     ip: Mapped[str] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+# --- Subidas reanudables (ver uploads.py) ---
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    filename: Mapped[str] = mapped_column(String(255), nullable=True)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    blob_path: Mapped[str] = mapped_column(String(255), nullable=True)  # al completarse
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # límite de subidas por hora del usuario
+        Index("ix_upload_sessions_user_created", "user_id", "created_at"),
+        Index("ix_upload_sessions_created", "created_at"),
+        # referencias a blobs de subidas completas sin apunte todavía (blobstore.refcount / gc)
+        Index("ix_upload_sessions_blob_path", "blob_path"),
+    )
+
 # --- Academic taxonomy (auto-learning dropdowns) ---
 class University(Base):
     __tablename__ = "universities"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(160), unique=True, nullable=False, index=True)
 
+# api_add_university busca por lower(name)
+Index("ix_universities_name_lower", func.lower(University.name))
+
 class Faculty(Base):
     __tablename__ = "faculties"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -101,4 +179,19 @@ class WebhookEvent(Base):
     topic = Column(String(64), nullable=True)
     action = Column(String(64), nullable=True)
     payload = Column(JSON, nullable=True)
+    notification_id = Column(String(64), nullable=True)  # id de la última notificación de MP (re-entregas)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Cola de procesamiento (ver webhooks.py)
+    status = Column(String(16), nullable=False, default="pending")  # pending, processing, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=True, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    locked_by = Column(String(64), nullable=True)
+    last_error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # próximos eventos a procesar
+        Index("ix_webhook_events_queue", "status", "next_attempt_at"),
+    )
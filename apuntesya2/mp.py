@@ -1,38 +1,149 @@
-import os, requests
-from datetime import datetime, timedelta
+"""
+Cliente HTTP de Mercado Pago.
+
+Un `requests.Session` por proceso (conexiones keep-alive en pool, así no se
+paga TLS en cada llamada), timeouts cortos de conexión/lectura y reintentos
+con backoff exponencial + jitter ante errores de red, 429 y 5xx:
+
+- GET: siempre reintentables.
+- Preferencias: se mandan con X-Idempotency-Key, así un reintento no duplica.
+- OAuth (el `code` es de un solo uso): sólo se reintenta si no llegó a conectar.
+
+Variables de entorno: MP_API_BASE (p.ej. el server falso de
+`python -m apuntesya2.scripts.fake_mp`), MP_CONNECT_TIMEOUT, MP_READ_TIMEOUT,
+MP_RETRIES, MP_POOL_SIZE.
+"""
+import os
+import time
+import uuid
+import random
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
 
 API_BASE = "https://api.mercadopago.com"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class MPError(RuntimeError):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class MercadoPagoClient:
+    def __init__(self, base_url=None, connect_timeout=None, read_timeout=None, retries=None,
+                 backoff=0.25, pool_size=None):
+        self.base_url = (base_url or os.getenv("MP_API_BASE") or API_BASE).rstrip("/")
+        self.timeout = (float(connect_timeout or os.getenv("MP_CONNECT_TIMEOUT", "3.05")),
+                        float(read_timeout or os.getenv("MP_READ_TIMEOUT", "10")))
+        self.retries = int(retries if retries is not None else os.getenv("MP_RETRIES", "2"))
+        self.backoff = backoff
+        pool_size = int(pool_size or os.getenv("MP_POOL_SIZE", "10"))
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+
+    def _sleep(self, attempt):
+        # backoff exponencial con "full jitter"
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def request(self, method, path, token=None, retry="idempotent", what="request", **kwargs):
+        """
+        retry: "idempotent" (reintenta errores de red/429/5xx) o "connect"
+        (sólo si no se pudo conectar: el pedido no llegó a MP).
+        """
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        url = self.base_url + path
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                r = self.http.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            except requests.ConnectTimeout as e:
+                if last:  # el pedido no llegó a salir: siempre se puede reintentar
+                    raise MPError(f"MP {what}: timeout de conexión ({e})") from e
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last or retry == "connect":
+                    raise MPError(f"MP {what}: sin respuesta ({e})") from e
+            else:
+                if r.status_code in RETRY_STATUS and retry == "idempotent" and not last:
+                    log.info("MP %s: %s, reintento %s", what, r.status_code, attempt + 1)
+                elif r.status_code >= 400:
+                    try:
+                        err = r.json()
+                    except ValueError:
+                        err = {"raw": r.text[:400]}
+                    raise MPError(f"MP {what} error {r.status_code}: {err}", r.status_code)
+                else:
+                    try:
+                        return r.json()
+                    except ValueError as e:
+                        raise MPError(f"No se pudo parsear la respuesta de MP: {e}; cuerpo={r.text[:400]}")
+            self._sleep(attempt)
 
-def _auth_header(access_token:str):
-    return {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+    # -------------------------------------------------------------------------
+    # OAuth
+    # -------------------------------------------------------------------------
+    def oauth_token(self, data: dict):
+        data = {"client_id": os.getenv("MP_OAUTH_CLIENT_ID"),
+                "client_secret": os.getenv("MP_OAUTH_CLIENT_SECRET"), **data}
+        return self.request("POST", "/oauth/token", data=data, retry="connect", what="oauth")
 
+    # -------------------------------------------------------------------------
+    # Checkout / pagos
+    # -------------------------------------------------------------------------
+    def create_preference(self, token, payload: dict, idempotency_key=None):
+        headers = {"X-Idempotency-Key": idempotency_key or uuid.uuid4().hex}
+        return self.request("POST", "/checkout/preferences", token=token, json=payload,
+                            headers=headers, what="preference")
+
+    def get_payment(self, token, payment_id):
+        return self.request("GET", f"/v1/payments/{payment_id}", token=token, what="get_payment")
+
+    def search_payments(self, token, **params):
+        return self.request("GET", "/v1/payments/search", token=token, params=params, what="search")
+
+
+_client = (None, None)
+_client_lock = threading.Lock()
+
+
+def client() -> MercadoPagoClient:
+    """Cliente del proceso (uno nuevo después de un fork: el pool no se comparte)."""
+    global _client
+    pid, c = _client
+    if pid != os.getpid():
+        with _client_lock:
+            if _client[0] != os.getpid():
+                _client = (os.getpid(), MercadoPagoClient())
+            c = _client[1]
+    return c
+
+
+# -----------------------------------------------------------------------------
+# API de módulo (la que usan las vistas)
+# -----------------------------------------------------------------------------
 def oauth_authorize_url():
     client_id = os.getenv("MP_OAUTH_CLIENT_ID")
     redirect_uri = os.getenv("MP_OAUTH_REDIRECT_URL")
     return f"https://auth.mercadopago.com/authorization?response_type=code&client_id={client_id}&redirect_uri={redirect_uri}"
 
 def oauth_exchange_code(code:str):
-    data = {
+    return client().oauth_token({
         "grant_type": "authorization_code",
-        "client_id": os.getenv("MP_OAUTH_CLIENT_ID"),
-        "client_secret": os.getenv("MP_OAUTH_CLIENT_SECRET"),
         "code": code,
         "redirect_uri": os.getenv("MP_OAUTH_REDIRECT_URL"),
-    }
-    r = requests.post(f"{API_BASE}/oauth/token", data=data, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    })
 
 def oauth_refresh(refresh_token:str):
-    data = {
-        "grant_type": "refresh_token",
-        "client_id": os.getenv("MP_OAUTH_CLIENT_ID"),
-        "client_secret": os.getenv("MP_OAUTH_CLIENT_SECRET"),
-        "refresh_token": refresh_token
-    }
-    r = requests.post(f"{API_BASE}/oauth/token", data=data, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    return client().oauth_token({"grant_type": "refresh_token", "refresh_token": refresh_token})
 
 def create_preference_for_seller_token(seller_access_token:str, title:str, unit_price:float, quantity:int, marketplace_fee:float, external_reference:str, back_urls:dict, notification_url:str):
     # back_urls sanity
@@ -59,38 +170,13 @@ def create_preference_for_seller_token(seller_access_token:str, title:str, unit_
     if isinstance(success_url, str) and success_url.startswith("https://"):
         payload["auto_return"] = "approved"
 
-    r = requests.post(f"{API_BASE}/checkout/preferences", json=payload, headers=_auth_header(seller_access_token), timeout=30)
-    # Mejor diagnóstico
-    if r.status_code >= 400:
-        try:
-            err = r.json()
-        except Exception:
-            err = {"raw": r.text}
-        raise RuntimeError(f"MP preference error {r.status_code}: {err}")
-    try:
-        return r.json()
-    except Exception as e:
-        # Evita "'Response' object is not callable" por confusiones al serializar
-        raise RuntimeError(f"No se pudo parsear la respuesta de MP: {e}; cuerpo={r.text[:400]}")
+    # Una preferencia por compra: la referencia sirve de clave de idempotencia
+    return client().create_preference(seller_access_token, payload, idempotency_key=external_reference)
 
 def get_payment(access_token:str, payment_id:str):
-    r = requests.get(f"{API_BASE}/v1/payments/{payment_id}", headers=_auth_header(access_token), timeout=30)
-    if r.status_code >= 400:
-        try:
-            err = r.json()
-        except Exception:
-            err = {"raw": r.text}
-        raise RuntimeError(f"MP get_payment error {r.status_code}: {err}")
-    return r.json()
+    return client().get_payment(access_token, payment_id)
 
 
 def search_payments_by_external_reference(access_token:str, external_reference:str):
-    params = {"external_reference": external_reference, "sort": "date_created", "criteria": "desc"}
-    r = requests.get(f"{API_BASE}/v1/payments/search", params=params, headers=_auth_header(access_token), timeout=30)
-    if r.status_code >= 400:
-        try:
-            err = r.json()
-        except Exception:
-            err = {"raw": r.text}
-        raise RuntimeError(f"MP search error {r.status_code}: {err}")
-    return r.json()
+    return client().search_payments(access_token, external_reference=external_reference,
+                                     sort="date_created", criteria="desc")
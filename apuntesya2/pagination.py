@@ -0,0 +1,119 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+En lugar de OFFSET, cada página arranca desde la clave (p.ej. created_at, id)
+del último/primer elemento de la página anterior:
+
+    WHERE (created_at, id) < (:c, :i) ORDER BY created_at DESC, id DESC LIMIT n
+
+Con un índice compuesto que termine en esas columnas cada página es un
+rango del índice de tamaño O(n), sin importar cuán profundo se navegue.
+"""
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+@dataclass
+class Page:
+    items: list = field(default_factory=list)
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+
+def _encode_value(v):
+    if isinstance(v, datetime):
+        return {"d": v.isoformat()}
+    return v
+
+
+def _decode_value(v):
+    if isinstance(v, dict) and "d" in v:
+        return datetime.fromisoformat(v["d"])
+    return v
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str | None, size: int):
+    """Devuelve la lista de valores o None si el cursor falta o es inválido."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = [_decode_value(v) for v in json.loads(raw)]
+    except Exception:
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def _bounds(keys, after, before):
+    after_v = decode_cursor(after, len(keys))
+    before_v = decode_cursor(before, len(keys)) if after_v is None else None
+    return after_v, before_v
+
+
+def page_query(stmt, keys, *, after=None, before=None, limit=30, descending=True):
+    """
+    El SELECT que ejecuta `paginate` para esa página: `stmt` con las claves
+    como columnas extra, el rango del cursor, el orden y limit + 1 filas
+    (la de más indica si hay otra página).
+    """
+    keys = list(keys)
+    after_v, before_v = _bounds(keys, after, before)
+    backwards = before_v is not None
+
+    labelled = [k.label(f"_pk{i}") for i, k in enumerate(keys)]
+    key_tuple = tuple_(*keys)
+    forward_desc = descending != backwards  # al ir hacia atrás se invierte el orden
+
+    q = stmt.add_columns(*labelled)
+    bound = before_v if backwards else after_v
+    if bound is not None:
+        q = q.where(key_tuple < tuple_(*bound) if forward_desc else key_tuple > tuple_(*bound))
+    q = q.order_by(None).order_by(*[k.desc() if forward_desc else k.asc() for k in keys])
+    return q.limit(limit + 1)
+
+
+def paginate(session, stmt, keys, *, after=None, before=None, limit=30, descending=True):
+    """
+    Ejecuta `stmt` paginado por `keys` (columnas/expresiones, todas en el
+    mismo sentido). `after` / `before` son cursores de `Page.next_cursor` /
+    `Page.prev_cursor`. Los items son lo que devolvería `stmt` (una entidad
+    o una tupla si el select tiene varias).
+    """
+    keys = list(keys)
+    n_keys = len(keys)
+    after_v, before_v = _bounds(keys, after, before)
+    backwards = before_v is not None
+
+    rows = session.execute(
+        page_query(stmt, keys, after=after, before=before, limit=limit, descending=descending)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    width = len(rows[0]) - n_keys if rows else 0
+    items = [r[0] if width == 1 else tuple(r[:width]) for r in rows]
+
+    page = Page(items=items)
+    if rows:
+        first_key = list(rows[0][width:])
+        last_key = list(rows[-1][width:])
+        if backwards:
+            page.next_cursor = encode_cursor(last_key)
+            page.prev_cursor = encode_cursor(first_key) if has_more else None
+        else:
+            page.next_cursor = encode_cursor(last_key) if has_more else None
+            page.prev_cursor = encode_cursor(first_key) if after_v is not None else None
+    return page
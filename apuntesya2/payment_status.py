@@ -0,0 +1,54 @@
+"""
+Estado de pago de una compra, servido desde la DB local.
+
+El estado lo escriben el worker de webhooks (webhooks.py) y el conciliador;
+las vistas nunca consultan a MP. `/purchase/<id>/status` espera un cambio
+(Server-Sent Events o long-poll JSON) sin consultar la DB en cada vuelta:
+
+- `notify(purchase_id)` incrementa la versión de la compra en el backend
+  compartido de la caché (CACHE_URL, lo ven todos los workers) y despierta a
+  los que esperan en este proceso.
+- `wait_change` mira esa versión cada POLL_SECONDS (una lectura en
+  /dev/shm o Redis) y sólo relee la compra cuando cambió.
+"""
+import threading
+import time
+
+from apuntesya2 import cache
+from apuntesya2.db import Session
+from apuntesya2.models import Purchase
+
+POLL_SECONDS = 0.5
+FINAL = {"approved", "rejected", "cancelled", "refunded", "charged_back", "expired"}
+
+_changed = threading.Condition()
+
+
+def notify(purchase_id: int):
+    cache.purchase_status.invalidate(purchase_id)
+    with _changed:
+        _changed.notify_all()
+
+
+def read(purchase_id: int) -> str | None:
+    with Session() as s:
+        p = s.get(Purchase, purchase_id)
+        return p.status if p else None
+
+
+def wait_change(purchase_id: int, known: str | None, timeout: float) -> str | None:
+    """Estado de la compra apenas sea distinto de `known`, o el actual al vencer `timeout`."""
+    deadline = time.monotonic() + timeout
+    version = cache.purchase_status.version(purchase_id)
+    status = read(purchase_id)
+    while status == known:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            break
+        with _changed:
+            _changed.wait(min(POLL_SECONDS, left))
+        current = cache.purchase_status.version(purchase_id)
+        if current != version:
+            version = current
+            status = read(purchase_id)
+    return status
@@ -0,0 +1,128 @@
+"""
+Texto de los PDF para la búsqueda: una fila por página en `note_pages`.
+
+La extracción corre en el pool de procesos (procpool.py) con pdfium
+(`pypdfium2`, opcional). Cada tarea abre el PDF (pdfium lee del archivo lo
+que necesita, no lo carga entero), saca el texto de BATCH_PAGES páginas
+liberando cada una al terminar y devuelve esa tanda; el proceso de la app la
+inserta apenas llega. En memoria hay a lo sumo 2 tandas por proceso del
+pool, nunca el PDF entero, y las tandas de un PDF largo se reparten entre
+los procesos.
+
+Cada fila guarda el número de página y `char_offset` (dónde empieza la página
+en el texto completo); `search_index.page_hits` muestra en los resultados la
+página que coincide y un fragmento.
+
+Se indexa al subir (tarea "text:<sha256>" en la cola de webhooks) y con
+`flask search-index-content`, incremental: sólo los apuntes cuyo archivo
+cambió desde la última extracción (`notes.text_file_path`).
+"""
+import os
+import re
+import logging
+
+from sqlalchemy import select, insert, update, delete, or_
+from werkzeug.security import safe_join
+
+from apuntesya2 import blobstore, previews, procpool
+from apuntesya2.db import Session
+from apuntesya2.models import Note, NotePage
+
+log = logging.getLogger(__name__)
+
+BATCH_PAGES = 16        # páginas por tarea del pool
+MAX_PAGE_CHARS = 20000  # una página "de texto" real tiene ~3000
+INSERT_ROWS = 500
+TIMEOUT = 60.0          # por tanda
+
+_SPACE = re.compile(r"\s+")
+
+
+def _extract(src: str, first: int, count: int, max_chars: int) -> tuple[int, list[str]]:
+    """(páginas del PDF, texto de las páginas [first, first + count))."""
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(src)
+    try:
+        total = len(pdf)
+        texts = []
+        for i in range(first, min(first + count, total)):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            try:
+                raw = textpage.get_text_bounded()
+            finally:
+                textpage.close()
+                page.close()
+            texts.append(_SPACE.sub(" ", raw.replace("\x00", "")).strip()[:max_chars])
+        return total, texts
+    finally:
+        pdf.close()
+
+
+def iter_pages(src: str, workers: int, timeout: float = TIMEOUT):
+    """(número de página desde 1, texto) de todo el PDF, en orden."""
+    total, texts = procpool.run(_extract, src, 0, BATCH_PAGES, MAX_PAGE_CHARS,
+                                workers=workers, timeout=timeout)
+    yield from enumerate(texts, 1)
+    page = len(texts)
+    batches = ((src, first, BATCH_PAGES, MAX_PAGE_CHARS) for first in range(BATCH_PAGES, total, BATCH_PAGES))
+    for _, texts in procpool.imap(_extract, batches, workers=workers, timeout=timeout):
+        for body in texts:
+            page += 1
+            yield page, body
+
+
+def request_index(session, rel_path: str):
+    """Encola la extracción del PDF recién subido (no bloquea)."""
+    sha = previews.sha_of(rel_path)
+    if sha and previews.available():
+        from apuntesya2 import webhooks
+        webhooks.record(session, {"topic": "text", "id": sha}, None)
+
+
+def index_file(app, rel_path: str) -> int:
+    """Extrae el texto de un archivo para todos los apuntes que lo usan. Devuelve cuántas páginas leyó."""
+    src = safe_join(app.config["UPLOAD_FOLDER"], rel_path)
+    pages = 0
+    with Session() as s:
+        note_ids = s.execute(select(Note.id).where(Note.file_path == rel_path)).scalars().all()
+        if not note_ids:
+            return 0
+        s.execute(delete(NotePage).where(NotePage.note_id.in_(note_ids)))
+        s.commit()
+        if src and os.path.isfile(src) and previews.available():
+            rows, offset = [], 0
+            try:
+                for page, body in iter_pages(src, app.config["PROCESS_POOL_SIZE"]):
+                    pages = page
+                    if body:  # páginas escaneadas (sólo imagen) no tienen texto
+                        rows += [{"note_id": nid, "page": page, "char_offset": offset, "body": body}
+                                 for nid in note_ids]
+                    offset += len(body) + 1
+                    if len(rows) >= INSERT_ROWS:
+                        s.execute(insert(NotePage), rows)
+                        s.commit()
+                        rows = []
+            except Exception as e:
+                # Con contraseña, roto o demasiado lento: queda lo que se llegó a leer
+                log.warning("texto de %s: no se pudo extraer: %r", rel_path, e)
+            if rows:
+                s.execute(insert(NotePage), rows)
+        s.execute(update(Note).where(Note.id.in_(note_ids)).values(text_file_path=rel_path)
+                  .execution_options(synchronize_session=False))
+        s.commit()
+    return pages
+
+
+def index_blob(app, sha256: str) -> int:
+    return index_file(app, blobstore.blob_path(sha256))
+
+
+def pending_files(full: bool = False) -> list[str]:
+    """Archivos de apuntes activos sin texto extraído (o todos, con `full`)."""
+    stmt = select(Note.file_path).where(Note.is_active == True).distinct()
+    if not full:
+        stmt = stmt.where(or_(Note.text_file_path.is_(None), Note.text_file_path != Note.file_path))
+    with Session() as s:
+        return s.execute(stmt).scalars().all()
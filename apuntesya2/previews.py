@@ -0,0 +1,219 @@
+"""
+Vista previa de los apuntes: primera página y miniatura en WebP.
+
+- Nunca se renderiza en un request. Al subir un apunte (o cuando una página
+  pide una preview que no está) se encola "preview:<sha256>" en la cola de
+  webhooks (`webhooks.TASKS`); el worker renderiza con pdfium (paquete
+  opcional `pypdfium2`) en el pool de procesos (procpool.py) y guarda en
+  `notes` la cantidad de páginas y el tamaño del PDF.
+- Mientras no está, `url` devuelve None y el template muestra un placeholder.
+- Caché en disco: PREVIEW_DIR/ab/<sha256>-<variante>.webp. La clave es el
+  hash del PDF (el nombre del blob), así que apuntes con el mismo archivo
+  comparten preview y una URL nunca cambia de contenido: se sirve con
+  `Cache-Control: immutable` por un año.
+- Tamaño acotado (PREVIEW_CACHE_MB): después de cada render se borran las
+  menos usadas (mtime, que se actualiza al servirlas, como mucho una vez por
+  hora) hasta quedar en el 90%. Lo borrado se regenera cuando se vuelve a pedir.
+
+Los PDF anteriores al blob store no tienen hash: no tienen preview hasta
+`flask blobs-migrate`. Un PDF que no se pudo renderizar deja <sha256>.failed
+y no se vuelve a intentar salvo con `flask previews-build --retry`.
+"""
+import os
+import re
+import time
+import logging
+
+from flask import current_app, url_for
+from sqlalchemy import update
+
+from apuntesya2 import blobstore, cache, procpool
+from apuntesya2.db import Session
+from apuntesya2.models import Note
+
+log = logging.getLogger(__name__)
+
+# Caja máxima (ancho, alto) en px; la página se renderiza una vez al tamaño mayor
+VARIANTS = {"thumb": (240, 340), "page": (900, 1270)}
+QUALITY = 80
+MAX_AGE = 365 * 24 * 3600
+EVICT_TO = 0.9
+
+_SHA = re.compile(r"^[0-9a-f]{64}$")
+_touched = cache.LRUCache(maxsize=8192, ttl=3600.0)
+_requested = cache.LRUCache(maxsize=4096, ttl=60.0)   # render ya encolado hace poco
+
+
+def available() -> bool:
+    try:
+        import pypdfium2  # noqa: F401  (opcional)
+    except ImportError:
+        return False
+    return True
+
+
+def sha_of(rel_path: str) -> str | None:
+    """Hash del PDF si `rel_path` es un blob; None para archivos anteriores al blob store."""
+    if not rel_path or not blobstore.is_blob(rel_path):
+        return None
+    return os.path.splitext(os.path.basename(rel_path))[0]
+
+
+def _base(root: str, sha256: str) -> str:
+    return os.path.join(root, sha256[:2], sha256)
+
+
+def path_for(sha256: str, variant: str) -> str | None:
+    if variant not in VARIANTS or not _SHA.match(sha256 or ""):
+        return None
+    return f"{_base(current_app.config['PREVIEW_DIR'], sha256)}-{variant}.webp"
+
+
+# -----------------------------------------------------------------------------
+# Request: URL o placeholder
+# -----------------------------------------------------------------------------
+def request_build(session, rel_path: str):
+    """Encola el render si hace falta (no bloquea). No hace nada sin pypdfium2."""
+    sha = sha_of(rel_path)
+    if not sha or _requested.get(sha) or not available():
+        return
+    base = _base(current_app.config["PREVIEW_DIR"], sha)
+    if os.path.exists(base + ".failed") or all(os.path.exists(f"{base}-{v}.webp") for v in VARIANTS):
+        return
+    _requested.set(sha, True)
+    from apuntesya2 import webhooks
+    webhooks.record(session, {"topic": "preview", "id": sha}, None)
+
+
+def url(note, variant: str = "page") -> str | None:
+    """URL de la preview de `note`, o None si todavía no está (y la pide)."""
+    sha = sha_of(note.file_path)
+    path = path_for(sha, variant) if sha else None
+    if path is None:
+        return None
+    if os.path.exists(path):
+        return url_for("main.note_preview", sha256=sha, variant=variant)
+    if not _requested.get(sha):
+        with Session() as s:
+            request_build(s, note.file_path)
+    return None
+
+
+def touch(path: str):
+    """Marca la preview como usada para la expulsión LRU (un utime por hora y archivo)."""
+    if _touched.get(path):
+        return
+    _touched.set(path, True)
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+# -----------------------------------------------------------------------------
+# Render (en el pool de procesos)
+# -----------------------------------------------------------------------------
+def _render(src: str, base: str, variants: dict, quality: int) -> int:
+    """Escribe <base>-<variante>.webp de la primera página. Devuelve la cantidad de páginas."""
+    import pypdfium2 as pdfium
+    from PIL import Image
+
+    pdf = pdfium.PdfDocument(src)
+    try:
+        pages = len(pdf)
+        page = pdf[0]
+        width, height = page.get_size()
+        box_w = max(w for w, _ in variants.values())
+        box_h = max(h for _, h in variants.values())
+        # Escala por la caja, no sólo por el ancho: una página muy larga no explota en memoria
+        scale = min(box_w / max(width, 1), box_h / max(height, 1))
+        image = page.render(scale=scale).to_pil()
+        page.close()
+    finally:
+        pdf.close()
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    for name, box in variants.items():
+        out = image.copy()
+        out.thumbnail(box, Image.LANCZOS)
+        final = f"{base}-{name}.webp"
+        tmp = f"{final}.{os.getpid()}.tmp"
+        out.save(tmp, "WEBP", quality=quality, method=4)
+        os.replace(tmp, final)
+    return pages
+
+
+def generate(app, sha256: str) -> bool:
+    """Renderiza la preview de un blob y completa `notes.page_count` / `file_size`."""
+    cfg = app.config
+    rel_path = blobstore.blob_path(sha256)
+    src = os.path.join(cfg["UPLOAD_FOLDER"], rel_path)
+    if not _SHA.match(sha256) or not os.path.isfile(src) or not available():
+        return False
+    base = _base(cfg["PREVIEW_DIR"], sha256)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    t0 = time.perf_counter()
+    try:
+        pages = procpool.run(_render, src, base, VARIANTS, QUALITY,
+                             workers=cfg["PROCESS_POOL_SIZE"], timeout=cfg["PREVIEW_TIMEOUT"])
+    except Exception as e:
+        # PDF roto, con contraseña o que cuelga al parser: no se reintenta solo
+        log.warning("preview %s: no se pudo renderizar: %r", sha256, e)
+        with open(base + ".failed", "w") as fh:
+            fh.write(repr(e)[:500])
+        return False
+    with Session() as s:
+        s.execute(
+            update(Note).where(Note.file_path == rel_path)
+            .values(page_count=pages, file_size=os.path.getsize(src))
+            .execution_options(synchronize_session=False)
+        )
+        s.commit()
+    log.info("preview %s: %s páginas, %.0f ms", sha256, pages, (time.perf_counter() - t0) * 1000)
+    evict(cfg["PREVIEW_DIR"], cfg["PREVIEW_CACHE_MB"] * 1024 * 1024)
+    return True
+
+
+def remove(root: str, rel_path: str):
+    """Borra las previews de un blob que ya no existe (admin.hard_delete_note)."""
+    sha = sha_of(rel_path)
+    if not sha:
+        return
+    base = _base(root, sha)
+    for name in [f"{base}-{v}.webp" for v in VARIANTS] + [base + ".failed"]:
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+
+def evict(root: str, max_bytes: int) -> int:
+    """Si la caché pasa `max_bytes`, borra las previews menos usadas. Devuelve cuántas borró."""
+    if not max_bytes or not os.path.isdir(root):
+        return 0
+    files, total = [], 0
+    for sub in os.scandir(root):
+        if not sub.is_dir():
+            continue
+        for entry in os.scandir(sub.path):
+            if entry.name.endswith(".webp"):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_bytes * EVICT_TO:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    log.info("previews: %s archivos expulsados de la caché", removed)
+    return removed
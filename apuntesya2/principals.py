@@ -0,0 +1,74 @@
+"""
+Usuario logueado liviano para Flask-Login (`current_user`).
+
+`load_user` no lee la fila completa de `users` en cada request: devuelve un
+`Principal` con los campos que usan las vistas y templates (sin hash de
+contraseña ni tokens de Mercado Pago), cacheado en `cache.principals` con
+TTL corto y versión por usuario. Se invalida al cambiar la contraseña o la
+foto, al desactivar la cuenta y al vincular/desvincular Mercado Pago.
+
+Si una vista lee un campo de `User` que el Principal no tiene, se carga la
+fila completa una vez (`Principal.user()`).
+"""
+import json
+
+from apuntesya2 import cache
+from apuntesya2.db import Session
+from apuntesya2.models import User
+
+FIELDS = ("id", "name", "email", "university", "faculty", "career",
+          "imagen_de_perfil", "is_active", "is_admin")
+_USER_COLUMNS = frozenset(User.__table__.columns.keys())
+
+
+class Principal:
+    __slots__ = FIELDS + ("mp_linked", "_user")
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, data: dict):
+        for name in FIELDS:
+            setattr(self, name, data.get(name))
+        self.mp_linked = bool(data.get("mp_linked"))
+        self._user = None
+
+    @classmethod
+    def from_user(cls, u: User) -> "Principal":
+        data = {name: getattr(u, name) for name in FIELDS}
+        data["mp_linked"] = u.mp_linked
+        return cls(data)
+
+    def get_id(self) -> str:
+        return str(self.id)
+
+    def user(self) -> User | None:
+        """Fila completa de `users` (una consulta, sólo si se pide)."""
+        if self._user is None:
+            with Session() as s:
+                self._user = s.get(User, self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        # Sólo llega acá lo que no está en __slots__ (p.ej. mp_access_token)
+        if name in _USER_COLUMNS:
+            return getattr(self.user(), name)
+        raise AttributeError(name)
+
+
+def _dump(u: User) -> bytes:
+    p = Principal.from_user(u)
+    return json.dumps({name: getattr(p, name) for name in FIELDS + ("mp_linked",)}).encode()
+
+
+def load(user_id: int) -> Principal | None:
+    def loader():
+        with Session() as s:
+            u = s.get(User, user_id)
+            return _dump(u) if u else b"null"
+    data = json.loads(cache.principals.get_or_load(user_id, loader, scope=user_id).body)
+    return Principal(data) if data else None
+
+
+def invalidate(user_id: int):
+    cache.principals.invalidate(user_id)
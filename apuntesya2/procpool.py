@@ -0,0 +1,83 @@
+"""
+Pool de procesos para trabajo de CPU: render de previews de PDFs (previews.py),
+fotos de perfil (avatars.py) y extracción de texto (pdf_text.py).
+PROCESS_POOL_SIZE procesos por worker.
+
+Renderizar en el proceso de gunicorn retiene el GIL y deja sin CPU a los
+requests y a los workers de webhooks; acá cada tarea corre en un proceso
+aparte. El pool se crea al primer uso, uno por proceso (gunicorn precarga la
+app y forkea: el pool no se hereda) y con contexto "forkserver": los workers
+tienen threads y forkear un proceso con threads puede dejar locks tomados en
+el hijo.
+
+Si una tarea no termina en `timeout` (un archivo armado para colgar al parser) o
+un proceso muere, se matan los procesos del pool y el próximo uso crea otro.
+"""
+import os
+import threading
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+_lock = threading.Lock()
+_pool = None
+_pid = None
+_size = None
+
+
+def _get(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pid, _size
+    workers = max(1, workers)
+    with _lock:
+        if _pool is not None and _pid == os.getpid() and _size != workers:
+            _pool.shutdown(wait=False)  # otro tamaño (benchmarks): las tareas en curso terminan igual
+            _pool = None
+        if _pool is None or _pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
+            _pid, _size = os.getpid(), workers
+        return _pool
+
+
+def _discard(pool: ProcessPoolExecutor):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    # La API pública no mata un proceso colgado: shutdown() lo esperaría para siempre
+    for proc in list((pool._processes or {}).values()):
+        proc.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run(fn, *args, workers: int = 2, timeout: float = 60.0):
+    """Corre `fn(*args)` (función de módulo, argumentos pickleables) y devuelve su resultado."""
+    pool = _get(workers)
+    future = pool.submit(fn, *args)
+    try:
+        return future.result(timeout=timeout)
+    except (TimeoutError, BrokenProcessPool):
+        _discard(pool)
+        raise
+
+
+def imap(fn, args_iter, workers: int = 2, timeout: float = 60.0):
+    """
+    Como `run` para muchas tareas (`args_iter`: tuplas de argumentos): resultados
+    en orden, con a lo sumo 2 * workers tareas en vuelo (memoria acotada).
+    """
+    pool = _get(workers)
+    pending = collections.deque()
+    try:
+        for args in args_iter:
+            pending.append(pool.submit(fn, *args))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result(timeout=timeout)
+        while pending:
+            yield pending.popleft().result(timeout=timeout)
+    except (TimeoutError, BrokenProcessPool):
+        _discard(pool)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,146 @@
+"""
+Consultas de las rutas (app.py y admin/routes.py).
+
+La vista ejecuta lo que arma cada función, y `flask db-audit` (db_audit.py) llama
+a las mismas funciones con valores de ejemplo y corre EXPLAIN sobre el
+resultado: si la consulta de una ruta cambia, el audit la sigue. Los
+listados devuelven (statement, claves) para `pagination.paginate` /
+`pagination.page_query`. Las consultas de los módulos (entitlements,
+uploads, webhooks, ...) tienen su función en el módulo.
+"""
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload
+
+from apuntesya2 import search_index
+from apuntesya2.models import User, Note, Purchase, AdminAction, University, Faculty, Career
+
+DATE_KEYS = (Note.created_at, Note.id)
+
+
+# -----------------------------------------------------------------------------
+# Listados
+# -----------------------------------------------------------------------------
+def catalog():
+    return select(Note).where(Note.is_active == True), DATE_KEYS
+
+
+def search(bind, q="", university="", faculty="", career="", type_=""):
+    """(statement, claves, descendente): con texto por relevancia (rank, id), sin texto por fecha."""
+    stmt = select(Note).where(Note.is_active == True)
+    stmt, rank = search_index.apply_search(
+        stmt, bind, Note, q=q, university=university, faculty=faculty, career=career
+    )
+    if type_ == "free":
+        stmt = stmt.where(Note.price_cents == 0)
+    elif type_ == "paid":
+        stmt = stmt.where(Note.price_cents > 0)
+    if rank is None:
+        return stmt, DATE_KEYS, True
+    return stmt, (rank, Note.id), False
+
+
+def seller_notes(user_id: int):
+    return select(Note).where(Note.seller_id == user_id), DATE_KEYS
+
+
+def buyer_purchases(user_id: int):
+    return (select(Purchase, Note)
+            .join(Note, Note.id == Purchase.note_id)
+            .where(Purchase.buyer_id == user_id, Purchase.status == "approved"),
+            (Purchase.created_at, Purchase.id))
+
+
+def balance_notes(note_ids):
+    """(id, título[, views]) de los apuntes del balance."""
+    cols = [Note.id, Note.title] + ([Note.views] if hasattr(Note, "views") else [])
+    return select(*cols).where(Note.id.in_(list(note_ids)))
+
+
+# -----------------------------------------------------------------------------
+# Usuarios y compras
+# -----------------------------------------------------------------------------
+def user_by_email(email: str):
+    return select(User).where(User.email == email)
+
+
+def last_purchase_of_note(user_id: int, note_id: int):
+    return (select(Purchase.id).where(Purchase.buyer_id == user_id, Purchase.note_id == note_id)
+            .order_by(Purchase.created_at.desc()).limit(1))
+
+
+def reusable_purchase(user_id: int, note_id: int, amount_cents: int, since):
+    """Compra pendiente reciente del mismo apunte al mismo precio, con preferencia de MP."""
+    return (select(Purchase).where(
+        Purchase.buyer_id == user_id,
+        Purchase.note_id == note_id,
+        Purchase.status == "pending",
+        Purchase.amount_cents == amount_cents,
+        Purchase.init_point.is_not(None),
+        Purchase.created_at >= since,
+    ).order_by(Purchase.created_at.desc()).limit(1))
+
+
+# -----------------------------------------------------------------------------
+# Taxonomía (/api/academics/...)
+# -----------------------------------------------------------------------------
+def universities():
+    return select(University).order_by(University.name)
+
+
+def faculties(university_id=None):
+    q = select(Faculty)
+    if university_id:
+        q = q.where(Faculty.university_id == university_id)
+    return q.order_by(Faculty.name)
+
+
+def careers(faculty_id=None):
+    q = select(Career)
+    if faculty_id:
+        q = q.where(Career.faculty_id == faculty_id)
+    return q.order_by(Career.name)
+
+
+def university_by_name(name: str):
+    return select(University).where(func.lower(University.name) == name.lower())
+
+
+def faculty_by_name(name: str, university_id):
+    return select(Faculty).where(func.lower(Faculty.name) == name.lower(), Faculty.university_id == university_id)
+
+
+def career_by_name(name: str, faculty_id):
+    return select(Career).where(func.lower(Career.name) == name.lower(), Career.faculty_id == faculty_id)
+
+
+# -----------------------------------------------------------------------------
+# Admin
+# -----------------------------------------------------------------------------
+def admin_counts():
+    return select(func.count()).select_from(User), select(func.count()).select_from(Note)
+
+
+def admin_users():
+    return select(User)
+
+
+def admin_actions(limit: int = 200):
+    return select(AdminAction).order_by(AdminAction.created_at.desc()).limit(limit)
+
+
+def admin_users_files(email: str = "", reported: str = ""):
+    q = select(Note).join(User, Note.seller_id == User.id)
+    if email:
+        q = q.where(User.email.ilike(f"%{email}%"))
+    if reported == "1":
+        q = q.where(getattr(Note, "is_reported", False) == True)  # works even if column missing
+    return q.order_by(Note.id.desc()).limit(500)
+
+
+def admin_files():
+    # joinedload: carga seller en la misma query
+    return select(Note).options(joinedload(Note.seller)), DATE_KEYS
+
+
+def note_purchases(note_id: int):
+    return select(Purchase).where(Purchase.note_id == note_id)
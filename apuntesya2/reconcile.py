@@ -0,0 +1,140 @@
+"""
+Conciliación periódica de compras pendientes con Mercado Pago.
+
+`buy_note` deja una compra "pending" por cada checkout; si el webhook nunca
+llega (o el comprador abandona) queda pendiente para siempre. `run`:
+
+1. Busca en MP los pagos creados desde la compra pendiente más vieja de la
+   ventana (RECONCILE_WINDOW_HOURS): una búsqueda por rango de fechas, paginada,
+   cubre muchas `external_reference` por llamada. Cada página se aplica con
+   `webhooks.apply_payments` (un SELECT + un UPDATE en bloque), sólo sobre
+   compras todavía pendientes; en memoria hay una página a la vez.
+2. Colapsa duplicados: de las pendientes de un mismo (comprador, apunte) queda
+   la más nueva (la que reusa buy_note); las demás pasan a "expired".
+3. Vence las pendientes más viejas que PENDING_EXPIRE_HOURS.
+
+2 y 3 recorren los ids por tramos (keyset) y actualizan por tramo. Si después
+llega un webhook de una compra vencida, el worker la actualiza igual.
+
+Se programa sola desde el worker de webhooks (evento "reconcile:payments",
+ver `webhooks.schedule`) o a mano con `flask --app apuntesya2.app payments-reconcile`.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, func, exists
+from sqlalchemy.orm import aliased
+
+from apuntesya2 import payment_status, webhooks
+from apuntesya2.db import Session
+from apuntesya2.models import Purchase
+
+log = logging.getLogger(__name__)
+
+PAGE_SIZE = 100       # pagos por llamada a /v1/payments/search
+MAX_OFFSET = 10000    # MP no pagina más allá: se corre el inicio del rango
+CHUNK = 500           # ids por UPDATE al vencer / colapsar
+
+
+def _mp_date(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def iter_payment_pages(token: str, since: datetime, until: datetime, page_size: int = PAGE_SIZE):
+    """Páginas de pagos creados en [since, until], de a una (más viejos primero)."""
+    from apuntesya2 import mp
+    begin, offset = since, 0
+    while True:
+        res = mp.client().search_payments(
+            token, range="date_created", begin_date=_mp_date(begin), end_date=_mp_date(until),
+            sort="date_created", criteria="asc", limit=page_size, offset=offset,
+        ) or {}
+        results = res.get("results") or []
+        if results:
+            yield results
+        total = (res.get("paging") or {}).get("total", 0)
+        offset += len(results)
+        if len(results) < page_size or offset >= total:
+            return
+        if offset >= MAX_OFFSET:
+            # Reinicia el paginado desde el último pago visto (los del borde se
+            # repiten, pero aplicarlos dos veces no cambia nada)
+            last = datetime.fromisoformat(results[-1]["date_created"].replace("Z", "+00:00"))
+            last = last.replace(tzinfo=None) - (last.utcoffset() or timedelta(0))
+            if _mp_date(last) == _mp_date(begin):
+                log.warning("conciliación: más de %s pagos en el mismo segundo, se corta", MAX_OFFSET)
+                return
+            begin, offset = last, 0
+
+
+def oldest_pending_query(since: datetime):
+    return select(func.min(Purchase.created_at)).where(Purchase.status == "pending", Purchase.created_at >= since)
+
+
+def duplicate_pending():
+    """Compras pendientes con otra pendiente más nueva del mismo comprador y apunte."""
+    newer = aliased(Purchase)
+    has_newer = exists().where(
+        newer.buyer_id == Purchase.buyer_id, newer.note_id == Purchase.note_id,
+        newer.status == "pending", newer.id > Purchase.id,
+    )
+    return (Purchase.status == "pending") & has_newer
+
+
+def stale_pending(cutoff: datetime):
+    return (Purchase.status == "pending") & (Purchase.created_at < cutoff)
+
+
+def expire_batch_query(where, last_id: int, chunk: int):
+    return select(Purchase.id).where(where, Purchase.id > last_id).order_by(Purchase.id).limit(chunk)
+
+
+def _expire_where(session, where, chunk: int, dry_run: bool) -> int:
+    """Pasa a "expired" las compras que cumplen `where`, de a `chunk` ids."""
+    total, last_id = 0, 0
+    while True:
+        ids = session.execute(expire_batch_query(where, last_id, chunk)).scalars().all()
+        if not ids:
+            return total
+        last_id = ids[-1]
+        total += len(ids)
+        if dry_run:
+            continue
+        session.execute(
+            update(Purchase).where(Purchase.id.in_(ids), Purchase.status == "pending")
+            .values(status="expired").execution_options(synchronize_session=False)
+        )
+        session.commit()
+        for pid in ids:
+            payment_status.notify(pid)
+
+
+def run(app, window_hours: float | None = None, expire_hours: float | None = None,
+        page_size: int = PAGE_SIZE, dry_run: bool = False) -> dict:
+    cfg = app.config
+    window_hours = cfg["RECONCILE_WINDOW_HOURS"] if window_hours is None else window_hours
+    expire_hours = cfg["PENDING_EXPIRE_HOURS"] if expire_hours is None else expire_hours
+    now = datetime.utcnow()
+    stats = {"pages": 0, "payments": 0, "updated": 0, "duplicates": 0, "expired": 0}
+
+    with Session() as s:
+        oldest = s.execute(oldest_pending_query(now - timedelta(hours=window_hours))).scalar()
+
+    if oldest is not None:
+        token = cfg["MP_ACCESS_TOKEN_PLATFORM"]
+        # Margen a ambos lados: los relojes de MP y del server difieren
+        margin = timedelta(minutes=5)
+        for page in iter_payment_pages(token, oldest - margin, now + margin, page_size):
+            stats["pages"] += 1
+            stats["payments"] += len(page)
+            if not dry_run:
+                with Session() as s:
+                    stats["updated"] += webhooks.apply_payments(s, page, only_pending=True)
+
+    with Session() as s:
+        stats["duplicates"] = _expire_where(s, duplicate_pending(), CHUNK, dry_run)
+        stats["expired"] = _expire_where(s, stale_pending(now - timedelta(hours=expire_hours)), CHUNK, dry_run)
+
+    log.info("conciliación: %s", stats)
+    return stats
+
@@ -0,0 +1,145 @@
+"""
+Ventas aprobadas pre-agregadas por vendedor, apunte y día (seller_daily_sales).
+
+/profile/balance sumaba en cada carga todas las compras aprobadas del rango
+(join purchases -> notes), así que el costo crecía con el historial del
+vendedor. Ahora:
+
+- `apply_changes` suma o resta en la tabla cuando una compra pasa a
+  "approved" o deja de estarlo (webhooks.apply_payments, en la misma
+  transacción que el UPDATE de la compra).
+- `sales` suma los días completos del rango desde la tabla y sólo recorre
+  compras en las puntas que no son días completos.
+- `rebuild` la reconstruye desde purchases (migración 11 y
+  `flask --app apuntesya2.app sales-rollup-rebuild`).
+
+Los días son UTC, igual que `Purchase.created_at`.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import select, delete, insert, update, func, cast, Date
+
+from apuntesya2.models import Note, Purchase, SellerDailySales
+
+_KEY = ("seller_id", "day", "note_id")
+
+
+def _day_of_created(session):
+    # SQLite no tiene tipo fecha: date() devuelve 'YYYY-MM-DD', que es como guarda Date
+    if session.get_bind().dialect.name == "sqlite":
+        return func.date(Purchase.created_at)
+    return cast(Purchase.created_at, Date)
+
+
+def _upsert(session, rows: list[dict]):
+    table = SellerDailySales.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=list(_KEY), set_={
+            "sold_count": table.c.sold_count + stmt.excluded.sold_count,
+            "gross_cents": table.c.gross_cents + stmt.excluded.gross_cents,
+        })
+        session.execute(stmt, rows)
+        return
+    for r in rows:
+        res = session.execute(
+            update(table)
+            .where(*(table.c[k] == r[k] for k in _KEY))
+            .values(sold_count=table.c.sold_count + r["sold_count"],
+                    gross_cents=table.c.gross_cents + r["gross_cents"])
+        )
+        if res.rowcount == 0:
+            session.execute(insert(table).values(**r))
+
+
+def apply_changes(session, changes):
+    """
+    `changes`: (seller_id, note_id, created_at, amount_cents, signo) por compra
+    que entró (+1) o salió (-1) de "approved". No hace commit.
+    """
+    acc = defaultdict(lambda: [0, 0])
+    for seller_id, note_id, created_at, amount_cents, sign in changes:
+        cell = acc[(seller_id, created_at.date(), note_id)]
+        cell[0] += sign
+        cell[1] += sign * int(amount_cents or 0)
+    rows = [{"seller_id": k[0], "day": k[1], "note_id": k[2], "sold_count": n, "gross_cents": g}
+            for k, (n, g) in acc.items() if n or g]
+    if rows:
+        _upsert(session, rows)
+
+
+def raw_query(seller_id: int, start: datetime, end: datetime):
+    """Ventas por apunte desde purchases (las puntas que no son días completos)."""
+    return (select(Purchase.note_id, func.count(Purchase.id), func.coalesce(func.sum(Purchase.amount_cents), 0))
+            .join(Note, Note.id == Purchase.note_id)
+            .where(Note.seller_id == seller_id, Purchase.status == "approved",
+                   Purchase.created_at >= start, Purchase.created_at < end)
+            .group_by(Purchase.note_id))
+
+
+def daily_query(seller_id: int, first_day, last_day):
+    """Ventas por apunte de los días [first_day, last_day) desde seller_daily_sales."""
+    return (select(SellerDailySales.note_id, func.sum(SellerDailySales.sold_count),
+                   func.sum(SellerDailySales.gross_cents))
+            .where(SellerDailySales.seller_id == seller_id,
+                   SellerDailySales.day >= first_day, SellerDailySales.day < last_day)
+            .group_by(SellerDailySales.note_id))
+
+
+def _raw(session, seller_id, start, end, into):
+    rows = session.execute(raw_query(seller_id, start, end)).all()
+    for note_id, n, g in rows:
+        into[note_id][0] += int(n)
+        into[note_id][1] += int(g)
+
+
+def sales(session, seller_id: int, start: datetime, end: datetime) -> dict:
+    """{note_id: [ventas, bruto en centavos]} de las compras aprobadas en [start, end)."""
+    per_note = defaultdict(lambda: [0, 0])
+    first_day = start.date() if start.time() == time(0) else start.date() + timedelta(days=1)
+    last_day = end.date()  # exclusivo: desde acá el día está incompleto
+    if first_day >= last_day:
+        _raw(session, seller_id, start, end, per_note)
+        return dict(per_note)
+    rows = session.execute(daily_query(seller_id, first_day, last_day)).all()
+    for note_id, n, g in rows:
+        per_note[note_id][0] += int(n or 0)
+        per_note[note_id][1] += int(g or 0)
+    # Puntas que no son días completos
+    if start < datetime.combine(first_day, time(0)):
+        _raw(session, seller_id, start, datetime.combine(first_day, time(0)), per_note)
+    if datetime.combine(last_day, time(0)) < end:
+        _raw(session, seller_id, datetime.combine(last_day, time(0)), end, per_note)
+    return {k: v for k, v in per_note.items() if v[0] or v[1]}
+
+
+def rebuild(session, seller_id: int | None = None) -> int:
+    """Recalcula la tabla (o las filas de un vendedor) desde purchases. Devuelve cuántas filas quedaron."""
+    day = _day_of_created(session)
+    where = [Purchase.status == "approved"]
+    clear = delete(SellerDailySales)
+    if seller_id is not None:
+        where.append(Note.seller_id == seller_id)
+        clear = clear.where(SellerDailySales.seller_id == seller_id)
+    session.execute(clear)
+    session.execute(
+        insert(SellerDailySales).from_select(
+            ["seller_id", "day", "note_id", "sold_count", "gross_cents"],
+            select(Note.seller_id, day, Purchase.note_id, func.count(Purchase.id),
+                   func.coalesce(func.sum(Purchase.amount_cents), 0))
+            .join(Note, Note.id == Purchase.note_id)
+            .where(*where)
+            .group_by(Note.seller_id, day, Purchase.note_id)
+        )
+    )
+    session.commit()
+    count = select(func.count()).select_from(SellerDailySales)
+    if seller_id is not None:
+        count = count.where(SellerDailySales.seller_id == seller_id)
+    return session.execute(count).scalar()
@@ -0,0 +1,115 @@
+"""
+Benchmark de /profile/balance: agregado sobre purchases vs seller_daily_sales.
+
+Genera un vendedor con N ventas (más ventas de otros vendedores como ruido)
+en una base SQLite temporal y mide, para distintos rangos, la consulta
+anterior (totales + detalle por apunte con join purchases -> notes) contra
+`sales_rollup.sales` (días completos desde la tabla, puntas desde purchases).
+
+Uso:
+    python -m apuntesya2.scripts.bench_balance --sales 10000,100000,500000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, text, func, and_
+from sqlalchemy.orm import Session
+
+from apuntesya2.models import Base, User, Note, Purchase
+from apuntesya2 import sales_rollup
+
+NOTES = 40
+DAYS = 730
+
+
+def populate(engine, n, batch=20000):
+    rnd = random.Random(42)
+    now = datetime.utcnow()
+    with Session(engine) as s:
+        for uid in (1, 2):
+            s.add(User(id=uid, name="bench", email=f"bench{uid}@example.com", password_hash="x",
+                       university="U", faculty="F", career="C"))
+        for nid in range(1, 2 * NOTES + 1):
+            s.add(Note(id=nid, title=f"Apunte {nid}", description="", university="U", faculty="F",
+                       career="C", price_cents=rnd.choice([50000, 120000]), file_path=f"{nid}.pdf",
+                       seller_id=1 if nid <= NOTES else 2))
+        s.commit()
+    sql = text("INSERT INTO purchases (buyer_id, note_id, status, amount_cents, created_at) "
+               "VALUES (2, :note_id, :status, :amount_cents, :created_at)")
+    # La mitad de las compras son del vendedor medido, el resto de otro
+    total = 2 * n
+    done = 0
+    while done < total:
+        rows = [{
+            "note_id": rnd.randint(1, 2 * NOTES),
+            "status": rnd.choice(("approved", "approved", "approved", "pending", "rejected")),
+            "amount_cents": rnd.choice([50000, 120000]),
+            "created_at": now - timedelta(seconds=rnd.randint(0, DAYS * 86400)),
+        } for _ in range(min(batch, total - done))]
+        with engine.begin() as conn:
+            conn.execute(sql, rows)
+        done += len(rows)
+
+
+def legacy(s, seller_id, start, end):
+    base_filter = and_(Note.seller_id == seller_id, Purchase.status == "approved",
+                       Purchase.created_at >= start, Purchase.created_at < end)
+    s.execute(select(func.count(Purchase.id), func.coalesce(func.sum(Purchase.amount_cents), 0))
+              .join(Note, Note.id == Purchase.note_id).where(base_filter)).one()
+    s.execute(select(Note.id, Note.title, func.count(Purchase.id), func.coalesce(func.sum(Purchase.amount_cents), 0))
+              .join(Purchase, Purchase.note_id == Note.id, isouter=True)
+              .where(base_filter).group_by(Note.id, Note.title)).all()
+
+
+def rollup(s, seller_id, start, end):
+    sales = sales_rollup.sales(s, seller_id, start, end)
+    if sales:
+        s.execute(select(Note.id, Note.title).where(Note.id.in_(list(sales)))).all()
+
+
+def timed(engine, fn, start, end, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        with Session(engine) as s:
+            fn(s, 1, start, end)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sales", default="10000,100000,500000", help="ventas del vendedor medido")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    ranges = [
+        ("mes actual", today.replace(day=1), today + timedelta(days=1)),
+        ("últimos 365 días", today - timedelta(days=365), today + timedelta(days=1)),
+        ("todo", today - timedelta(days=DAYS + 1), today + timedelta(days=1)),
+    ]
+    print(f"{'ventas':>8} | {'rango':<18} | {'antes ms':>9} | {'rollup ms':>9}")
+    for n in [int(x) for x in args.sales.split(",") if x.strip()]:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", future=True)
+            Base.metadata.create_all(engine)
+            populate(engine, n)
+            t0 = time.perf_counter()
+            with Session(engine) as s:
+                rows = sales_rollup.rebuild(s)
+            print(f"{n:>8} | backfill: {rows} filas en {time.perf_counter() - t0:.2f} s")
+            for label, start, end in ranges:
+                slow = timed(engine, legacy, start, end, args.repeat)
+                fast = timed(engine, rollup, start, end, args.repeat)
+                print(f"{n:>8} | {label:<18} | {slow:>9.2f} | {fast:>9.2f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark de concurrencia del engine: el anterior (sólo `pool_pre_ping`) contra
+`db_profiles` (PRAGMAs en SQLite; pool, recycle y timeouts en Postgres).
+
+Simula gunicorn: N procesos con M threads cada uno, cada thread con su propia
+conexión del pool, haciendo lecturas (SELECT por rango) y escrituras
+(UPDATE + INSERT en una transacción) durante unos segundos. Informa
+operaciones por segundo, latencias y errores ("database is locked", timeouts del pool).
+
+Con SQLite usa un archivo temporal nuevo para cada perfil (WAL queda grabado
+en el archivo). Con `--url postgresql://...` crea y borra las tablas
+bench_db_rows / bench_db_log en esa base.
+
+Uso:
+    python -m apuntesya2.scripts.bench_db --processes 4 --threads 4 --seconds 5
+    python -m apuntesya2.scripts.bench_db --url postgresql://localhost/apuntesya_bench
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+from apuntesya2 import db_profiles
+
+ROWS = 1000
+
+
+def make_engine(profile, url):
+    if profile == "perfil":
+        return db_profiles.create(url)
+    kwargs = {"pool_pre_ping": True, "future": True}
+    if url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    return create_engine(url, **kwargs)
+
+
+def setup(url):
+    engine = create_engine(url, future=True)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS bench_db_log"))
+        conn.execute(text("DROP TABLE IF EXISTS bench_db_rows"))
+        conn.execute(text("CREATE TABLE bench_db_rows (id INTEGER PRIMARY KEY, n INTEGER NOT NULL, "
+                          "payload VARCHAR(200) NOT NULL)"))
+        conn.execute(text("CREATE TABLE bench_db_log (row_id INTEGER NOT NULL, at VARCHAR(32) NOT NULL)"))
+        conn.execute(text("INSERT INTO bench_db_rows (id, n, payload) VALUES (:id, 0, :p)"),
+                     [{"id": i, "p": "x" * 100} for i in range(1, ROWS + 1)])
+    engine.dispose()
+
+
+def teardown(url):
+    engine = create_engine(url, future=True)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS bench_db_log"))
+        conn.execute(text("DROP TABLE IF EXISTS bench_db_rows"))
+    engine.dispose()
+
+
+def worker(profile, url, threads, seconds, write_ratio, seed, out):
+    engine = make_engine(profile, url)
+    deadline = time.monotonic() + seconds
+    lock = threading.Lock()
+    stats = {"reads": [], "writes": [], "errors": {}}
+
+    def loop(n):
+        rnd = random.Random(seed * 1000 + n)
+        reads, writes, errors = [], [], {}
+        while time.monotonic() < deadline:
+            rid = rnd.randint(1, ROWS)
+            write = rnd.random() < write_ratio
+            t0 = time.perf_counter()
+            try:
+                if write:
+                    with engine.begin() as conn:
+                        conn.execute(text("UPDATE bench_db_rows SET n = n + 1 WHERE id = :id"), {"id": rid})
+                        conn.execute(text("INSERT INTO bench_db_log (row_id, at) VALUES (:id, :at)"),
+                                     {"id": rid, "at": str(time.time())})
+                else:
+                    with engine.connect() as conn:
+                        conn.execute(text("SELECT id, n, payload FROM bench_db_rows WHERE id BETWEEN :a AND :b"),
+                                     {"a": rid, "b": rid + 20}).all()
+            except Exception as e:
+                key = type(e).__name__ + (": locked" if "locked" in str(e) else "")
+                errors[key] = errors.get(key, 0) + 1
+                continue
+            (writes if write else reads).append((time.perf_counter() - t0) * 1000)
+        with lock:
+            stats["reads"] += reads
+            stats["writes"] += writes
+            for k, v in errors.items():
+                stats["errors"][k] = stats["errors"].get(k, 0) + v
+
+    ts = [threading.Thread(target=loop, args=(n,)) for n in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    engine.dispose()
+    out.put(stats)
+
+
+def run(profile, url, args):
+    setup(url)
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(profile, url, args.threads, args.seconds, args.write_ratio, i, out))
+             for i in range(args.processes)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    reads = sum((r["reads"] for r in results), [])
+    writes = sum((r["writes"] for r in results), [])
+    errors = {}
+    for r in results:
+        for k, v in r["errors"].items():
+            errors[k] = errors.get(k, 0) + v
+    return reads, writes, errors
+
+
+def pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default=None, help="base a usar (por defecto un SQLite temporal)")
+    ap.add_argument("--processes", type=int, default=4, help="workers de gunicorn simulados")
+    ap.add_argument("--threads", type=int, default=4, help="threads por worker")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--write-ratio", type=float, default=0.2)
+    args = ap.parse_args()
+
+    print(f"{args.processes} procesos x {args.threads} threads, {args.seconds:.0f} s, "
+          f"{args.write_ratio:.0%} escrituras")
+    print(f"{'perfil':<7} | {'ops/s':>7} | {'lect/s':>7} | {'escr/s':>7} | {'lect p95':>8} | "
+          f"{'escr p50':>8} | {'escr p95':>8} | errores")
+    for profile in ("antes", "perfil"):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = args.url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            try:
+                reads, writes, errors = run(profile, url, args)
+            finally:
+                if args.url:
+                    teardown(url)
+        total = len(reads) + len(writes)
+        print(f"{profile:<7} | {total / args.seconds:>7.0f} | {len(reads) / args.seconds:>7.0f} | "
+              f"{len(writes) / args.seconds:>7.0f} | {pct(reads, 0.95):>8.1f} | "
+              f"{statistics.median(writes) if writes else 0:>8.1f} | {pct(writes, 0.95):>8.1f} | "
+              f"{', '.join(f'{k}={v}' for k, v in errors.items()) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
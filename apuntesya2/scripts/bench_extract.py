@@ -0,0 +1,73 @@
+"""
+Benchmark de extracción de texto de PDFs (pdf_text.py): páginas por segundo.
+
+Extrae el texto de los PDFs de apuntesya2/uploads/ (o de los que se pasen)
+con `pdf_text.iter_pages` a través del pool de procesos, para cada cantidad
+de procesos. El pool se crea antes de medir (el arranque del forkserver no
+cuenta). Los PDFs que pdfium no puede abrir (con contraseña, rotos) se saltean.
+
+Uso:
+    python -m apuntesya2.scripts.bench_extract --processes 1,2,4 --repeat 3
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+from apuntesya2 import pdf_text, procpool
+
+UPLOADS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+
+
+def _noop():
+    return None
+
+
+def readable(paths, workers):
+    ok = []
+    for path in paths:
+        try:
+            procpool.run(pdf_text._extract, path, 0, 1, 1, workers=workers)
+        except Exception as e:
+            print(f"salteado {os.path.basename(path)}: {e!r}")
+            continue
+        ok.append(path)
+    return ok
+
+
+def extract_all(paths, workers):
+    pages = chars = 0
+    for path in paths:
+        for _, body in pdf_text.iter_pages(path, workers):
+            pages += 1
+            chars += len(body)
+    return pages, chars
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("files", nargs="*", help=f"PDFs a extraer (por defecto {UPLOADS}/*.pdf)")
+    ap.add_argument("--processes", default="1,2,4", help="procesos del pool a probar")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    paths = args.files or sorted(glob.glob(os.path.join(UPLOADS, "*.pdf")))
+    paths = readable(paths, 1)
+    if not paths:
+        raise SystemExit("No hay PDFs legibles.")
+    print(f"{len(paths)} PDFs, {sum(os.path.getsize(p) for p in paths) / 1e6:.1f} MB")
+    print(f"{'procesos':>8} | {'páginas':>7} | {'caracteres':>10} | {'s':>6} | {'págs/s':>7}")
+    for workers in [int(x) for x in args.processes.split(",") if x.strip()]:
+        procpool.run(_noop, workers=workers)  # arranca el pool de este tamaño
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            pages, chars = extract_all(paths, workers)
+            timings.append(time.perf_counter() - t0)
+        elapsed = statistics.median(timings)
+        print(f"{workers:>8} | {pages:>7} | {chars:>10} | {elapsed:>6.2f} | {pages / elapsed:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
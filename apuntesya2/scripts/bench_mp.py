@@ -0,0 +1,85 @@
+"""
+Benchmark de creación de preferencias contra el server falso de MP (fake_mp).
+
+Compara el cliente anterior (un `requests.post` nuevo por llamada, sin
+reintentos) con `mp.MercadoPagoClient` (pool keep-alive, timeouts cortos,
+reintentos con jitter). `--connect-delay` imita el costo de abrir una
+conexión TLS y `--fail-rate` una API que devuelve 503 a veces.
+
+Uso:
+    python -m apuntesya2.scripts.bench_mp --requests 300 --threads 8 --connect-delay 0.03 --fail-rate 0.05
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from apuntesya2 import mp
+from apuntesya2.scripts.fake_mp import FakeMP
+
+PAYLOAD = {"items": [{"title": "Apunte", "quantity": 1, "currency_id": "ARS", "unit_price": 1500.0}],
+           "marketplace_fee": 75.0}
+
+
+def legacy_call(base, i):
+    r = requests.post(f"{base}/checkout/preferences", json=dict(PAYLOAD, external_reference=f"purchase:{i}"),
+                      headers={"Authorization": "Bearer x"}, timeout=30)
+    if r.status_code >= 400:
+        raise RuntimeError(r.status_code)
+    return r.json()
+
+
+def pooled_call(client, i):
+    return client.create_preference("x", dict(PAYLOAD, external_reference=f"purchase:{i}"),
+                                    idempotency_key=f"purchase:{i}")
+
+
+def run(name, fake, call, n, threads):
+    before = dict(fake.stats)
+    lat, errors = [], 0
+
+    def one(i):
+        t0 = time.perf_counter()
+        try:
+            call(i)
+            return time.perf_counter() - t0, None
+        except Exception as e:
+            return time.perf_counter() - t0, e
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        for dt, err in ex.map(one, range(n)):
+            lat.append(dt)
+            errors += err is not None
+    wall = time.perf_counter() - t0
+    lat.sort()
+    conns = fake.stats["connections"] - before["connections"]
+    print(f"{name:8s} {n / wall:8.1f} req/s   p50 {statistics.median(lat) * 1000:6.1f} ms   "
+          f"p95 {lat[int(len(lat) * 0.95) - 1] * 1000:6.1f} ms   ok {100 * (n - errors) / n:5.1f}%   "
+          f"conexiones {conns}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--latency", type=float, default=0.02)
+    ap.add_argument("--connect-delay", type=float, default=0.03)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    args = ap.parse_args()
+
+    fake = FakeMP(args.latency, args.connect_delay, args.fail_rate, seed=1)
+    server = fake.serve()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    client = mp.MercadoPagoClient(base_url=base, pool_size=args.threads, backoff=0.05)
+    print(f"{args.requests} preferencias, {args.threads} threads, latencia {args.latency * 1000:.0f} ms, "
+          f"conexión {args.connect_delay * 1000:.0f} ms, fallas {args.fail_rate:.0%}")
+    run("antes", fake, lambda i: legacy_call(base, i), args.requests, args.threads)
+    run("cliente", fake, lambda i: pooled_call(client, i + args.requests), args.requests, args.threads)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
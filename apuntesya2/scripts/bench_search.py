@@ -0,0 +1,118 @@
+"""
+Benchmark de /search: ilike('%q%') vs índice full-text (search_index).
+
+Genera N apuntes sintéticos en una base SQLite temporal y mide la latencia
+de la consulta de búsqueda (top 100) con cada estrategia.
+
+Uso:
+    python -m apuntesya2.scripts.bench_search --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from apuntesya2.models import Base, User, Note
+from apuntesya2 import search_index
+
+WORDS = (
+    "metodología investigación análisis matemático álgebra física química biología "
+    "derecho constitucional civil penal economía política sociología psicología "
+    "historia argentina filosofía programación algoritmos estructuras datos redes "
+    "estadística probabilidad contabilidad administración marketing anatomía "
+    "fisiología farmacología parcial final resumen apunte práctico teórico guía"
+).split()
+UNIS = ["Universidad Nacional de Córdoba", "Universidad de Buenos Aires",
+        "Universidad Tecnológica Nacional", "Universidad Nacional de La Plata"]
+FACS = ["Ciencias Económicas", "Derecho", "Ingeniería", "Ciencias Médicas", "Psicología"]
+CARS = ["Contador Público", "Abogacía", "Ingeniería en Sistemas", "Medicina", "Licenciatura"]
+
+QUERIES = [
+    dict(q="metodologia"),
+    dict(q="analisis matematico"),
+    dict(q="resumen parcial", university="cordoba"),
+    dict(q="programacion", career="sistemas"),
+    dict(q="inexistente"),
+]
+
+
+def populate(engine, n, batch=20000):
+    rnd = random.Random(42)
+    now = datetime.utcnow()
+    with Session(engine) as s:
+        s.add(User(id=1, name="bench", email="bench@example.com", password_hash="x",
+                   university=UNIS[0], faculty=FACS[0], career=CARS[0]))
+        s.commit()
+    sql = text(
+        "INSERT INTO notes (title, description, university, faculty, career, price_cents, "
+        "file_path, is_active, is_reported, seller_id, created_at) "
+        "VALUES (:title, :description, :university, :faculty, :career, :price_cents, "
+        ":file_path, 1, 0, 1, :created_at)"
+    )
+    done = 0
+    while done < n:
+        rows = []
+        for i in range(done, min(n, done + batch)):
+            rows.append({
+                "title": " ".join(rnd.sample(WORDS, 4)).capitalize(),
+                "description": " ".join(rnd.choices(WORDS, k=25)),
+                "university": rnd.choice(UNIS),
+                "faculty": rnd.choice(FACS),
+                "career": rnd.choice(CARS),
+                "price_cents": rnd.choice([0, 0, 50000, 120000]),
+                "file_path": f"bench_{i}.pdf",
+                "created_at": now - timedelta(minutes=i),
+            })
+        with engine.begin() as conn:
+            conn.execute(sql, rows)
+        done += len(rows)
+
+
+def run_query(engine, use_fts, repeat, **filters):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        with Session(engine) as s:
+            stmt = select(Note).where(Note.is_active == True)
+            if use_fts:
+                stmt, rank = search_index.apply_search(stmt, engine, Note, **filters)
+            else:
+                stmt, rank = search_index._apply_ilike(stmt, Note, filters.get("q", ""),
+                                                       filters.get("university", ""),
+                                                       filters.get("faculty", ""),
+                                                       filters.get("career", "")), None
+            order = [Note.created_at.desc()] if rank is None else [rank, Note.created_at.desc()]
+            s.execute(stmt.order_by(*order).limit(100)).scalars().all()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="10000,100000,1000000")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"{'notes':>9} | {'query':<40} | {'ilike ms':>9} | {'fts ms':>8}")
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", future=True)
+            Base.metadata.create_all(engine)
+            search_index.ensure_schema(engine)
+            populate(engine, n)
+            for filters in QUERIES:
+                slow = run_query(engine, False, args.repeat, **filters)
+                fast = run_query(engine, True, args.repeat, **filters)
+                label = ", ".join(f"{k}={v}" for k, v in filters.items())
+                print(f"{n:>9} | {label:<40} | {slow:>9.2f} | {fast:>8.2f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark de arranque: tiempo de import / creación de la app y memoria por
+worker de gunicorn (con y sin preload_app).
+
+Uso (desde la raíz del repo):
+    python -m apuntesya2.scripts.bench_startup --workers 4
+
+Usa una base SQLite temporal; no toca la base de la app.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+_PROBE = r"""
+import json, resource, sys, time
+t0 = time.perf_counter()
+import apuntesya2.app as m
+t1 = time.perf_counter()
+app = m.app
+t2 = time.perf_counter()
+with app.test_client() as c:
+    c.get("/health")
+t3 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "create_app_ms": (t2 - t1) * 1000,
+    "first_request_ms": (t3 - t2) * 1000,
+    "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "requests_loaded": "requests" in sys.modules,
+}))
+"""
+
+_PROBE_ADMIN = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from apuntesya2.admin.routes import admin_bp
+print(json.dumps({"admin_import_ms": (time.perf_counter() - t0) * 1000,
+                  "mp_loaded": "apuntesya2.mp" in sys.modules}))
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as fh:
+            return [int(x) for x in fh.read().split()]
+    except OSError:
+        return []
+
+
+def _smaps(pid):
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                out[parts[0][:-1]] = int(parts[1])
+    return out
+
+
+def probe(env, code, runs):
+    results = []
+    for _ in range(runs):
+        raw = subprocess.check_output([sys.executable, "-c", code], env=env)
+        results.append(json.loads(raw.decode().strip().splitlines()[-1]))
+    return {k: (sorted(r[k] for r in results)[len(results) // 2]) for k in results[0]}
+
+
+def gunicorn_memory(env, workers, preload):
+    port = _free_port()
+    cmd = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+           "--log-level", "warning"]
+    if preload:
+        cmd.append("--preload")
+    cmd.append("apuntesya2.app:app")
+    proc = subprocess.Popen(cmd, env=env)
+    try:
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).read()
+                if len(_children(proc.pid)) >= workers:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.2)
+        for _ in range(workers * 20):  # que cada worker atienda algo
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=2).read()
+        time.sleep(0.5)
+        stats = [_smaps(pid) for pid in _children(proc.pid)]
+        n = max(1, len(stats))
+        return {
+            "workers": len(stats),
+            "rss_mb": sum(s.get("Rss", 0) for s in stats) / n / 1024,
+            "pss_mb": sum(s.get("Pss", 0) for s in stats) / n / 1024,
+            "private_mb": sum(s.get("Private_Clean", 0) + s.get("Private_Dirty", 0) for s in stats) / n / 1024,
+        }
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                   UPLOAD_DIR=os.path.join(tmp, "uploads"), PYTHONPATH=os.getcwd())
+        # Primera corrida: crea/migra la base para que no cuente en las mediciones
+        subprocess.check_call([sys.executable, "-c", "import apuntesya2.app as m; m.app"], env=env)
+
+        print("== import / create_app (mediana de %d procesos) ==" % args.runs)
+        for k, v in probe(env, _PROBE, args.runs).items():
+            print(f"  {k:<20} {v:.1f}" if isinstance(v, float) else f"  {k:<20} {v}")
+        for k, v in probe(env, _PROBE_ADMIN, args.runs).items():
+            print(f"  {k:<20} {v:.1f}" if isinstance(v, float) else f"  {k:<20} {v}")
+
+        print(f"== gunicorn -w {args.workers}: memoria promedio por worker ==")
+        for preload in (False, True):
+            r = gunicorn_memory(env, args.workers, preload)
+            label = "--preload" if preload else "sin preload"
+            print(f"  {label:<12} rss={r['rss_mb']:.1f}MB pss={r['pss_mb']:.1f}MB "
+                  f"private={r['private_mb']:.1f}MB (workers={r['workers']})")
+
+
+if __name__ == "__main__":
+    main()
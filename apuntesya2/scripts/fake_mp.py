@@ -0,0 +1,220 @@
+"""
+Servidor falso de la API de Mercado Pago, para desarrollo y benchmarks.
+
+Implementa lo que usa mp.py:
+
+    POST /oauth/token                 tokens falsos (authorization_code / refresh_token)
+    POST /checkout/preferences        crea una preferencia (respeta X-Idempotency-Key)
+    GET  /v1/payments/<id>            pago creado con /_fake/payments
+    GET  /v1/payments/search          ?external_reference=... / range=date_created&begin_date=...
+                                      &end_date=..., paginado con limit/offset
+
+y para simular pagos:
+
+    POST /_fake/payments              {"external_reference": "purchase:1", "status": "approved"}
+    PUT  /_fake/payments/<id>         {"status": "refunded"}
+
+Opciones para imitar la red: --latency (por request), --connect-delay (por
+conexión nueva, como un handshake TLS) y --fail-rate (fracción de 503).
+
+Uso:
+    python -m apuntesya2.scripts.fake_mp --port 8089 --latency 0.05
+    MP_API_BASE=http://127.0.0.1:8089 flask --app apuntesya2.app run
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+def _utc(value):
+    """Fecha ISO de un query de MP -> isoformat UTC naive (como `date_created` acá)."""
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+
+class FakeMP:
+    def __init__(self, latency=0.0, connect_delay=0.0, fail_rate=0.0, seed=None):
+        self.latency = latency
+        self.connect_delay = connect_delay
+        self.fail_rate = fail_rate
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1000)
+        self.preferences = {}   # id -> preferencia
+        self.idempotency = {}   # X-Idempotency-Key -> id de preferencia
+        self.payments = {}      # id -> pago
+        self.stats = {"connections": 0, "requests": 0, "failures": 0}
+
+    # --- handlers -----------------------------------------------------------
+    def oauth_token(self, form):
+        n = next(self.ids)
+        return 200, {"access_token": f"APP_USR-fake-{n}", "refresh_token": f"TG-fake-{n}",
+                     "user_id": 100000 + n, "expires_in": 15552000, "token_type": "bearer"}
+
+    def create_preference(self, body, headers):
+        key = headers.get("X-Idempotency-Key")
+        with self.lock:
+            if key and key in self.idempotency:
+                return 200, self.preferences[self.idempotency[key]]
+            pref_id = f"fake-pref-{next(self.ids)}"
+            pref = dict(body, id=pref_id,
+                        init_point=f"https://www.mercadopago.com.ar/checkout/v1/redirect?pref_id={pref_id}",
+                        sandbox_init_point=f"https://sandbox.mercadopago.com.ar/checkout/v1/redirect?pref_id={pref_id}",
+                        date_created=datetime.utcnow().isoformat())
+            self.preferences[pref_id] = pref
+            if key:
+                self.idempotency[key] = pref_id
+        return 201, pref
+
+    def create_payment(self, body):
+        with self.lock:
+            pay_id = next(self.ids)
+            pay = {"id": pay_id, "status": body.get("status", "approved"),
+                   "status_detail": body.get("status_detail", "accredited"),
+                   "external_reference": body.get("external_reference"),
+                   "transaction_amount": body.get("transaction_amount", 0),
+                   "date_created": datetime.utcnow().isoformat(),
+                   "date_last_updated": datetime.utcnow().isoformat()}
+            self.payments[pay_id] = pay
+        return 201, pay
+
+    def update_payment(self, pay_id, body):
+        with self.lock:
+            pay = self.payments.get(pay_id)
+            if not pay:
+                return 404, {"message": "payment not found", "status": 404}
+            pay.update(body, date_last_updated=datetime.utcnow().isoformat())
+        return 200, pay
+
+    def get_payment(self, pay_id):
+        pay = self.payments.get(pay_id)
+        if not pay:
+            return 404, {"message": "Payment not found", "status": 404}
+        return 200, pay
+
+    def search_payments(self, query):
+        q = {k: v[0] for k, v in query.items()}
+        ref = q.get("external_reference")
+        with self.lock:
+            results = [p for p in self.payments.values() if ref is None or p["external_reference"] == ref]
+        if q.get("range") == "date_created":
+            begin, end = _utc(q.get("begin_date")), _utc(q.get("end_date"))
+            results = [p for p in results if (not begin or p["date_created"] >= begin)
+                       and (not end or p["date_created"] <= end)]
+        results.sort(key=lambda p: p["date_created"], reverse=q.get("criteria", "desc") == "desc")
+        limit, offset = int(q.get("limit", 30)), int(q.get("offset", 0))
+        return 200, {"results": results[offset:offset + limit],
+                     "paging": {"total": len(results), "limit": limit, "offset": offset}}
+
+    # --- servidor -----------------------------------------------------------
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True  # sin demoras de ACK entre headers y cuerpo
+
+            def setup(self):
+                super().setup()
+                with fake.lock:
+                    fake.stats["connections"] += 1
+                if fake.connect_delay:
+                    time.sleep(fake.connect_delay)
+
+            def log_message(self, *args):
+                pass
+
+            def _body(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(n) if n else b""
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    return json.loads(raw or b"{}")
+                return {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self, method):
+                url = urlsplit(self.path)
+                body = self._body() if method in ("POST", "PUT") else None
+                with fake.lock:
+                    fake.stats["requests"] += 1
+                    fail = fake.fail_rate and fake.rnd.random() < fake.fail_rate
+                    if fail:
+                        fake.stats["failures"] += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fail:
+                    return self._send(503, {"message": "fake outage", "status": 503})
+                path = url.path.rstrip("/")
+                if method == "POST" and path == "/oauth/token":
+                    return self._send(*fake.oauth_token(body))
+                if method == "POST" and path == "/checkout/preferences":
+                    return self._send(*fake.create_preference(body, self.headers))
+                if method == "POST" and path == "/_fake/payments":
+                    return self._send(*fake.create_payment(body))
+                if method == "PUT" and path.startswith("/_fake/payments/"):
+                    return self._send(*fake.update_payment(int(path.rsplit("/", 1)[1]), body))
+                if method == "GET" and path == "/v1/payments/search":
+                    return self._send(*fake.search_payments(parse_qs(url.query)))
+                if method == "GET" and path.startswith("/v1/payments/"):
+                    try:
+                        return self._send(*fake.get_payment(int(path.rsplit("/", 1)[1])))
+                    except ValueError:
+                        pass
+                return self._send(404, {"message": "not found", "status": 404})
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+        return Handler
+
+    def serve(self, host="127.0.0.1", port=0) -> ThreadingHTTPServer:
+        """Arranca el server en un thread; devuelve el server (`.server_address`, `.shutdown()`)."""
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency", type=float, default=0.0, help="segundos por request")
+    ap.add_argument("--connect-delay", type=float, default=0.0, help="segundos por conexión nueva")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fracción de respuestas 503")
+    args = ap.parse_args()
+    fake = FakeMP(args.latency, args.connect_delay, args.fail_rate)
+    server = fake.serve(args.host, args.port)
+    print(f"Fake MP en http://{args.host}:{server.server_address[1]} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
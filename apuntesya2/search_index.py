@@ -0,0 +1,464 @@
+"""
+Índice full-text de apuntes (reemplaza los ilike('%q%') de /search).
+
+- SQLite: tabla virtual FTS5 `notes_fts` (rowid = notes.id) con tokenizer
+  unicode61 + remove_diacritics, mantenida por triggers sobre `notes`.
+- Postgres: columna `notes.search_vector` (tsvector) + índice GIN, mantenida
+  por trigger y usando una versión IMMUTABLE de unaccent().
+
+En ambos casos sólo se indexan apuntes activos y no borrados (soft-delete).
+Si el motor no soporta el índice, `apply_search` cae a los ilike de siempre.
+
+El texto de los PDF (una fila por página en `note_pages`, ver pdf_text.py)
+tiene su propio índice: FTS5 `note_pages_fts` (external content) en SQLite,
+`note_pages.search_vector` + GIN en Postgres. La búsqueda por texto une los
+apuntes que coinciden por título/descripción con los que coinciden en alguna
+página (rank = el mejor de los dos) y `page_hits` devuelve, para los apuntes
+de la página de resultados, la página que mejor coincide y un fragmento.
+"""
+import re
+import logging
+import contextlib
+
+from sqlalchemy import text, table, column, literal_column, select, union_all, func, or_, inspect
+from sqlalchemy.engine import Engine
+
+from apuntesya2 import db_profiles
+
+log = logging.getLogger(__name__)
+
+FTS_TABLE = "notes_fts"
+FTS_COLUMNS = ("title", "description", "university", "faculty", "career")
+# Peso de cada columna en el ranking (bm25 en SQLite, setweight en Postgres)
+BM25_WEIGHTS = (10.0, 4.0, 1.0, 1.0, 1.0)
+
+PAGES_FTS = "note_pages_fts"
+# Una coincidencia en el contenido vale menos que en el título/descripción
+CONTENT_WEIGHT = 0.5
+# Marcas de inicio/fin de la coincidencia en los fragmentos (el template las cambia por <mark>)
+MARK_START, MARK_END = "\x02", "\x03"
+SNIPPET_WORDS = 16
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_PAGES = table("note_pages", column("id"), column("note_id"), column("page"), column("body"),
+               column("search_vector"))
+
+# --- SQLite (FTS5) -----------------------------------------------------------
+_SQLITE_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description, university, faculty, career,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes
+    WHEN new.is_active AND new.deleted_at IS NULL BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description, university, faculty, career)
+        VALUES (new.id, new.title, new.description, new.university, new.faculty, new.career);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE ON notes BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, title, description, university, faculty, career)
+        SELECT new.id, new.title, new.description, new.university, new.faculty, new.career
+        WHERE new.is_active AND new.deleted_at IS NULL;
+    END
+    """,
+]
+
+_SQLITE_REBUILD = [
+    f"DELETE FROM {FTS_TABLE}",
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, title, description, university, faculty, career)
+    SELECT id, title, description, university, faculty, career FROM notes
+    WHERE is_active AND deleted_at IS NULL
+    """,
+]
+
+# note_pages no se actualiza: al re-indexar un PDF se borran sus filas y se insertan de nuevo
+_SQLITE_PAGES_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {PAGES_FTS} USING fts5(
+        body, content = 'note_pages', content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS note_pages_fts_ai AFTER INSERT ON note_pages BEGIN
+        INSERT INTO {PAGES_FTS}(rowid, body) VALUES (new.id, new.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS note_pages_fts_ad AFTER DELETE ON note_pages BEGIN
+        INSERT INTO {PAGES_FTS}({PAGES_FTS}, rowid, body) VALUES ('delete', old.id, old.body);
+    END
+    """,
+    # SQLite sin PRAGMA foreign_keys no aplica el ON DELETE CASCADE
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_pages_ad AFTER DELETE ON notes BEGIN
+        DELETE FROM note_pages WHERE note_id = old.id;
+    END
+    """,
+]
+
+_SQLITE_PAGES_REBUILD = [f"INSERT INTO {PAGES_FTS}({PAGES_FTS}) VALUES ('rebuild')"]
+
+# --- Postgres (tsvector + GIN) ------------------------------------------------
+TAXONOMY_COLUMNS = ("university", "faculty", "career")
+# Clave de comparación de la taxonomía (la expresión de los índices ix_notes_<col>_key)
+_PG_TAXONOMY_KEY = "lower(apy_unaccent({col}))"
+
+_PG_VECTOR_EXPR = """
+    CASE WHEN {row}.is_active AND {row}.deleted_at IS NULL THEN
+        setweight(to_tsvector('spanish', apy_unaccent(coalesce({row}.title, ''))), 'A') ||
+        setweight(to_tsvector('spanish', apy_unaccent(coalesce({row}.description, ''))), 'B') ||
+        setweight(to_tsvector('spanish', apy_unaccent(
+            coalesce({row}.university, '') || ' ' || coalesce({row}.faculty, '') || ' ' || coalesce({row}.career, '')
+        )), 'C')
+    END
+"""
+
+_PG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    # unaccent() es STABLE; el wrapper IMMUTABLE permite usarlo en índices/triggers
+    """
+    CREATE OR REPLACE FUNCTION apy_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE INDEX IF NOT EXISTS ix_notes_search_vector ON notes USING GIN (search_vector)",
+    # Filtros de taxonomía: igualdad sobre la clave sin acentos, en el orden del listado
+    *(f"CREATE INDEX IF NOT EXISTS ix_notes_{col}_key ON notes "
+      f"({_PG_TAXONOMY_KEY.format(col=col)}, created_at, id)" for col in TAXONOMY_COLUMNS),
+    f"""
+    CREATE OR REPLACE FUNCTION notes_search_vector_update() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := {_PG_VECTOR_EXPR.format(row="NEW")};
+        RETURN NEW;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS notes_search_vector_trg ON notes",
+    """
+    CREATE TRIGGER notes_search_vector_trg BEFORE INSERT OR UPDATE ON notes
+    FOR EACH ROW EXECUTE FUNCTION notes_search_vector_update()
+    """,
+]
+
+_PG_REBUILD = [
+    f"UPDATE notes SET search_vector = {_PG_VECTOR_EXPR.format(row='notes')}",
+]
+
+_PG_PAGES_VECTOR_EXPR = "to_tsvector('spanish', apy_unaccent(coalesce({row}.body, '')))"
+
+_PG_PAGES_DDL = [
+    "ALTER TABLE note_pages ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE INDEX IF NOT EXISTS ix_note_pages_search_vector ON note_pages USING GIN (search_vector)",
+    f"""
+    CREATE OR REPLACE FUNCTION note_pages_search_vector_update() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := {_PG_PAGES_VECTOR_EXPR.format(row="NEW")};
+        RETURN NEW;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS note_pages_search_vector_trg ON note_pages",
+    """
+    CREATE TRIGGER note_pages_search_vector_trg BEFORE INSERT OR UPDATE ON note_pages
+    FOR EACH ROW EXECUTE FUNCTION note_pages_search_vector_update()
+    """,
+]
+
+_PG_PAGES_REBUILD = [
+    f"UPDATE note_pages SET search_vector = {_PG_PAGES_VECTOR_EXPR.format(row='note_pages')}",
+]
+
+_available = {}
+
+
+def _dialect(bind) -> str:
+    return bind.dialect.name
+
+
+@contextlib.contextmanager
+def _begin(bind):
+    # Acepta un Engine (abre su transacción) o una Connection ya en transacción
+    # (p.ej. dentro de una migración: se usa un SAVEPOINT)
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            db_profiles.without_statement_timeout(conn)  # re-index de toda la tabla
+            yield conn
+    else:
+        with bind.begin_nested():
+            yield bind
+
+
+def ensure_schema(bind) -> bool:
+    """Crea el índice (idempotente). Devuelve True si hubo que crearlo."""
+    name = _dialect(bind)
+    if name == "sqlite":
+        created = not inspect(bind).has_table(FTS_TABLE)
+        ddl = _SQLITE_DDL
+    elif name == "postgresql":
+        cols = [c["name"] for c in inspect(bind).get_columns("notes")]
+        created = "search_vector" not in cols
+        ddl = _PG_DDL
+    else:
+        return False
+    url = bind.engine.url
+    try:
+        with _begin(bind) as conn:
+            for stmt in ddl:
+                conn.execute(text(stmt))
+    except Exception as e:
+        log.warning("No se pudo crear el índice de búsqueda (%s): %s", name, e)
+        _available[url] = False
+        return False
+    _available.pop(url, None)
+    return created
+
+
+def ensure_pages_schema(bind) -> bool:
+    """Índice del texto de los PDF (requiere note_pages y el de notes). True si hubo que crearlo."""
+    name = _dialect(bind)
+    insp = inspect(bind)
+    if name not in ("sqlite", "postgresql") or not insp.has_table("note_pages"):
+        return False
+    if name == "sqlite":
+        created = not insp.has_table(PAGES_FTS)
+        ddl = _SQLITE_PAGES_DDL
+    else:
+        created = "search_vector" not in [c["name"] for c in insp.get_columns("note_pages")]
+        ddl = _PG_PAGES_DDL
+    url = bind.engine.url
+    try:
+        with _begin(bind) as conn:
+            for stmt in ddl:
+                conn.execute(text(stmt))
+    except Exception as e:
+        log.warning("No se pudo crear el índice del contenido de los PDF (%s): %s", name, e)
+        _available[(url, "pages")] = False
+        return False
+    _available.pop((url, "pages"), None)
+    return created
+
+
+def rebuild_pages(bind):
+    """Re-indexa note_pages (el texto ya extraído; extraerlo de nuevo es `flask search-index-content --full`)."""
+    stmts = {"sqlite": _SQLITE_PAGES_REBUILD, "postgresql": _PG_PAGES_REBUILD}.get(_dialect(bind))
+    if stmts and pages_available(bind):
+        with _begin(bind) as conn:
+            for stmt in stmts:
+                conn.execute(text(stmt))
+
+
+def rebuild(bind) -> int:
+    """Re-indexa todos los apuntes. Devuelve la cantidad de apuntes indexados."""
+    name = _dialect(bind)
+    stmts = {"sqlite": _SQLITE_REBUILD, "postgresql": _PG_REBUILD}.get(name)
+    if not stmts:
+        return 0
+    with _begin(bind) as conn:
+        for stmt in stmts:
+            conn.execute(text(stmt))
+        return conn.execute(text(
+            "SELECT count(*) FROM notes WHERE is_active AND deleted_at IS NULL"
+        )).scalar_one()
+
+
+def is_available(bind) -> bool:
+    engine = getattr(bind, "engine", bind)
+    if engine.url not in _available:
+        insp = inspect(engine)
+        if _dialect(engine) == "sqlite":
+            ok = insp.has_table(FTS_TABLE)
+        elif _dialect(engine) == "postgresql":
+            ok = "search_vector" in [c["name"] for c in insp.get_columns("notes")]
+        else:
+            ok = False
+        _available[engine.url] = ok
+    return _available[engine.url]
+
+
+def pages_available(bind) -> bool:
+    engine = getattr(bind, "engine", bind)
+    key = (engine.url, "pages")
+    if key not in _available:
+        insp = inspect(engine)
+        if _dialect(engine) == "sqlite":
+            ok = insp.has_table(PAGES_FTS)
+        elif _dialect(engine) == "postgresql":
+            ok = (insp.has_table("note_pages")
+                  and "search_vector" in [c["name"] for c in insp.get_columns("note_pages")])
+        else:
+            ok = False
+        _available[key] = ok
+    return _available[key] and is_available(engine)
+
+
+def tokenize(q: str) -> list[str]:
+    return _WORD_RE.findall(q or "")
+
+
+def _fts5_terms(q: str) -> str:
+    # Cada palabra como frase entre comillas + prefijo: sin sintaxis FTS del usuario
+    return " ".join(f'"{t}"*' for t in tokenize(q))
+
+
+def _pg_terms(q: str) -> str:
+    return " & ".join(f"{t}:*" for t in tokenize(q))
+
+
+def apply_search(stmt, bind, Note, q="", university="", faculty="", career=""):
+    """
+    Agrega los filtros de texto a `stmt` (un select(Note)).
+
+    Devuelve (stmt, rank): `rank` es la expresión de relevancia para ordenar
+    (menor es mejor) o None si no hubo búsqueda por texto.
+    """
+    terms = {"q": tokenize(q), "university": tokenize(university),
+             "faculty": tokenize(faculty), "career": tokenize(career)}
+    if not any(terms.values()):
+        return stmt, None
+
+    name = _dialect(bind)
+    if not is_available(bind):
+        return _apply_ilike(stmt, Note, q, university, faculty, career), None
+
+    if name == "sqlite":
+        parts = []
+        if terms["q"]:
+            parts.append("{title description} : (%s)" % _fts5_terms(q))
+        for col in ("university", "faculty", "career"):
+            if terms[col]:
+                parts.append("%s : (%s)" % (col, _fts5_terms(" ".join(terms[col]))))
+        fts = table(FTS_TABLE, column("rowid"))
+        if terms["q"] and pages_available(bind):
+            # Título/descripción o contenido; la taxonomía filtra aparte
+            notes_m = (select(fts.c.rowid.label("note_id"),
+                              func.bm25(literal_column(FTS_TABLE), *BM25_WEIGHTS).label("rank"))
+                       .where(literal_column(FTS_TABLE).op("MATCH")(parts[0])))
+            pfts = table(PAGES_FTS, column("rowid"))
+            pages_m = (select(_PAGES.c.note_id,
+                              (func.bm25(literal_column(PAGES_FTS)) * CONTENT_WEIGHT).label("rank"))
+                       .select_from(pfts.join(_PAGES, _PAGES.c.id == pfts.c.rowid))
+                       .where(literal_column(PAGES_FTS).op("MATCH")(_fts5_terms(q))))
+            stmt, rank = _join_hits(stmt, Note, notes_m, pages_m)
+            if parts[1:]:
+                stmt = stmt.where(Note.id.in_(
+                    select(fts.c.rowid).where(literal_column(FTS_TABLE).op("MATCH")(" AND ".join(parts[1:])))))
+            return stmt, rank
+        match = literal_column(FTS_TABLE).op("MATCH")(" AND ".join(parts))
+        rank = func.bm25(literal_column(FTS_TABLE), *BM25_WEIGHTS)
+        stmt = stmt.join(fts, fts.c.rowid == Note.id).where(match)
+        return stmt, rank
+
+    # Postgres: q va contra el tsvector; la taxonomía compara el valor exacto
+    # sin acentos ni mayúsculas, que usa los índices ix_notes_<col>_key.
+    vector = literal_column("notes.search_vector")
+    rank = None
+    if terms["q"]:
+        tsq = func.to_tsquery("spanish", func.apy_unaccent(_pg_terms(q)))
+        if pages_available(bind):
+            notes_m = select(Note.id.label("note_id"), (-func.ts_rank_cd(vector, tsq)).label("rank")) \
+                .where(vector.op("@@")(tsq))
+            pvector = _PAGES.c.search_vector
+            pages_m = select(_PAGES.c.note_id, (-func.ts_rank_cd(pvector, tsq) * CONTENT_WEIGHT).label("rank")) \
+                .where(pvector.op("@@")(tsq))
+            stmt, rank = _join_hits(stmt, Note, notes_m, pages_m)
+        else:
+            stmt = stmt.where(vector.op("@@")(tsq))
+            rank = -func.ts_rank_cd(vector, tsq)
+    for col in TAXONOMY_COLUMNS:
+        value = {"university": university, "faculty": faculty, "career": career}[col]
+        if terms[col]:
+            stmt = stmt.where(taxonomy_key(getattr(Note, col)) == taxonomy_key(" ".join(value.split())))
+    return stmt, rank
+
+
+def taxonomy_key(expr):
+    """Postgres: lower(apy_unaccent(expr)), la clave de los índices de taxonomía."""
+    return func.lower(func.apy_unaccent(expr))
+
+
+def _join_hits(stmt, Note, *matches):
+    # Un apunte puede coincidir en el título y en varias páginas: queda su mejor rank
+    hits = union_all(*matches).subquery()
+    best = (select(hits.c.note_id, func.min(hits.c.rank).label("rank"))
+            .group_by(hits.c.note_id).subquery("hits"))
+    return stmt.join(best, best.c.note_id == Note.id), best.c.rank
+
+
+def _pages_match(q):
+    pfts = table(PAGES_FTS, column("rowid"))
+    return pfts, pfts.join(_PAGES, _PAGES.c.id == pfts.c.rowid), literal_column(PAGES_FTS).op("MATCH")(_fts5_terms(q))
+
+
+def page_matches_query(q, note_ids):
+    """SQLite: (note_id, id de página, bm25) de las páginas de `note_ids` que coinciden con `q`."""
+    _, joined, match = _pages_match(q)
+    return (select(_PAGES.c.note_id, _PAGES.c.id, func.bm25(literal_column(PAGES_FTS)))
+            .select_from(joined).where(match, _PAGES.c.note_id.in_(list(note_ids))))
+
+
+def page_snippets_query(q, page_ids):
+    """SQLite: (note_id, página, fragmento) de las páginas elegidas."""
+    pfts, joined, match = _pages_match(q)
+    return (select(_PAGES.c.note_id, _PAGES.c.page,
+                   func.snippet(literal_column(PAGES_FTS), 0, MARK_START, MARK_END, "…", SNIPPET_WORDS))
+            .select_from(joined).where(match, pfts.c.rowid.in_(list(page_ids))))
+
+
+def page_headlines_query(q, note_ids):
+    """Postgres: (note_id, página, fragmento) de la página que mejor coincide en cada apunte."""
+    tsq = func.to_tsquery("spanish", func.apy_unaccent(_pg_terms(q)))
+    vector = _PAGES.c.search_vector
+    best = (select(_PAGES.c.id).where(vector.op("@@")(tsq), _PAGES.c.note_id.in_(list(note_ids)))
+            .order_by(_PAGES.c.note_id, func.ts_rank_cd(vector, tsq).desc())
+            .distinct(_PAGES.c.note_id))
+    options = (f"StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={SNIPPET_WORDS}, "
+               "MinWords=6, MaxFragments=1")
+    return (select(_PAGES.c.note_id, _PAGES.c.page,
+                   func.ts_headline("spanish", func.apy_unaccent(_PAGES.c.body), tsq, options))
+            .where(_PAGES.c.id.in_(best.scalar_subquery())))
+
+
+def page_hits(session, note_ids, q) -> dict:
+    """{note_id: (página, fragmento)} de la página que mejor coincide con `q` en cada apunte."""
+    bind = session.get_bind()
+    if not note_ids or not tokenize(q) or not pages_available(bind):
+        return {}
+    if _dialect(bind) == "sqlite":
+        best = {}
+        for note_id, page_id, rank in session.execute(page_matches_query(q, note_ids)):
+            if note_id not in best or rank < best[note_id][1]:
+                best[note_id] = (page_id, rank)
+        if not best:
+            return {}
+        # snippet() sólo para la página elegida de cada apunte
+        rows = session.execute(page_snippets_query(q, [v[0] for v in best.values()])).all()
+    else:
+        rows = session.execute(page_headlines_query(q, note_ids)).all()
+    return {note_id: (page, snippet) for note_id, page, snippet in rows}
+
+
+def _apply_ilike(stmt, Note, q, university, faculty, career):
+    if q:
+        stmt = stmt.where(or_(Note.title.ilike(f"%{q}%"), Note.description.ilike(f"%{q}%")))
+    if university:
+        stmt = stmt.where(Note.university.ilike(f"%{university}%"))
+    if faculty:
+        stmt = stmt.where(Note.faculty.ilike(f"%{faculty}%"))
+    if career:
+        stmt = stmt.where(Note.career.ilike(f"%{career}%"))
+    return stmt
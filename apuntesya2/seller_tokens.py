@@ -0,0 +1,157 @@
+"""
+Tokens OAuth de Mercado Pago de los vendedores.
+
+`get(session, seller_id)` es lo que usa el checkout: devuelve el access token
+vigente desde un LRU en memoria del proceso (los tokens no van al backend
+compartido de la caché) y nunca llama a MP. Si el token está por vencer pide
+un refresh en segundo plano; si ya venció devuelve None y el checkout sigue
+con el token de la plataforma, como antes.
+
+Los refresh corren en el worker de webhooks (misma cola, ver webhooks.py):
+- `refresh:seller-tokens`, cada SELLER_TOKEN_REFRESH_INTERVAL segundos,
+  renueva los que vencen dentro de SELLER_TOKEN_REFRESH_AHEAD_HOURS;
+- `seller_token:<id>`, encolado por `get`, renueva uno solo.
+
+Un refresh por vendedor a la vez: en el proceso, el set de vendedores en
+curso (`_in_flight`, sólo los que se están renovando); entre procesos, la cola
+no entrega el mismo evento a dos workers y el UPDATE sólo se aplica si el
+refresh token sigue siendo el que se usó. Los tokens nuevos se guardan en
+una transacción por lote, y sólo las filas que el UPDATE cambió cuentan como
+renovadas: `cache.seller_tokens.invalidate(id)` avisa a los demás procesos
+que descarten el token viejo.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, bindparam
+
+from apuntesya2 import cache
+from apuntesya2.db import Session
+from apuntesya2.models import User
+
+log = logging.getLogger(__name__)
+
+CHUNK = 100
+
+_tokens = cache.LRUCache(maxsize=4096, ttl=300.0)
+_requested = cache.LRUCache(maxsize=4096, ttl=60.0)   # refresh ya pedido hace poco
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def _start_flight(seller_id: int) -> bool:
+    """False si otro thread ya está renovando el token de este vendedor."""
+    with _in_flight_lock:
+        if seller_id in _in_flight:
+            return False
+        _in_flight.add(seller_id)
+        return True
+
+
+def _end_flights(seller_ids):
+    with _in_flight_lock:
+        _in_flight.difference_update(seller_ids)
+
+
+def _request_refresh(session, seller_id: int):
+    if _requested.get(seller_id):
+        return
+    _requested.set(seller_id, True)
+    from apuntesya2 import webhooks
+    webhooks.record(session, {"topic": "seller_token", "id": str(seller_id)}, None)
+
+
+def token_query(seller_id: int):
+    return (select(User.mp_access_token, User.mp_refresh_token, User.mp_token_expires_at)
+            .where(User.id == seller_id))
+
+
+def due_query(until: datetime, last_id: int, chunk: int, seller_ids=None):
+    """Vendedores con refresh token cuyo access token vence antes de `until` (de a `chunk`, por id)."""
+    due = User.mp_token_expires_at < until
+    if seller_ids is not None:
+        due = due & User.id.in_(list(seller_ids))
+    return (select(User.id, User.mp_refresh_token)
+            .where(due, User.mp_refresh_token.is_not(None), User.id > last_id)
+            .order_by(User.id).limit(chunk))
+
+
+def get(session, seller_id: int, ahead: timedelta = timedelta(hours=1)) -> str | None:
+    """Access token vigente del vendedor, o None (sin MP vinculado o vencido)."""
+    key = f"{seller_id}:v{cache.seller_tokens.version(seller_id)}"
+    now = datetime.utcnow()
+    hit = _tokens.get(key)
+    if hit is not None and (hit[1] is None or hit[1] > now):
+        return hit[0]
+    row = session.execute(token_query(seller_id)).first()
+    if not row or not row.mp_access_token:
+        return None
+    expires_at = row.mp_token_expires_at
+    if expires_at is not None and expires_at <= now + ahead and row.mp_refresh_token:
+        _request_refresh(session, seller_id)
+    if expires_at is not None and expires_at <= now:
+        return None
+    ttl = _tokens.ttl if expires_at is None else min(_tokens.ttl, (expires_at - now).total_seconds())
+    _tokens.set(key, (row.mp_access_token, expires_at), ttl)
+    return row.mp_access_token
+
+
+def invalidate(seller_id: int):
+    cache.seller_tokens.invalidate(seller_id)
+
+
+def _persist(session, rows: list[dict]) -> list[int]:
+    """
+    Guarda los tokens nuevos y devuelve los vendedores actualizados. Si el
+    refresh token ya no es `old_rt` (otro proceso lo rotó) la fila no cambia
+    y el vendedor no cuenta: un UPDATE por fila para leer su rowcount.
+    """
+    if not rows:
+        return []
+    users = User.__table__
+    stmt = (update(users)
+            .where(users.c.id == bindparam("sid"), users.c.mp_refresh_token == bindparam("old_rt"))
+            .values(mp_access_token=bindparam("at"), mp_refresh_token=bindparam("rt"),
+                    mp_token_expires_at=bindparam("exp")))
+    updated = [r["sid"] for r in rows if session.execute(stmt, r).rowcount]
+    session.commit()
+    for sid in updated:
+        invalidate(sid)
+    return updated
+
+
+def refresh_due(app, seller_ids=None) -> int:
+    """
+    Renueva los tokens que vencen dentro de SELLER_TOKEN_REFRESH_AHEAD_HOURS
+    (o los de `seller_ids`). Devuelve cuántos renovó.
+    """
+    from apuntesya2 import mp
+    until = datetime.utcnow() + timedelta(hours=app.config["SELLER_TOKEN_REFRESH_AHEAD_HOURS"])
+    total, last_id = 0, 0
+    while True:
+        with Session() as s:
+            batch = s.execute(due_query(until, last_id, CHUNK, seller_ids)).all()
+        if not batch:
+            return total
+        last_id = batch[-1].id
+        rows, held = [], []
+        for seller_id, refresh_token in batch:
+            if not _start_flight(seller_id):
+                continue  # ya lo está renovando otro thread
+            held.append(seller_id)
+            try:
+                data = mp.oauth_refresh(refresh_token)
+            except Exception as e:
+                log.warning("seller %s: no se pudo renovar el token de MP: %s", seller_id, e)
+                continue
+            rows.append({
+                "sid": seller_id, "old_rt": refresh_token, "at": data.get("access_token"),
+                "rt": data.get("refresh_token") or refresh_token,
+                "exp": datetime.utcnow() + timedelta(seconds=int(data.get("expires_in", 0)) - 60),
+            })
+        try:
+            with Session() as s:
+                total += len(_persist(s, [r for r in rows if r["at"]]))
+        finally:
+            _end_flights(held)
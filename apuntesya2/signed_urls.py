@@ -0,0 +1,58 @@
+"""
+URLs de descarga firmadas y con vencimiento: /d/<token>.
+
+El token (itsdangerous, como auth_reset/tokens.py) lleva el id del apunte, la
+ruta del archivo, el nombre de descarga y el vencimiento; verificarlo es un
+HMAC, sin sesión de usuario, así que /d/ lo puede atender cualquier worker (o
+el proxy con DOWNLOAD_BACKEND=nginx) y una caché/CDN delante lo puede guardar.
+/d/ además confirma por PK que el apunte siga activo: uno dado de baja o
+borrado deja de descargarse aunque el token no haya vencido.
+
+- Apuntes gratis: el vencimiento es el final de la ventana de DOWNLOAD_URL_TTL
+  en curso, así todos los usuarios reciben la misma URL durante la ventana (a
+  lo sumo DOWNLOAD_URL_TTL de validez) y la respuesta es `public` (cacheable)
+  hasta que vence.
+- Apuntes pagos: se emiten después del chequeo de compra y vencen en
+  DOWNLOAD_URL_TTL_PAID segundos; respuesta `private`.
+"""
+import time
+
+from flask import current_app, url_for
+from itsdangerous import BadSignature, URLSafeSerializer
+
+SALT = "download-url"
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt=SALT)
+
+
+def sign(note_id: int, rel_path: str, download_name: str, paid: bool = False, now: float | None = None) -> str:
+    cfg = current_app.config
+    now = int(now if now is not None else time.time())
+    data = {"i": note_id, "p": rel_path, "n": download_name}
+    if paid:
+        data["e"] = now + int(cfg["DOWNLOAD_URL_TTL_PAID"])
+    else:
+        window = int(cfg["DOWNLOAD_URL_TTL"])
+        data["e"] = (now // window + 1) * window  # fin de la ventana en curso
+        data["pub"] = 1
+    return _serializer().dumps(data)
+
+
+def verify(token: str, now: float | None = None) -> dict | None:
+    """Payload del token si la firma es válida y no venció; si no, None."""
+    try:
+        data = _serializer().loads(token)
+    except BadSignature:
+        return None
+    if (not isinstance(data, dict) or not data.get("p") or not data.get("i")
+            or int(data.get("e", 0)) <= (now or time.time())):
+        return None
+    return data
+
+
+def download_url(note, download_name: str) -> str:
+    """URL firmada de un apunte (para pagos, después de autorizar al comprador)."""
+    return url_for("main.signed_download",
+                   token=sign(note.id, note.file_path, download_name, paid=bool(note.price_cents)))
@@ -16,6 +16,23 @@
     if (!res.ok) throw new Error('HTTP '+res.status);
     return await res.json();
   }
+  // Taxonomía completa: se pide una sola vez (/api/academics/tree) y se filtra local
+  let treePromise = null;
+  function loadTree() {
+    if (!treePromise) {
+      treePromise = fetchJSON('/api/academics/tree').then(t => ({
+        universities: t.u.map(([id, name]) => ({id, name})),
+        faculties: t.f.map(([id, name, university_id]) => ({id, name, university_id})),
+        careers: t.c.map(([id, name, faculty_id]) => ({id, name, faculty_id})),
+      })).catch(err => { treePromise = null; throw err; });
+    }
+    return treePromise;
+  }
+  function byName(a, b) { return a.name < b.name ? -1 : (a.name > b.name ? 1 : a.id - b.id); }
+  async function addToTree(kind, item) {
+    const list = (await loadTree())[kind];
+    if (!list.some(x => x.id === item.id)) { list.push(item); list.sort(byName); }
+  }
   function makeSelect(placeholder) {
     const s = el('select', {class:'input'});
     s.appendChild(el('option', {value:'', text: placeholder || 'Seleccionar...'}));
@@ -69,7 +86,7 @@
     async function loadUniversities(prefillName) {
       uniSelect.innerHTML = '';
       uniSelect.appendChild(el('option', {value:'', text:'Universidad'}));
-      const data = await fetchJSON('/api/academics/universities');
+      const data = (await loadTree()).universities;
       data.forEach(u => {
         const o = el('option', {value:String(u.id), text:u.name});
         o.dataset.label = u.name;
@@ -94,9 +111,8 @@
     async function loadFaculties(universityId, prefillName) {
       facSelect.innerHTML = '';
       facSelect.appendChild(el('option', {value:'', text:'Facultad'}));
-      let url = '/api/academics/faculties';
-      if (universityId) url += '?university_id='+encodeURIComponent(universityId);
-      const data = await fetchJSON(url);
+      const all = (await loadTree()).faculties;
+      const data = universityId ? all.filter(f => String(f.university_id) === String(universityId)) : all;
       data.forEach(f => {
         const o = el('option', {value:String(f.id), text:f.name});
         o.dataset.label = f.name;
@@ -120,9 +136,8 @@
     async function loadCareers(facultyId, prefillName) {
       carSelect.innerHTML = '';
       carSelect.appendChild(el('option', {value:'', text:'Carrera'}));
-      let url = '/api/academics/careers';
-      if (facultyId) url += '?faculty_id='+encodeURIComponent(facultyId);
-      const data = await fetchJSON(url);
+      const all = (await loadTree()).careers;
+      const data = facultyId ? all.filter(c => String(c.faculty_id) === String(facultyId)) : all;
       data.forEach(c => {
         const o = el('option', {value:String(c.id), text:c.name});
         o.dataset.label = c.name;
@@ -157,6 +172,7 @@
           const name = (mini.value||'').trim();
           if (!name) { this.value=''; mini.remove(); syncHidden(this, uniInput); return; }
           const res = await fetch('/api/academics/universities', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({name})}).then(r=>r.json());
+          await addToTree('universities', res);
           const opt = document.createElement('option'); opt.value=String(res.id); opt.textContent=res.name; opt.dataset.label=res.name;
           this.insertBefore(opt, this.querySelector('option[value="__OTHER__"]'));
           this.value = String(res.id);
@@ -193,6 +209,7 @@
           const name = (mini.value||'').trim();
           if (!name) { this.value=''; mini.remove(); syncHidden(this, facInput); return; }
           const res = await fetch('/api/academics/faculties', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({name, university_id: uid})}).then(r=>r.json());
+          await addToTree('faculties', res);
           const opt = document.createElement('option'); opt.value=String(res.id); opt.textContent=res.name; opt.dataset.label=res.name;
           this.insertBefore(opt, this.querySelector('option[value="__OTHER__"]'));
           this.value = String(res.id);
@@ -229,6 +246,7 @@
           const name = (mini.value||'').trim();
           if (!name) { this.value=''; mini.remove(); syncHidden(this, carInput); return; }
           const res = await fetch('/api/academics/careers', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({name, faculty_id: fid})}).then(r=>r.json());
+          await addToTree('careers', res);
           const opt = document.createElement('option'); opt.value=String(res.id); opt.textContent=res.name; opt.dataset.label=res.name;
           this.insertBefore(opt, this.querySelector('option[value="__OTHER__"]'));
           this.value = String(res.id);
@@ -0,0 +1,164 @@
+"""
+Árbol de taxonomía académica (universidad → facultad → carrera) y autocompletado.
+
+`tree_payload` arma el JSON compacto que sirve /api/academics/tree:
+
+    {"v": 1, "u": [[id, nombre], ...],
+             "f": [[id, nombre, university_id], ...],
+             "c": [[id, nombre, faculty_id], ...]}
+
+(listas planas ordenadas por nombre: el front arma la jerarquía y filtra local).
+
+`Index` es el índice en memoria del autocompletado: un trie de palabras
+(prefijos) + trigramas (errores de tipeo / coincidencias en el medio), sin
+acentos ni mayúsculas. Se construye desde el payload del árbol, así que se
+reconstruye sólo cuando cambia la versión cacheada (ver app.api_academics_suggest).
+"""
+import json
+import heapq
+import unicodedata
+import threading
+from collections import Counter
+
+from sqlalchemy import select
+
+from apuntesya2.models import University, Faculty, Career
+
+TREE_FORMAT = 1
+KINDS = {"university": "u", "faculty": "f", "career": "c"}
+PARENT_FIELD = {"university": None, "faculty": "university_id", "career": "faculty_id"}
+
+
+def fold(s: str) -> str:
+    """minúsculas y sin acentos: 'Económicas' -> 'economicas'"""
+    s = unicodedata.normalize("NFKD", s or "")
+    return "".join(ch for ch in s if not unicodedata.combining(ch)).lower()
+
+
+def _words(s: str) -> list[str]:
+    return "".join(ch if ch.isalnum() else " " for ch in fold(s)).split()
+
+
+def _trigrams(s: str) -> set[str]:
+    padded = "  " + " ".join(_words(s)) + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def tree_queries():
+    return select(University), select(Faculty), select(Career)
+
+
+def tree_payload(session) -> dict:
+    # Lectura completa de las 3 tablas (una vez por versión de la caché);
+    # se ordena en Python para no pedirle al motor un sort sin índice.
+    by_name = lambda row: (row[1], row[0])
+    unis_q, facs_q, cars_q = tree_queries()
+    unis = sorted(([u.id, u.name] for u in session.execute(unis_q).scalars()), key=by_name)
+    facs = sorted(([f.id, f.name, f.university_id] for f in session.execute(facs_q).scalars()), key=by_name)
+    cars = sorted(([c.id, c.name, c.faculty_id] for c in session.execute(cars_q).scalars()), key=by_name)
+    return {"v": TREE_FORMAT, "u": unis, "f": facs, "c": cars}
+
+
+# -----------------------------------------------------------------------------
+# Autocompletado
+# -----------------------------------------------------------------------------
+class _Trie:
+    __slots__ = ("root",)
+
+    def __init__(self):
+        # nodo = (hijos, ids de todas las palabras que pasan por el nodo)
+        self.root = ({}, set())
+
+    def add(self, word: str, item_id):
+        node = self.root
+        for ch in word:
+            node = node[0].setdefault(ch, ({}, set()))
+            node[1].add(item_id)
+
+    def prefix(self, prefix: str) -> set:
+        node = self.root
+        for ch in prefix:
+            node = node[0].get(ch)
+            if node is None:
+                return set()
+        return node[1]
+
+
+class Index:
+    def __init__(self, tree: dict):
+        self.items = {}      # kind -> {id: (nombre, parent_id, nombre plegado, #trigramas)}
+        self._tries = {}
+        self._grams = {}     # kind -> {trigrama: [ids]}
+        for kind, key in KINDS.items():
+            items, trie, grams = {}, _Trie(), {}
+            for row in tree.get(key, []):
+                item_id, name = row[0], row[1]
+                item_grams = _trigrams(name)
+                items[item_id] = (name, row[2] if len(row) > 2 else None, fold(name), len(item_grams))
+                for w in _words(name):
+                    trie.add(w, item_id)
+                for g in item_grams:
+                    grams.setdefault(g, []).append(item_id)
+            self.items[kind], self._tries[kind], self._grams[kind] = items, trie, grams
+
+    def suggest(self, kind: str, q: str, parent_id=None, limit=10) -> list[dict]:
+        items = self.items[kind]
+        words = _words(q)
+        if not words:
+            return []
+        allowed = (lambda i: items[i][1] == parent_id) if parent_id else (lambda i: True)
+
+        # 1) todas las palabras de q como prefijo de alguna palabra del nombre
+        ids = None
+        for w in words:
+            found = self._tries[kind].prefix(w)
+            ids = set(found) if ids is None else ids & found
+            if not ids:
+                break
+        full = fold(q).strip()
+        ranked = heapq.nsmallest(
+            limit, (i for i in (ids or ()) if allowed(i)),
+            key=lambda i: (not items[i][2].startswith(full), len(items[i][0]), items[i][0]),
+        )
+
+        # 2) si no alcanza, similitud por trigramas (tolera errores de tipeo)
+        if len(ranked) < limit:
+            qgrams = _trigrams(q)
+            scores = Counter()
+            for g in qgrams:
+                scores.update(self._grams[kind].get(g, ()))
+            min_shared = 0.25 * len(qgrams)  # sim = compartidos / unión >= 0.25
+            seen = set(ranked)
+            fuzzy = []
+            for i, shared in scores.items():
+                if shared < min_shared or i in seen or not allowed(i):
+                    continue
+                sim = shared / (len(qgrams) + items[i][3] - shared)
+                if sim >= 0.25:
+                    fuzzy.append((-sim, items[i][0], i))
+            ranked += [i for _, _, i in heapq.nsmallest(limit - len(ranked), fuzzy)]
+
+        parent = PARENT_FIELD[kind]
+        out = []
+        for i in ranked[:limit]:
+            d = {"id": i, "name": items[i][0]}
+            if parent:
+                d[parent] = items[i][1]
+            out.append(d)
+        return out
+
+
+_index = (None, None)
+_index_lock = threading.Lock()
+
+
+def index_for(entry) -> Index:
+    """Índice para la versión cacheada del árbol (entry = cache.Entry del JSON)."""
+    global _index
+    etag, idx = _index
+    if etag == entry.etag:
+        return idx
+    with _index_lock:
+        if _index[0] != entry.etag:
+            _index = (entry.etag, Index(json.loads(entry.body)))
+        return _index[1]
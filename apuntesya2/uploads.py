@@ -0,0 +1,334 @@
+"""
+Subida de PDFs por streaming (sin buffer en el worker) y subidas reanudables.
+
+Formulario (`/upload`, multipart): `StreamingRequest` hace que werkzeug
+escriba la parte del archivo directamente en el blob store (blobs/tmp/ →
+blobs/ab/cd/<sha256>.pdf, ver blobstore.py) en vez de un spool temporal que
+después se copia. Mientras llegan los chunks se valida:
+
+- magic bytes de PDF (`%PDF-`) en el primer KB      → 415
+- tamaño máximo (UPLOAD_MAX_BYTES)                  → 413
+- velocidad mínima (UPLOAD_MIN_BPS, clientes que retienen el worker) → 408
+
+Antes de leer el cuerpo se controla el cupo por usuario (UPLOAD_MAX_PER_HOUR) → 429.
+
+Reanudable (estilo tus, para conexiones móviles inestables):
+
+    POST   /upload/sessions        {"size": N, "filename": "..."}  → 201 {"id", "url"}
+    PATCH  /upload/sessions/<id>   Upload-Offset: k, cuerpo = bytes desde k → 204
+    HEAD   /upload/sessions/<id>   → Upload-Offset / Upload-Length
+    DELETE /upload/sessions/<id>
+
+Los bytes recibidos quedan en blobs/tmp/<id>.part; si un PATCH se corta, el
+cliente pide el offset con HEAD y sigue desde ahí. Al completarse, el archivo
+pasa al blob store y el formulario de /upload se envía con `upload_id` en vez
+del archivo.
+"""
+import os
+import time
+import secrets
+import contextlib
+from datetime import datetime, timedelta
+
+from flask import Request, current_app
+from sqlalchemy import select, func, delete
+from werkzeug.exceptions import (
+    Conflict, RequestEntityTooLarge, RequestTimeout, TooManyRequests, UnsupportedMediaType,
+)
+
+from apuntesya2 import blobstore
+from apuntesya2.models import Note, UploadSession
+
+PDF_MAGIC = b"%PDF-"
+MAGIC_WINDOW = 1024  # la cabecera puede venir precedida de basura (spec PDF)
+RATE_GRACE_SECONDS = 10
+SESSION_TTL = timedelta(hours=24)
+
+
+def format_size(n: int) -> str:
+    """Tamaño para los mensajes: en KB por debajo de 1 MB, con un decimal."""
+    if n < 1024 * 1024:
+        return f"{n / 1024:.1f} KB"
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+class Limits:
+    def __init__(self, max_bytes, min_bps=0, what="el máximo"):
+        self.max_bytes = max_bytes
+        self.min_bps = min_bps
+        self.what = what  # qué es max_bytes, para el mensaje del 413
+
+    def too_large(self, size: int, declared: bool = False) -> RequestEntityTooLarge:
+        got = f"{format_size(size)} {'declarados' if declared else 'recibidos'}"
+        return RequestEntityTooLarge(f"El archivo supera {self.what} de {format_size(self.max_bytes)} ({got}).")
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(int(config["UPLOAD_MAX_BYTES"]), int(config["UPLOAD_MIN_BPS"]))
+
+
+class _Guard:
+    """Chequeos incrementales sobre los bytes que van llegando."""
+
+    def __init__(self, limits: Limits, offset=0, head=b""):
+        self.limits = limits
+        self.size = offset
+        self.head = head[:MAGIC_WINDOW]
+        self.checked = PDF_MAGIC in self.head or len(self.head) >= MAGIC_WINDOW
+        self.started = time.monotonic()
+        self.received = 0
+        if len(self.head) >= MAGIC_WINDOW:
+            self._check_magic()
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        self.received += len(chunk)
+        if self.size > self.limits.max_bytes:
+            raise self.limits.too_large(self.size)
+        if not self.checked:
+            self.head += chunk[:MAGIC_WINDOW - len(self.head)]
+            if PDF_MAGIC in self.head or len(self.head) >= MAGIC_WINDOW:
+                self._check_magic()
+        elapsed = time.monotonic() - self.started
+        if self.limits.min_bps and elapsed > RATE_GRACE_SECONDS and self.received / elapsed < self.limits.min_bps:
+            raise RequestTimeout("La subida es demasiado lenta; probá de nuevo con mejor conexión.")
+
+    def finish(self):
+        if not self.checked:
+            self._check_magic()
+
+    def _check_magic(self):
+        self.checked = True
+        if PDF_MAGIC not in self.head:
+            raise UnsupportedMediaType("El archivo no es un PDF.")
+
+
+class PdfSink:
+    """
+    Destino de la parte `file` del multipart: escribe en el blob store con los
+    chequeos de `_Guard`. Si un chequeo falla se descarta lo escrito.
+    """
+
+    def __init__(self, root: str, limits: Limits):
+        self._writer = blobstore.BlobWriter(root)
+        self._guard = _Guard(limits)
+
+    def write(self, chunk: bytes):
+        try:
+            self._guard.feed(chunk)
+        except Exception:
+            self._writer.abort()
+            raise
+        self._writer.write(chunk)
+
+    def seek(self, pos, whence=0):
+        # werkzeug hace seek(0) al terminar la parte: momento de validar archivos chicos
+        if pos == 0 and whence == 0 and self._writer.blob is None:
+            try:
+                self._guard.finish()
+            except Exception:
+                self._writer.abort()
+                raise
+        return self._writer._fh.seek(pos, whence)
+
+    def read(self, *args):
+        return self._writer._fh.read(*args)
+
+    def readline(self, *args):
+        return self._writer._fh.readline(*args)
+
+    def tell(self):
+        return self._writer._fh.tell()
+
+    def commit(self) -> blobstore.StoredBlob:
+        if self._writer.blob is None:
+            self._guard.finish()
+            self._writer.commit()
+        return self._writer.blob
+
+    def close(self):
+        # Request.close() al final del request: lo no commiteado se borra
+        if self._writer.blob is None:
+            self._writer.abort()
+
+    @property
+    def closed(self):
+        return self._writer._fh.closed
+
+
+class StreamingRequest(Request):
+    """Request de la app: si la vista llamó a `expect_pdf()`, los archivos van al blob store."""
+
+    pdf_upload = None  # (root, Limits)
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.pdf_upload is not None:
+            root, limits = self.pdf_upload
+            return PdfSink(root, limits)
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def expect_pdf(request):
+    """Llamar antes de tocar request.form / request.files en una vista que recibe un PDF."""
+    cfg = current_app.config
+    request.pdf_upload = (cfg["UPLOAD_FOLDER"], Limits.from_config(cfg))
+
+
+def store_pdf(file) -> blobstore.StoredBlob:
+    """Confirma en el blob store el archivo recibido (FileStorage de request.files)."""
+    if isinstance(file.stream, PdfSink):
+        return file.stream.commit()
+    # Request común (p.ej. scripts o tests con otra request_class): misma validación, copiando
+    with blobstore.BlobWriter(current_app.config["UPLOAD_FOLDER"]) as w:
+        guard = _Guard(Limits.from_config(current_app.config))
+        for chunk in iter(lambda: file.stream.read(blobstore.CHUNK_SIZE), b""):
+            guard.feed(chunk)
+            w.write(chunk)
+        guard.finish()
+        return w.commit()
+
+
+def quota_queries(user_id: int, since: datetime):
+    """Cuentan los apuntes y las subidas sin terminar del usuario desde `since`."""
+    return (
+        select(func.count()).select_from(Note).where(Note.seller_id == user_id, Note.created_at >= since),
+        select(func.count()).select_from(UploadSession).where(
+            UploadSession.user_id == user_id, UploadSession.created_at >= since,
+            UploadSession.blob_path.is_(None)),
+    )
+
+
+def check_quota(session, user_id: int):
+    """429 si el usuario ya hizo UPLOAD_MAX_PER_HOUR subidas en la última hora."""
+    limit = int(current_app.config["UPLOAD_MAX_PER_HOUR"])
+    if not limit:
+        return
+    since = datetime.utcnow() - timedelta(hours=1)
+    if sum(session.execute(q).scalar_one() for q in quota_queries(user_id, since)) >= limit:
+        raise TooManyRequests(f"Llegaste al máximo de {limit} subidas por hora. Probá más tarde.")
+
+
+# -----------------------------------------------------------------------------
+# Subidas reanudables
+# -----------------------------------------------------------------------------
+def partial_path(root: str, upload_id: str) -> str:
+    return os.path.join(blobstore.tmp_dir(root), f"{upload_id}.part")
+
+
+def offset_of(root: str, upload: UploadSession) -> int:
+    if upload.blob_path:
+        return upload.size
+    try:
+        return os.path.getsize(partial_path(root, upload.id))
+    except FileNotFoundError:
+        return 0
+
+
+def create_session(session, root: str, user_id: int, size: int, filename: str = None) -> UploadSession:
+    limits = Limits.from_config(current_app.config)
+    if size <= 0:
+        raise UnsupportedMediaType("Archivo vacío.")
+    if size > limits.max_bytes:
+        raise limits.too_large(size, declared=True)
+    check_quota(session, user_id)
+    upload = UploadSession(id=secrets.token_urlsafe(16), user_id=user_id, size=size,
+                           filename=(filename or "")[:255] or None)
+    session.add(upload)
+    session.commit()
+    open(partial_path(root, upload.id), "wb").close()
+    return upload
+
+
+@contextlib.contextmanager
+def _locked(fh):
+    # Dos PATCH simultáneos sobre la misma subida: el segundo recibe 409
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise Conflict("Hay otra parte de esta subida en curso.")
+    try:
+        yield
+    finally:
+        fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def append_chunk(root: str, upload: UploadSession, offset: int, stream):
+    """
+    Agrega el cuerpo de un PATCH en `offset` (sin sesión de DB abierta mientras
+    llegan los bytes). Devuelve (nuevo offset, blob si la subida se completó);
+    el llamador guarda `upload.blob_path` en ese caso.
+    """
+    if upload.blob_path:
+        return upload.size, None
+    limits = Limits.from_config(current_app.config)
+    # el tamaño declarado es el tope de esta subida
+    if upload.size < limits.max_bytes:
+        limits.max_bytes, limits.what = upload.size, "el tamaño declarado"
+    path = partial_path(root, upload.id)
+    with open(path, "r+b") as fh, _locked(fh):
+        current = fh.seek(0, os.SEEK_END)
+        if offset != current:
+            raise Conflict(f"Offset {offset} inválido; el servidor tiene {current} bytes.")
+        fh.seek(0)
+        guard = _Guard(limits, offset=current, head=fh.read(MAGIC_WINDOW))
+        fh.seek(current)
+        try:
+            for chunk in iter(lambda: stream.read(blobstore.CHUNK_SIZE), b""):
+                guard.feed(chunk)
+                fh.write(chunk)
+        except (UnsupportedMediaType, RequestEntityTooLarge):
+            # Contenido inválido: se descarta la subida completa
+            fh.truncate(0)
+            raise
+        finally:
+            # Lo recibido hasta un corte de conexión se conserva para reanudar
+            fh.flush()
+        new_offset = fh.tell()
+        if new_offset == upload.size:
+            guard.finish()
+    if new_offset == upload.size:
+        return new_offset, blobstore.put_file(root, path)
+    return new_offset, None
+
+
+def take_completed(session, user_id: int, upload_id: str) -> str | None:
+    """Ruta del blob de una subida completa del usuario (la sesión se consume)."""
+    upload = session.get(UploadSession, upload_id)
+    if not upload or upload.user_id != user_id or not upload.blob_path:
+        return None
+    blob_path = upload.blob_path
+    session.delete(upload)
+    return blob_path
+
+
+def discard(session, root: str, upload: UploadSession):
+    try:
+        os.remove(partial_path(root, upload.id))
+    except FileNotFoundError:
+        pass
+    session.delete(upload)
+    session.commit()
+
+
+def expired_query(cutoff: datetime):
+    return select(UploadSession.id).where(UploadSession.created_at < cutoff)
+
+
+def expire_sessions(session, root: str) -> int:
+    """Borra subidas más viejas que SESSION_TTL (y sus parciales). Devuelve cuántas."""
+    cutoff = datetime.utcnow() - SESSION_TTL
+    old = session.execute(expired_query(cutoff)).scalars().all()
+    for upload_id in old:
+        try:
+            os.remove(partial_path(root, upload_id))
+        except FileNotFoundError:
+            pass
+    if old:
+        session.execute(delete(UploadSession).where(UploadSession.id.in_(old)))
+        session.commit()
+    return len(old)
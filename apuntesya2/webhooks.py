@@ -0,0 +1,515 @@
+"""
+Webhooks de Mercado Pago: recepción durable + procesamiento en segundo plano.
+
+`/mp/webhook` sólo guarda el evento en `webhook_events` y responde 200 (sin
+llamar a MP). La tabla es además la cola: un pool de threads (`Worker`) toma
+lotes de eventos pendientes, consulta los pagos a MP, actualiza `purchases`
+en bloque y reprograma los que fallan con backoff exponencial.
+
+Autenticidad: con MP_WEBHOOK_SECRET, `receive` valida la firma `x-signature`
+(HMAC-SHA256 de "id:<data.id>;request-id:<x-request-id>;ts:<ts>;") antes de
+tocar la DB; sin firma válida, o con un `ts` a más de SIGNATURE_MAX_AGE del
+reloj (una notificación capturada y re-enviada), responde 401 y no se encola
+nada. Sin secreto (desarrollo) se acepta todo; `init_app` lo avisa en el log
+si hay token de MP configurado. Desde afuera sólo entran topics de MP, nunca
+tareas propias (`TASKS`).
+
+Deduplicación: `provider_id` es "<topic>:<id del recurso>" (p.ej.
+"payment:123"), único. Las varias notificaciones de un mismo pago caen en la
+misma fila: si ya estaba procesada vuelve a pendiente (el pago pudo cambiar),
+si está pendiente no se agrega nada. Una re-entrega de la misma notificación
+(mismo `id` en el body, guardado en `notification_id`) no la re-encola. Lo
+que llega por el webhook espera COALESCE_SECONDS antes de procesarse: una
+ráfaga (payment.created + payment.updated) termina en una sola consulta a MP.
+
+Toma de eventos sin broker: UPDATE ... WHERE id IN (SELECT ... LIMIT n) con
+`status`/`locked_until` (FOR UPDATE SKIP LOCKED en Postgres), así varios
+workers o procesos no toman el mismo evento; si un worker muere con eventos
+tomados, se liberan solos al vencer `locked_until`. Las notificaciones de MP
+se toman en lotes (LOCK_SECONDS) y se aplican enseguida; las tareas propias,
+de a una y con TASK_LOCK_SECONDS, así una tarea lenta no vence el lock de
+otras ni demora la aprobación de pagos.
+
+Los workers corren en cada proceso de gunicorn (WEBHOOK_WORKER_THREADS,
+ver gunicorn.conf.py) o aparte con `flask webhooks-worker`. La misma cola
+lleva tareas propias (`TASKS`): la conciliación de compras pendientes y la
+renovación de tokens de vendedores, programadas con `schedule`, el render
+de previews de apuntes y de fotos de perfil y la extracción de texto de los PDF.
+"""
+import os
+import hmac
+import time
+import uuid
+import hashlib
+import random
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, bindparam, or_, and_
+
+from apuntesya2 import entitlements, payment_status, sales_rollup
+from apuntesya2.db import Session
+from apuntesya2.models import WebhookEvent, Purchase, Note
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 20
+LOCK_SECONDS = 120
+TASK_LOCK_SECONDS = 900   # una tarea por toma: un render/extracción o una conciliación entera
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 30      # segundos; se duplica por intento
+BACKOFF_MAX = 3600
+POLL_SECONDS = 2.0
+HANDLED_TOPICS = {"payment"}
+COALESCE_SECONDS = 2.0
+SIGNATURE_MAX_AGE = 300   # segundos de diferencia aceptados entre el `ts` firmado y el reloj
+
+
+# -----------------------------------------------------------------------------
+# Recepción
+# -----------------------------------------------------------------------------
+def parse_notification(args, body) -> tuple[str, str, str] | None:
+    """(topic, id del recurso, action) de una notificación (webhook v2 o IPN), o None."""
+    body = body if isinstance(body, dict) else {}
+    data = body.get("data") if isinstance(body.get("data"), dict) else {}
+    topic = body.get("type") or body.get("topic") or args.get("type") or args.get("topic") or "payment"
+    resource_id = data.get("id") or args.get("data.id") or args.get("id")
+    if not resource_id:
+        return None
+    return str(topic), str(resource_id), body.get("action") or ""
+
+
+def _notification_id(body) -> str | None:
+    # Webhooks v2: {"id": <notificación>, "data": {"id": <recurso>}, ...}; las IPN no traen id propio
+    if isinstance(body, dict) and isinstance(body.get("data"), dict) and body.get("id") is not None:
+        return str(body["id"])[:64]
+    return None
+
+
+def event_query(provider_id: str):
+    return select(WebhookEvent.id).where(WebhookEvent.provider_id == provider_id)
+
+
+def record(session, args, body, delay: float = 0.0) -> bool:
+    """
+    Guarda (o re-encola) la notificación, lista para procesar en `delay`
+    segundos. Devuelve False si no había nada que guardar.
+    """
+    parsed = parse_notification(args, body)
+    if not parsed:
+        return False
+    topic, resource_id, action = parsed
+    provider_id = f"{topic}:{resource_id}"
+    notification_id = _notification_id(body)
+    now = datetime.utcnow()
+    ready_at = now + timedelta(seconds=delay)
+    payload = body if isinstance(body, dict) and body else dict(args)
+    # Primero el caso común (nuevo estado de un pago ya visto): un UPDATE
+    stmt = (update(WebhookEvent)
+            .where(WebhookEvent.provider_id == provider_id, WebhookEvent.status != "pending")
+            .values(status="pending", attempts=0, next_attempt_at=ready_at, action=action,
+                    payload=payload, notification_id=notification_id, last_error=None, updated_at=now))
+    if notification_id:
+        # La re-entrega de una notificación ya procesada no vuelve a consultar a MP
+        stmt = stmt.where(or_(WebhookEvent.notification_id.is_(None),
+                              WebhookEvent.notification_id != notification_id))
+    res = session.execute(stmt)
+    if res.rowcount == 0:
+        exists = session.execute(event_query(provider_id)).first()
+        if not exists:
+            session.add(WebhookEvent(provider="mercadopago", provider_id=provider_id, topic=topic,
+                                     action=action, payload=payload, notification_id=notification_id,
+                                     status="pending", attempts=0, next_attempt_at=ready_at,
+                                     created_at=now))
+    try:
+        session.commit()
+    except Exception:
+        # Otro request insertó el mismo provider_id entre el SELECT y el INSERT: ya está encolado
+        session.rollback()
+    return True
+
+
+def init_app(app):
+    if app.config.get("MP_ACCESS_TOKEN_PLATFORM") and not app.config.get("MP_WEBHOOK_SECRET"):
+        app.logger.warning("MP_WEBHOOK_SECRET vacío: /mp/webhook acepta notificaciones sin firma")
+
+
+def _signed_at(ts: str) -> float | None:
+    try:
+        value = float(ts)
+    except ValueError:
+        return None
+    return value / 1000 if value > 1e11 else value  # MP a veces manda milisegundos
+
+
+def verify_signature(secret: str, signature: str, request_id: str, data_id: str,
+                     now: float | None = None) -> bool:
+    """
+    Valida el header `x-signature` ("ts=<ts>,v1=<hmac>") de MP: HMAC-SHA256 con
+    el secreto de "id:<data.id>;request-id:<x-request-id>;ts:<ts>;" (las partes
+    que no vienen se omiten; data.id alfanumérico va en minúsculas). El `ts`
+    tiene que estar a menos de SIGNATURE_MAX_AGE de `now`.
+    """
+    parts = dict(p.strip().split("=", 1) for p in (signature or "").split(",") if "=" in p)
+    ts, v1 = parts.get("ts"), parts.get("v1")
+    if not ts or not v1:
+        return False
+    signed_at = _signed_at(ts)
+    if signed_at is None or abs((time.time() if now is None else now) - signed_at) > SIGNATURE_MAX_AGE:
+        return False
+    data_id = data_id.lower() if data_id and data_id.isalnum() else data_id
+    manifest = "".join(f"{key}:{value};" for key, value in
+                       (("id", data_id), ("request-id", request_id), ("ts", ts)) if value)
+    expected = hmac.new(secret.encode(), manifest.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, v1.strip().lower())
+
+
+def receive(session, args, body, headers, secret: str) -> int:
+    """Entrada de `/mp/webhook`: valida la firma y encola. Devuelve el status HTTP."""
+    body = body if isinstance(body, dict) else None
+    data_id = args.get("data.id") or ((body or {}).get("data") or {}).get("id")
+    if secret and not verify_signature(secret, headers.get("x-signature", ""),
+                                       headers.get("x-request-id", ""), str(data_id or "")):
+        log.warning("webhook con firma inválida (data.id=%s)", str(data_id)[:64])
+        return 401
+    parsed = parse_notification(args, body)
+    if parsed and parsed[0] in TASKS:
+        return 200  # las tareas propias no se encolan desde afuera
+    record(session, args, body, delay=COALESCE_SECONDS)
+    return 200
+
+
+# -----------------------------------------------------------------------------
+# Cola
+# -----------------------------------------------------------------------------
+def _ready(now: datetime, tasks: bool):
+    kind = WebhookEvent.topic.in_(list(TASKS)) if tasks else WebhookEvent.topic.not_in(list(TASKS))
+    return and_(or_(
+        and_(WebhookEvent.status == "pending", WebhookEvent.next_attempt_at <= now),
+        and_(WebhookEvent.status == "processing", WebhookEvent.locked_until < now),
+    ), kind)
+
+
+def ready_query(now: datetime, limit: int = BATCH_SIZE, tasks: bool = False):
+    """Ids de los próximos eventos listos (pendientes o con el lock vencido): notificaciones o tareas."""
+    return (select(WebhookEvent.id).where(_ready(now, tasks))
+            .order_by(WebhookEvent.next_attempt_at).limit(limit)
+            .with_for_update(skip_locked=True))
+
+
+def claimed_query(claim_id: str):
+    return select(WebhookEvent).where(WebhookEvent.status == "processing", WebhookEvent.locked_by == claim_id)
+
+
+def claim(session, claim_id: str, limit: int = BATCH_SIZE, tasks: bool = False) -> list[WebhookEvent]:
+    """
+    Marca hasta `limit` eventos listos como tomados por `claim_id` (único por
+    lote) y los devuelve. `tasks`: tareas propias en vez de notificaciones de MP.
+    """
+    now = datetime.utcnow()
+    lock = TASK_LOCK_SECONDS if tasks else LOCK_SECONDS
+    session.execute(
+        update(WebhookEvent)
+        .where(WebhookEvent.id.in_(ready_query(now, limit, tasks).scalar_subquery()), _ready(now, tasks))
+        .values(status="processing", locked_by=claim_id,
+                locked_until=now + timedelta(seconds=lock), updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return session.execute(claimed_query(claim_id)).scalars().all()
+
+
+def _finish(session, event_id, claim_id, **values):
+    # Sólo si sigue tomado por este worker: si una notificación nueva lo
+    # re-encoló mientras tanto, queda pendiente y se vuelve a procesar
+    session.execute(
+        update(WebhookEvent)
+        .where(WebhookEvent.id == event_id, WebhookEvent.status == "processing",
+               WebhookEvent.locked_by == claim_id)
+        .values(locked_by=None, locked_until=None, updated_at=datetime.utcnow(), **values)
+    )
+
+
+def backoff_delay(attempts: int) -> float:
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def purchases_query(purchase_ids, only_pending: bool = False):
+    """Las compras (con el vendedor del apunte) a las que `apply_payments` les aplica los pagos."""
+    query = (select(Purchase.id, Purchase.buyer_id, Purchase.status, Purchase.payment_id,
+                    Purchase.note_id, Purchase.amount_cents, Purchase.created_at, Note.seller_id)
+             .join(Note, Note.id == Purchase.note_id)
+             .where(Purchase.id.in_(list(purchase_ids))))
+    if only_pending:
+        query = query.where(Purchase.status == "pending")
+    return query
+
+
+def apply_payments(session, payments: list[dict], only_pending: bool = False) -> int:
+    """
+    Actualiza las compras de estos pagos (y seller_daily_sales en la misma
+    transacción). Devuelve cuántas cambiaron. Con varios pagos de una misma compra gana el último, salvo que uno anterior
+    (otro pago) esté aprobado. `only_pending`: no toca compras ya resueltas.
+    """
+    by_purchase = {}
+    for pay in payments:
+        ref = str(pay.get("external_reference") or "")
+        if ref.startswith("purchase:") and pay.get("status"):
+            try:
+                pid = int(ref.split(":", 1)[1])
+            except ValueError:
+                continue
+            prev = by_purchase.get(pid)
+            if prev and prev["status"] == "approved" and prev.get("id") != pay.get("id"):
+                continue
+            by_purchase[pid] = pay
+    if not by_purchase:
+        return 0
+    rows = session.execute(purchases_query(by_purchase, only_pending)).all()
+    purchases = Purchase.__table__
+    payment_only, buyers, changed, rollup = [], set(), [], []
+    for pid, buyer_id, status, payment_id, note_id, amount_cents, created_at, seller_id in rows:
+        pay = by_purchase[pid]
+        new_status, new_payment = pay["status"], str(pay.get("id") or payment_id or "")
+        if new_status == status:
+            if new_payment != (payment_id or ""):
+                payment_only.append({"pid": pid, "pay": new_payment})
+            continue
+        # Cambios de estado uno por uno y condicionados al estado leído: si otro
+        # worker lo cambió antes, no se cuenta dos veces en seller_daily_sales
+        res = session.execute(
+            update(purchases).where(purchases.c.id == pid, purchases.c.status == status)
+            .values(status=new_status, payment_id=new_payment)
+        )
+        if not res.rowcount:
+            continue
+        buyers.add(buyer_id)
+        changed.append(pid)
+        if "approved" in (status, new_status):
+            sign = 1 if new_status == "approved" else -1
+            rollup.append((seller_id, note_id, created_at, amount_cents, sign))
+    if payment_only:
+        session.execute(
+            update(purchases).where(purchases.c.id == bindparam("pid")).values(payment_id=bindparam("pay")),
+            payment_only,
+        )
+    sales_rollup.apply_changes(session, rollup)
+    session.commit()
+    for buyer_id in buyers:
+        entitlements.invalidate(buyer_id)
+    for pid in changed:
+        payment_status.notify(pid)
+    return len(changed) + len(payment_only)
+
+
+# -----------------------------------------------------------------------------
+# Tareas internas por la misma cola
+# -----------------------------------------------------------------------------
+# topic -> descripción; los eventos "<topic>:<id>" no son de MP sino tareas propias
+TASKS = {
+    "reconcile": "conciliación de compras pendientes (reconcile.py)",
+    "seller_tokens": "renovación de tokens de vendedores por vencer (seller_tokens.py)",
+    "seller_token": "renovación del token de un vendedor (seller_tokens.py)",
+    "preview": "preview de la primera página de un PDF (previews.py)",
+    "avatar": "variantes de una foto de perfil (avatars.py)",
+    "text": "extracción del texto de un PDF para la búsqueda (pdf_text.py)",
+}
+# Periódicas: (provider_id, topic, clave de config con el intervalo en segundos)
+PERIODIC = [
+    ("reconcile:payments", "reconcile", "RECONCILE_INTERVAL"),
+    ("refresh:seller-tokens", "seller_tokens", "SELLER_TOKEN_REFRESH_INTERVAL"),
+]
+
+
+def _run_task(app, ev):
+    from apuntesya2 import avatars, pdf_text, previews, reconcile, seller_tokens
+    if ev.topic == "reconcile":
+        reconcile.run(app)
+    elif ev.topic == "seller_tokens":
+        seller_tokens.refresh_due(app)
+    elif ev.topic == "seller_token":
+        seller_tokens.refresh_due(app, [int(ev.provider_id.split(":", 1)[1])])
+    elif ev.topic == "preview":
+        previews.generate(app, ev.provider_id.split(":", 1)[1])
+    elif ev.topic == "avatar":
+        avatars.generate(app, ev.provider_id.split(":", 1)[1])
+    elif ev.topic == "text":
+        pdf_text.index_blob(app, ev.provider_id.split(":", 1)[1])
+
+
+def schedule(session, provider_id: str, topic: str, interval: float) -> bool:
+    """
+    Encola la tarea periódica si la última terminó hace más de `interval`
+    segundos. El UPDATE condicional hace de lock: de todos los procesos que
+    lo intentan a la vez, uno solo la encola.
+    """
+    now = datetime.utcnow()
+    res = session.execute(
+        update(WebhookEvent)
+        .where(WebhookEvent.provider_id == provider_id, WebhookEvent.status.in_(("done", "failed")),
+               WebhookEvent.updated_at < now - timedelta(seconds=interval))
+        .values(status="pending", attempts=0, next_attempt_at=now, last_error=None, updated_at=now)
+    )
+    if res.rowcount:
+        session.commit()
+        return True
+    if session.execute(event_query(provider_id)).first():
+        return False
+    session.add(WebhookEvent(provider="apuntesya", provider_id=provider_id, topic=topic, action="",
+                             payload={}, status="pending", attempts=0, next_attempt_at=now,
+                             created_at=now, updated_at=now))
+    try:
+        session.commit()
+    except Exception:
+        session.rollback()  # otro proceso la creó primero
+        return False
+    return True
+
+
+def _claim_id(worker_id: str) -> str:
+    return f"{worker_id[:50]}:{uuid.uuid4().hex[:8]}"
+
+
+def _finish_claimed(session, claim_id, ok, failed):
+    for ev in ok:
+        _finish(session, ev.id, claim_id, status="done")
+    now = datetime.utcnow()
+    for ev, err in failed:
+        attempts = ev.attempts + 1
+        if attempts >= MAX_ATTEMPTS:
+            log.error("webhook %s: se descarta después de %s intentos: %s", ev.provider_id, attempts, err)
+            _finish(session, ev.id, claim_id, status="failed", attempts=attempts, last_error=err)
+        else:
+            _finish(session, ev.id, claim_id, status="pending", attempts=attempts, last_error=err,
+                    next_attempt_at=now + timedelta(seconds=backoff_delay(attempts)))
+
+
+def _process_notifications(app, worker_id: str, limit: int) -> int:
+    from apuntesya2 import mp
+    token = app.config["MP_ACCESS_TOKEN_PLATFORM"]
+    claim_id = _claim_id(worker_id)
+    with Session() as s:
+        events = claim(s, claim_id, limit)
+    if not events:
+        return 0
+
+    payments, ok, failed = [], [], []
+    for ev in events:
+        if ev.topic not in HANDLED_TOPICS:
+            ok.append(ev)
+            continue
+        try:
+            payments.append(mp.get_payment(token, ev.provider_id.split(":", 1)[1]))
+            ok.append(ev)
+        except Exception as e:
+            failed.append((ev, str(e)[:500]))
+
+    with Session() as s:
+        changed = apply_payments(s, payments)
+        _finish_claimed(s, claim_id, ok, failed)
+        s.commit()
+    if changed or failed:
+        log.info("webhooks: %s eventos, %s compras actualizadas, %s con error", len(events), changed, len(failed))
+    return len(events)
+
+
+def _process_task(app, worker_id: str) -> int:
+    claim_id = _claim_id(worker_id)
+    with Session() as s:
+        events = claim(s, claim_id, 1, tasks=True)
+    if not events:
+        return 0
+    ev = events[0]
+    ok, failed = [ev], []
+    try:
+        _run_task(app, ev)
+    except Exception as e:
+        log.exception("webhooks: tarea %s", ev.provider_id)
+        ok, failed = [], [(ev, str(e)[:500])]
+    with Session() as s:
+        _finish_claimed(s, claim_id, ok, failed)
+        s.commit()
+    return 1
+
+
+def process_batch(app, worker_id: str, limit: int = BATCH_SIZE) -> int:
+    """
+    Toma y procesa un lote de notificaciones de MP y después una tarea propia.
+    Devuelve cuántos eventos tomó.
+    """
+    return _process_notifications(app, worker_id, limit) + _process_task(app, worker_id)
+
+
+# -----------------------------------------------------------------------------
+# Pool de workers
+# -----------------------------------------------------------------------------
+class Worker:
+    def __init__(self, app, threads: int = 1, poll: float = POLL_SECONDS, batch_size: int = BATCH_SIZE):
+        self.app = app
+        self.threads = threads
+        self.poll = poll
+        self.batch_size = batch_size
+        # Tareas periódicas con su intervalo (0 = desactivada)
+        self.periodic = [(pid, topic, float(app.config.get(key, 0))) for pid, topic, key in PERIODIC]
+        self._next_schedule = 0.0
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _maybe_schedule(self):
+        if time.monotonic() < self._next_schedule:
+            return
+        # Un UPDATE por tarea y por minuto como mucho; cada tarea corre una vez por intervalo
+        self._next_schedule = time.monotonic() + 60.0
+        with Session() as s:
+            for provider_id, topic, interval in self.periodic:
+                if interval:
+                    schedule(s, provider_id, topic, interval)
+
+    def _loop(self, n):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{n}"
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    if n == 0:
+                        self._maybe_schedule()
+                    taken = process_batch(self.app, worker_id, self.batch_size)
+            except Exception:
+                log.exception("webhooks: error en el worker %s", worker_id)
+                taken = 0
+            if not taken:
+                # Cola vacía: espera con jitter para no sincronizar los workers
+                self._stop.wait(self.poll * random.uniform(0.5, 1.5))
+
+    def start(self):
+        for n in range(self.threads):
+            t = threading.Thread(target=self._loop, args=(n,), name=f"webhooks-{n}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def run_forever(self):
+        self.start()
+        try:
+            while any(t.is_alive() for t in self._threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+
+def drain(app, worker_id: str = "drain") -> int:
+    """Procesa todo lo pendiente ya listo (scripts / `flask webhooks-worker --once`)."""
+    total = 0
+    while True:
+        with app.app_context():
+            n = process_batch(app, worker_id)
+        total += n
+        if n == 0:
+            return total
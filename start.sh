@@ -1,13 +1,18 @@
 #!/usr/bin/env bash
 set -e
 export PORT=${PORT:-10000}
-export WORKERS=${WORKERS:-2}
-export THREADS=${THREADS:-2}
+# WORKERS / THREADS (o WEB_CONCURRENCY / GUNICORN_THREADS): se exportan con los
+# nombres que leen gunicorn.conf.py y el pool de la DB (db_profiles.py)
+export WEB_CONCURRENCY=${WORKERS:-${WEB_CONCURRENCY:-2}}
+export GUNICORN_THREADS=${THREADS:-${GUNICORN_THREADS:-2}}
 export TIMEOUT=${TIMEOUT:-120}
 export APP_MODULE=${APP_MODULE:-apuntesya2.app:app}
-echo "[start.sh] Gunicorn -> $APP_MODULE on :$PORT (w=$WORKERS t=$THREADS timeout=$TIMEOUT)"
+# gunicorn.conf.py aplica las migraciones (on_starting, una vez en el master antes
+# de forkear) y arranca los threads de la cola de webhooks en cada worker
+# (post_worker_init); los flags de abajo pisan sus defaults.
+echo "[start.sh] Gunicorn -> $APP_MODULE on :$PORT (w=$WEB_CONCURRENCY t=$GUNICORN_THREADS timeout=$TIMEOUT)"
 exec gunicorn "$APP_MODULE" \
-  --workers "$WORKERS" \
-  --threads "$THREADS" \
+  -c apuntesya2/gunicorn.conf.py \
   --timeout "$TIMEOUT" \
+  --preload \
   --bind "0.0.0.0:${PORT}"